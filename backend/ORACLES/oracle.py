@@ -0,0 +1,146 @@
+""" oracle.py -- indexed, read-only view of the people's database """
+
+import re
+import json
+
+
+# remove special characters except period
+PATTERN_CLEAN_NAME = r'[^\w\s.]'
+
+
+def clean_name(name, strip_hyphens=True):
+    """Normalize a full name the way beneficiaries and testators are
+    matched against the database."""
+    cleaned = re.sub(PATTERN_CLEAN_NAME, '', name)
+    if strip_hyphens:
+        cleaned = cleaned.replace('-', '')
+    return cleaned
+
+
+class Oracle:
+    """The people's database with its indexes, built once at load time:
+    by id, by full name, by cleaned name and parent -> children / child ->
+    parents.  Lookups are O(1) so devolution stays linear in the size of
+    the will rather than of the family database.
+
+    `oracle['people']` still gives the raw list for code that iterates it."""
+
+    version = 0  # bumped by oracles that can be written to; this one never changes
+
+    def __init__(self, db):
+        self.db = db
+        self.people = db['people']
+        self.by_id = {}
+        self.by_full_name = {}
+        self.by_clean_name = {}
+        self.by_clean_name_hyphens = {}
+        self.parents_of = {}
+        for person in self.people:
+            # first entry wins for ids and full names, as the old next(...) scans did;
+            # last entry wins for cleaned names, as the old dict comprehensions did
+            self.by_id.setdefault(person['id'], person)
+            self.by_full_name.setdefault(person['full_name'], person)
+            self.by_clean_name[clean_name(person['full_name'])] = person
+            self.by_clean_name_hyphens[clean_name(person['full_name'], False)] = person
+            for child_id in person.get('children_ids', []):
+                self.parents_of.setdefault(child_id, []).append(person)
+
+    @classmethod
+    def load(cls, path):
+        """Load the people's database json."""
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def __getitem__(self, key):
+        return self.db[key]
+
+    def __len__(self):
+        return len(self.people)
+
+    def get(self, person_id):
+        """Person with the given id, or None."""
+        return self.by_id.get(person_id)
+
+    def by_name(self, full_name):
+        """Person with exactly this full name, or None."""
+        return self.by_full_name.get(full_name)
+
+    def match_name(self, name, strip_hyphens=True):
+        """Person whose cleaned full name matches the cleaned name, or None."""
+        if strip_hyphens:
+            return self.by_clean_name.get(clean_name(name))
+        return self.by_clean_name_hyphens.get(clean_name(name, False))
+
+    def children(self, person):
+        """Children of the person found in the database, in children_ids order."""
+        return [self.by_id[c_id] for c_id in person.get('children_ids', []) if c_id in self.by_id]
+
+    def parents(self, person):
+        """People listing the person among their children."""
+        return self.parents_of.get(person['id'], [])
+
+
+class OverlayOracle:
+    """An oracle seen with some people's facts replaced, e.g. a what-if
+    scenario where a beneficiary predeceased the testator.  The base
+    oracle (an Oracle or a SQLiteOracle) is left untouched.
+
+    :param overrides: dict of person id -> {field: value}; only fields
+        that leave the names and the family tree as they are (alive, age,
+        assets)
+    """
+
+    def __init__(self, base, overrides):
+        self.base = base
+        self.overrides = overrides
+        self._overlaid = {}
+        self._version = 0
+
+    @property
+    def version(self):
+        """Changes whenever the overlay or its base is written to."""
+        return getattr(self.base, 'version', 0), self._version
+
+    def override(self, person_id, **fields):
+        """Replace more facts of a person in the overlay."""
+        self.overrides.setdefault(person_id, {}).update(fields)
+        self._overlaid.pop(person_id, None)
+        self._version += 1
+
+    def _overlay(self, person):
+        if person is None or person['id'] not in self.overrides:
+            return person
+        if person['id'] not in self._overlaid:
+            self._overlaid[person['id']] = dict(person, **self.overrides[person['id']])
+        return self._overlaid[person['id']]
+
+    def __getitem__(self, key):
+        if key != 'people':
+            return self.base[key]
+        return [self._overlay(person) for person in self.base['people']]
+
+    def __len__(self):
+        return len(self.base)
+
+    def get(self, person_id):
+        return self._overlay(self.base.get(person_id))
+
+    def by_name(self, full_name):
+        return self._overlay(self.base.by_name(full_name))
+
+    def match_name(self, name, strip_hyphens=True):
+        return self._overlay(self.base.match_name(name, strip_hyphens))
+
+    def children(self, person):
+        return [self._overlay(child) for child in self.base.children(person)]
+
+    def parents(self, person):
+        return [self._overlay(parent) for parent in self.base.parents(person)]
+
+
+def as_oracle(db):
+    """Wrap a loaded people's database dict; Oracles and other stores with
+    the same lookups (e.g. SQLiteOracle) are passed through."""
+    if isinstance(db, dict):
+        return Oracle(db)
+    return db
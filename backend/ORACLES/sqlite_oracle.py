@@ -0,0 +1,210 @@
+""" sqlite_oracle.py -- SQLite storage for the people's database
+
+The people, their assets and the parent -> child edges are stored in
+separate tables, indexed by id and by normalized name, so opening the
+store and looking up a person do not depend on the size of the database.
+SQLiteOracle answers the same lookups as Oracle, and import_json /
+export_json convert from and to the people_db.json format. """
+
+import json
+import sqlite3
+import threading
+
+from ORACLES.oracle import Oracle, clean_name
+
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER NOT NULL UNIQUE,
+    full_name TEXT NOT NULL,
+    clean_name TEXT NOT NULL,
+    clean_name_hyphens TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assets (
+    person_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (person_id, position)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    parent_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (parent_id, position)
+);
+CREATE INDEX IF NOT EXISTS people_full_name ON people (full_name);
+CREATE INDEX IF NOT EXISTS people_clean_name ON people (clean_name);
+CREATE INDEX IF NOT EXISTS people_clean_name_hyphens ON people (clean_name_hyphens);
+CREATE INDEX IF NOT EXISTS edges_child ON edges (child_id);
+"""
+
+
+def is_sqlite_path(path):
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+class SQLiteOracle:
+    """People's database kept in SQLite.  People are read on demand and
+    kept in memory once read; writes go straight to the database and bump
+    the version."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.version = 0
+
+    def close(self):
+        self._conn.close()
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _person(self, row):
+        """Rebuild the people_db.json entry of a (id, data) row."""
+        person_id, data = row
+        if person_id in self._cache:
+            return self._cache[person_id]
+        person = json.loads(data)
+        person['assets'] = [json.loads(a) for (a,) in self._query(
+            "SELECT data FROM assets WHERE person_id = ? ORDER BY position", (person_id,))]
+        person['children_ids'] = [c for (c,) in self._query(
+            "SELECT child_id FROM edges WHERE parent_id = ? ORDER BY position", (person_id,))]
+        self._cache[person_id] = person
+        return person
+
+    def _first(self, where, args):
+        rows = self._query(f"SELECT id, data FROM people WHERE {where} ORDER BY seq LIMIT 1", args)
+        return self._person(rows[0]) if rows else None
+
+    @property
+    def people(self):
+        """Every person, in insertion order; reads the whole database."""
+        return [self._person(row) for row in self._query("SELECT id, data FROM people ORDER BY seq")]
+
+    def __getitem__(self, key):
+        if key != 'people':
+            raise KeyError(key)
+        return self.people
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM people")[0][0]
+
+    def get(self, person_id):
+        """Person with the given id, or None."""
+        if person_id in self._cache:
+            return self._cache[person_id]
+        return self._first("id = ?", (person_id,))
+
+    def by_name(self, full_name):
+        """Person with exactly this full name, or None."""
+        return self._first("full_name = ?", (full_name,))
+
+    def match_name(self, name, strip_hyphens=True):
+        """Person whose cleaned full name matches the cleaned name, or None."""
+        if strip_hyphens:
+            column, cleaned = "clean_name", clean_name(name)
+        else:
+            column, cleaned = "clean_name_hyphens", clean_name(name, False)
+        # the last entry wins, as with the in-memory Oracle
+        rows = self._query(f"SELECT id, data FROM people WHERE {column} = ? ORDER BY seq DESC LIMIT 1",
+                           (cleaned,))
+        return self._person(rows[0]) if rows else None
+
+    def children(self, person):
+        """Children of the person found in the database, in children_ids order."""
+        children = [self.get(c_id) for c_id in person.get('children_ids', [])]
+        return [child for child in children if child is not None]
+
+    def parents(self, person):
+        """People listing the person among their children."""
+        rows = self._query("SELECT p.id, p.data FROM edges e JOIN people p ON p.id = e.parent_id "
+                           "WHERE e.child_id = ? ORDER BY p.seq", (person['id'],))
+        return [self._person(row) for row in rows]
+
+    def next_id(self):
+        """An id not used by anyone in the database."""
+        return (self._query("SELECT MAX(id) FROM people")[0][0] or 0) + 1
+
+    def put_person(self, person):
+        """Insert the person, or replace the entry with the same id."""
+        data = {k: v for k, v in person.items() if k not in ('assets', 'children_ids')}
+        with self._lock, self._conn:
+            self._write(person, data)
+            self._cache.pop(person['id'], None)
+            self.version += 1
+
+    def put_people(self, people):
+        """Insert or replace many people in one transaction."""
+        with self._lock, self._conn:
+            for person in people:
+                data = {k: v for k, v in person.items() if k not in ('assets', 'children_ids')}
+                self._write(person, data)
+            self._cache.clear()
+            self.version += 1
+
+    def _write(self, person, data):
+        person_id = person['id']
+        self._conn.execute("DELETE FROM people WHERE id = ?", (person_id,))
+        self._conn.execute("DELETE FROM assets WHERE person_id = ?", (person_id,))
+        self._conn.execute("DELETE FROM edges WHERE parent_id = ?", (person_id,))
+        self._conn.execute(
+            "INSERT INTO people (id, full_name, clean_name, clean_name_hyphens, data) VALUES (?, ?, ?, ?, ?)",
+            (person_id, person['full_name'], clean_name(person['full_name']),
+             clean_name(person['full_name'], False), json.dumps(data)))
+        self._conn.executemany(
+            "INSERT INTO assets (person_id, position, name, type, data) VALUES (?, ?, ?, ?, ?)",
+            [(person_id, i, a.get('name'), a.get('type'), json.dumps(a))
+             for i, a in enumerate(person.get('assets', []))])
+        self._conn.executemany(
+            "INSERT INTO edges (parent_id, child_id, position) VALUES (?, ?, ?)",
+            [(person_id, c_id, i) for i, c_id in enumerate(person.get('children_ids', []))])
+
+
+def import_json(json_path, db_path):
+    """Load a people_db.json file into a (new or existing) SQLite store."""
+    with open(json_path, 'r') as f:
+        db = json.load(f)
+    store = SQLiteOracle(db_path)
+    store.put_people(db['people'])
+    print(f"... Imported {len(db['people'])} people from {json_path} into {db_path}.")
+    return store
+
+
+def export_json(db_path, json_path):
+    """Write a SQLite store back out in the people_db.json format."""
+    store = SQLiteOracle(db_path)
+    people = store.people
+    with open(json_path, 'w') as f:
+        json.dump({"people": people}, f, indent=4)
+    print(f"... Exported {len(people)} people from {db_path} to {json_path}.")
+    store.close()
+
+
+def open_oracle(path):
+    """Open a people's database by file type: SQLite stores stay on disk,
+    json files are loaded into an in-memory Oracle."""
+    if is_sqlite_path(path):
+        return SQLiteOracle(path)
+    return Oracle.load(path)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 4 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python -m ORACLES.sqlite_oracle import <people_db.json> <people_db.sqlite>\n"
+              "       python -m ORACLES.sqlite_oracle export <people_db.sqlite> <people_db.json>")
+        sys.exit(1)
+    if sys.argv[1] == 'import':
+        import_json(sys.argv[2], sys.argv[3]).close()
+    else:
+        export_json(sys.argv[2], sys.argv[3])
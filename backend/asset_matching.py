@@ -0,0 +1,165 @@
+""" asset_matching.py -- local pre-filter for matching directive assets to oracle assets
+
+Most (directive asset, testator asset) pairs are clearly the same or
+clearly different from their words alone: "my 2015 Toyota Camry" against
+{"name": "2015 Toyota Camry", "type": "Vehicle"} or against a bank
+account.  Each pair is scored locally from token overlap, character
+trigram similarity and asset-type keywords.  Confident matches and
+confident non-matches are decided here; only the ambiguous top-k
+candidates of a directive asset are left to the LLM. """
+
+import re
+import threading
+
+
+ACCEPT_SIMILARITY = 0.85  # name trigram similarity accepted without the LLM
+REJECT_SIMILARITY = 0.2  # below this, pairs sharing no word or type are rejected
+TOP_K = 3  # ambiguous candidates per directive asset sent to the LLM
+
+STOPWORDS = {
+    'a', 'an', 'the', 'my', 'our', 'his', 'her', 'their', 'of', 'and', 'or', 'to', 'in',
+    'at', 'on', 'for', 'with', 'all', 'any', 'that', 'which', 'i', 'me', 'own', 'owned',
+    'located', 'known', 'as', 'by', 'from', 'said', 'sum',
+}
+
+TYPE_KEYWORDS = {
+    'vehicle': {'vehicle', 'vehicles', 'car', 'cars', 'automobile', 'automobiles', 'auto', 'truck',
+                'van', 'suv', 'motorcycle', 'boat', 'toyota', 'honda', 'ford', 'chevrolet', 'chevy',
+                'nissan', 'bmw', 'mercedes', 'tesla', 'jeep', 'dodge', 'subaru', 'hyundai', 'kia',
+                'volkswagen', 'audi', 'lexus', 'mazda', 'sedan', 'camry', 'corolla', 'civic'},
+    'property': {'property', 'house', 'home', 'residence', 'homestead', 'real', 'estate', 'land',
+                 'lot', 'farm', 'ranch', 'apartment', 'condo', 'condominium', 'cabin', 'building',
+                 'acres', 'parcel', 'street', 'st', 'avenue', 'ave', 'road', 'rd', 'drive', 'lane'},
+    'financial': {'bank', 'account', 'accounts', 'savings', 'checking', 'deposit', 'cash', 'money',
+                  'funds', 'stock', 'stocks', 'shares', 'bonds', 'ira', '401k', 'retirement',
+                  'investment', 'investments', 'brokerage', 'insurance', 'annuity', 'dollars'},
+    'jewelry': {'jewelry', 'jewellery', 'ring', 'rings', 'necklace', 'watch', 'bracelet',
+                'earrings', 'diamond', 'gold', 'silver', 'pearls'},
+    'business': {'business', 'company', 'corporation', 'llc', 'inc', 'partnership', 'firm'},
+    'household': {'furniture', 'furnishings', 'household', 'piano', 'art', 'painting', 'paintings',
+                  'collection', 'books', 'tools', 'equipment', 'antiques'},
+}
+
+MATCH_STATS = {'pairs': 0, 'lexical': 0, 'llm': 0, 'queries': 0, 'queries_avoided': 0}
+_stats_lock = threading.Lock()
+
+
+def tokens(text):
+    """Content words of the text."""
+    return {t for t in re.findall(r"[a-z0-9]+", str(text).lower()) if t not in STOPWORDS}
+
+
+def trigrams(text):
+    """Character trigrams of the normalized text."""
+    text = " " + " ".join(re.findall(r"[a-z0-9]+", str(text).lower())) + " "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(text_a, text_b):
+    """Jaccard similarity of the character trigrams of two texts."""
+    a, b = trigrams(text_a), trigrams(text_b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def categories(words):
+    return {category for category, keywords in TYPE_KEYWORDS.items() if words & keywords}
+
+
+def asset_words(asset):
+    """Words of every text field of an oracle asset (name, type, Location,
+    make, model, year, ...)."""
+    words = set()
+    for value in asset.values():
+        if isinstance(value, (str, int, float)):
+            words |= tokens(value)
+    return words
+
+
+def score_pair(directive_asset, oracle_asset):
+    """Score one pair; returns (decision, score) with decision 'match',
+    'reject' or 'ambiguous'."""
+    d_words = tokens(directive_asset)
+    o_words = asset_words(oracle_asset)
+    name_similarity = similarity(directive_asset, oracle_asset.get('name', ''))
+    containment = len(d_words & o_words) / len(d_words) if d_words else 0.0
+    d_types, o_types = categories(d_words), categories(o_words)
+    shared_types = d_types & o_types
+
+    score = 0.5 * containment + 0.3 * name_similarity + (0.2 if shared_types else 0.0)
+    if d_words and containment == 1.0 and (not d_types or not o_types or shared_types):
+        return 'match', score
+    if name_similarity >= ACCEPT_SIMILARITY:
+        return 'match', score
+    if containment == 0.0 and not shared_types and (
+            name_similarity < REJECT_SIMILARITY or (d_types and o_types)):
+        return 'reject', score
+    return 'ambiguous', score
+
+
+def match_assets(directive_assets, oracle_assets, ask_llm, top_k=None):
+    """Match directive asset texts against candidate oracle assets.
+
+    Pairs are decided locally when confident.  For a directive asset with
+    no confident match, its top_k ambiguous candidates by score are asked
+    of the LLM in one call, `ask_llm(directive_assets, oracle_assets)`,
+    which must return a boolean matrix; lower-ranked candidates are not
+    matched.
+
+    :return: (matrix, decided_by) -- the boolean match matrix, and for
+        each pair the path that decided it: 'lexical' or 'llm', with its
+        local score
+    """
+    top_k = TOP_K if top_k is None else top_k
+    matrix = [[False] * len(oracle_assets) for _ in directive_assets]
+    decided_by = [[('lexical', 0.0)] * len(oracle_assets) for _ in directive_assets]
+    ask = []
+    for i, directive_asset in enumerate(directive_assets):
+        ambiguous = []
+        for j, oracle_asset in enumerate(oracle_assets):
+            decision, score = score_pair(directive_asset, oracle_asset)
+            decided_by[i][j] = ('lexical', score)
+            if decision == 'match':
+                matrix[i][j] = True
+            elif decision == 'ambiguous':
+                ambiguous.append((score, j))
+        if not any(matrix[i]):
+            ambiguous.sort(key=lambda pair: -pair[0])
+            ask += [(i, j) for _, j in ambiguous[:top_k]]
+
+    if ask:
+        rows = sorted({i for i, _ in ask})
+        cols = sorted({j for _, j in ask})
+        answer = ask_llm([directive_assets[i] for i in rows], [oracle_assets[j] for j in cols])
+        for i, j in ask:
+            matrix[i][j] = answer[rows.index(i)][cols.index(j)]
+            decided_by[i][j] = ('llm', decided_by[i][j][1])
+
+    pairs = len(directive_assets) * len(oracle_assets)
+    with _stats_lock:
+        MATCH_STATS['pairs'] += pairs
+        MATCH_STATS['llm'] += len(ask)
+        MATCH_STATS['lexical'] += pairs - len(ask)
+        MATCH_STATS['queries'] += 1
+        MATCH_STATS['queries_avoided'] += 0 if ask else 1
+    return matrix, decided_by
+
+
+def configure_matching(top_k=None, accept_similarity=None, reject_similarity=None):
+    global TOP_K, ACCEPT_SIMILARITY, REJECT_SIMILARITY
+    if top_k is not None:
+        TOP_K = top_k
+    if accept_similarity is not None:
+        ACCEPT_SIMILARITY = accept_similarity
+    if reject_similarity is not None:
+        REJECT_SIMILARITY = reject_similarity
+
+
+def matching_summary():
+    """Returns a one-line report of the pairs decided without the LLM."""
+    pairs, queries = MATCH_STATS['pairs'], MATCH_STATS['queries']
+    pair_rate = (100.0 * MATCH_STATS['lexical'] / pairs) if pairs else 0.0
+    query_rate = (100.0 * MATCH_STATS['queries_avoided'] / queries) if queries else 0.0
+    return (f"... Asset matching: {MATCH_STATS['lexical']}/{pairs} pairs decided locally ({pair_rate:.1f}%), "
+            f"{MATCH_STATS['queries_avoided']}/{queries} LLM queries avoided ({query_rate:.1f}%)")
@@ -0,0 +1,279 @@
+""" compiled_rules.py -- directives compiled to Will Model s-expressions
+
+The LLM reads a directive into a rule id and its items (gpt_req.process_rule).
+compile_rule() turns them into a WMSExpr tree with the condition as a
+WMPredicate over the beneficiaries (WMVariableReference, resolved in the
+oracle) and the division of the assets (WMLiteralValue), and
+evaluate_rule() executes such a tree against an oracle.  The trees are
+kept on the directives (compile_bequest), so a will can be devolved again
+against an updated oracle without asking the LLM.
+
+    (bequeath (assets (asset <name> <source text>) ...) <residuary>
+              (rule <rule ids> <rule text> <condition> <division>))
+
+with the condition one of
+
+    (true)
+    (and (not (is_alive <person>)) ...)        rule 5
+    (and (age_at_least <person> <age>) ...)    rule 11
+
+and the division one of
+
+    (divide_equally <person> ... <asset> ...)
+    (divide (share <person> <asset> <percent>) ...) """
+
+import json
+from collections import defaultdict
+from fractions import Fraction
+
+from schemas.model.wm.wms_expr import WMSExpr
+from schemas.model.wm.wm_predicate import WMPredicate
+from schemas.model.wm.wm_enum_named_function import WMEnumNamedFunction
+from schemas.model.wm.wm_literal_value import WMLiteralValue
+from schemas.model.wm.wm_variable_reference import WMVariableReference
+from stirpes import engine_for
+
+
+UNALIVE_RULE_TEXT = "If a person(s) is not alive, transfer assets to another person(s)"
+
+
+################################################################################
+#                                                                              #
+#                                  DIVISION                                    #
+#                                                                              #
+################################################################################
+
+
+def divide_by_stirpes(root_beneficiary, db, shares, asset_names, current_percentage=1):
+    """
+    Calculate the stirpes of one asset or a list of assets according to the number of beneficiaries.
+    The share vector of the beneficiary's descendants is computed once per oracle (see stirpes.py).
+    """
+    if isinstance(asset_names, str):
+        asset_names = [asset_names]
+    division = engine_for(db).distribute(root_beneficiary, current_percentage, asset_names)
+    for asset_name, parts in division.items():
+        for person, share in parts.items():
+            shares.append((person, float(share), asset_name))
+
+
+def divide_equally(beneficiaries, assets, db, division, shares):
+    """Give each beneficiary an equal share of every asset; the shares of
+    deceased beneficiaries go to their descendants per stirpes."""
+    asset_names = [asset['name'] for asset in assets]
+    equal_division = round(1/len(beneficiaries),5)
+    for person in beneficiaries:
+        if person['alive']!='true':
+            print(f'Person {person["full_name"]} not alive. Dividing asset: {", ".join(asset_names)} per stirpes to thier children.')
+            divide_by_stirpes(person,db,shares,asset_names, equal_division)
+            continue
+        for asset_name in asset_names:
+            division[asset_name][person['full_name']]=equal_division
+
+
+def add_shares(division, shares):
+    """Add the (person, share, asset) stirpes shares to the division; a
+    descendant who also has a share of their own receives both."""
+    for (person,share,asset_name) in shares:
+        division[asset_name][person] = division[asset_name].get(person, 0) + share
+
+
+################################################################################
+#                                                                              #
+#                                  COMPILER                                    #
+#                                                                              #
+################################################################################
+
+
+def literal(type, value):
+    return WMLiteralValue(type=type, value=str(value))
+
+
+def variable(name):
+    return WMVariableReference(name=name)
+
+
+def compile_rule(ids, evals, rule_text, beneficiaries, assets):
+    """Compile the rule of a directive, as returned by process_rule, into
+    a (rule ...) s-expression.
+
+    :param beneficiaries: the directive's people from the oracle
+    :param assets: the directive's assets from the oracle
+    :return: the WMSExpr, or None when the items name assets (or, for
+        rules 3 and 6, people) the directive does not have
+    """
+    ids = sorted(ids, reverse=True)
+    identifier = ids[0]
+    beneficiary_names = [person['full_name'] for person in beneficiaries]
+    asset_names = [asset['name'] for asset in assets]
+    rule_text = list(rule_text)
+    condition = WMPredicate(fn=WMEnumNamedFunction.TRUE, args=[])
+    division = WMSExpr(fn=WMEnumNamedFunction.DIVIDE, args=[])
+
+    if identifier in [0, 1, 3, 5, 6, 11]:
+        assert (beneficiaries)  # beneficiares are available
+        assert (assets) # assets to bequeath are available
+
+    if identifier in [3, 6, 5, 11]:
+        div_criteria = evals if identifier in [3, 6] else evals[0]
+        if identifier in [3, 6]:
+            for (benef, _, _) in div_criteria:
+                if benef not in beneficiary_names:
+                    print(f'No match of Beneficiary {benef}')
+                    return None
+        for (_, asset_n, _) in div_criteria:
+            if asset_n not in asset_names:
+                print(f'No match of asset {asset_n}')
+                return None
+        if div_criteria:
+            division.args = [
+                WMSExpr(fn=WMEnumNamedFunction.SHARE,
+                        args=[variable(person), literal('asset', asset_name), literal('percent', share)])
+                for person, asset_name, share in div_criteria]
+
+    if identifier in [0, 1] or (identifier in [5, 11] and not evals[0]):
+        division = WMSExpr(fn=WMEnumNamedFunction.DIVIDE_EQUALLY,
+                           args=[variable(name) for name in beneficiary_names]
+                           + [literal('asset', name) for name in asset_names])
+
+    if identifier == 5:
+        unalive_people = evals[1]
+        rule_text[rule_text.index(UNALIVE_RULE_TEXT)] = (
+            f"If the following person(s) are not alive:\n"
+            f"  - " + "\n  - ".join(unalive_people) + "\n"
+            f"Then, give the assets to:\n"
+            f"  - " + "\n  - ".join(beneficiary_names)
+        )
+        condition = WMPredicate(fn=WMEnumNamedFunction.AND, args=[
+            WMPredicate(fn=WMEnumNamedFunction.NOT,
+                        args=[WMPredicate(fn=WMEnumNamedFunction.IS_ALIVE, args=[variable(person)])])
+            for person in unalive_people])
+    elif identifier == 11:
+        condition = WMPredicate(fn=WMEnumNamedFunction.AND, args=[
+            WMPredicate(fn=WMEnumNamedFunction.AGE_AT_LEAST, args=[variable(person), literal('int', age)])
+            for person, age in evals[1]])
+
+    return WMSExpr(fn=WMEnumNamedFunction.RULE, args=[literal('rule_ids', json.dumps(ids)),
+                                                      literal('rule_text', json.dumps(rule_text)),
+                                                      condition, division])
+
+
+def compile_bequest(rule, source_to_oracle_asset, assets, residuary=False):
+    """The (bequeath ...) s-expression of a directive: its compiled rule and
+    the oracle assets it was matched to, with their source text."""
+    matched = WMSExpr(fn=WMEnumNamedFunction.ASSETS, args=[
+        WMSExpr(fn=WMEnumNamedFunction.ASSET, args=[literal('asset', asset['name']),
+                                  literal('text', source_to_oracle_asset.get(asset['name'], asset['name']))])
+        for asset in assets])
+    return WMSExpr(fn=WMEnumNamedFunction.BEQUEATH, args=[matched, literal('bool', 'true' if residuary else 'false'), rule])
+
+
+def bequest_parts(bequest):
+    """(rule, [(asset name, source text)], residuary) of a bequeath expression."""
+    matched, residuary, rule = bequest.args
+    assets = [(asset.args[0].value, asset.args[1].value) for asset in matched.args]
+    return rule, assets, residuary.value == 'true'
+
+
+def rule_people(expr):
+    """Names of the people (variable references) in an s-expression."""
+    if isinstance(expr, WMVariableReference):
+        return [expr.name]
+    people = []
+    for arg in getattr(expr, 'args', None) or []:
+        people += [name for name in rule_people(arg) if name not in people]
+    return people
+
+
+################################################################################
+#                                                                              #
+#                                  EVALUATOR                                   #
+#                                                                              #
+################################################################################
+
+
+def check(predicate, db):
+    """Evaluate a predicate against the oracle; returns (holds, reason) with
+    the reason it does not hold.  People missing from the oracle are taken
+    as not alive and of any age."""
+    fn, args = predicate.fn, predicate.args or []
+    if fn == WMEnumNamedFunction.TRUE:
+        return True, None
+    if fn == WMEnumNamedFunction.AND:
+        for arg in args:
+            holds, reason = check(arg, db)
+            if not holds:
+                return False, reason
+        return True, None
+    if fn == WMEnumNamedFunction.NOT:
+        holds, reason = check(args[0], db)
+        if holds:
+            return False, reason
+        return True, None
+    if fn == WMEnumNamedFunction.IS_ALIVE:
+        person = db.by_name(args[0].name)
+        if person and person['alive']=='true':
+            return True, f"{args[0].name} is still alive"
+        return False, f"{args[0].name} is not alive"
+    if fn == WMEnumNamedFunction.AGE_AT_LEAST:
+        age = int(args[1].value)
+        person = db.by_name(args[0].name)
+        if person and person['age']<age:
+            return False, f"{args[0].name} is still less than age: {age}"
+        return True, None
+    raise ValueError(f"Unknown predicate function '{fn}'.")
+
+
+def evaluate_rule(rule, db, beneficiaries):
+    """Execute a (rule ...) s-expression against the oracle.
+
+    :param beneficiaries: the directive's people from the oracle
+    :return: (division, rule ids, rule text), with division None when the
+        condition does not hold
+    """
+    rule_ids, rule_text, condition, division_expr = rule.args
+    ids = json.loads(rule_ids.value)
+    rule_text = json.loads(rule_text.value)
+
+    holds, reason = check(condition, db)
+    if not holds:
+        print(f'\n... Directive cannot be executed because {reason}.\n')
+        return None, ids, rule_text
+
+    people = {}
+    for person in beneficiaries:
+        people.setdefault(person['full_name'], person)
+    division = defaultdict(dict)
+    shares = []
+    if division_expr.fn == WMEnumNamedFunction.DIVIDE_EQUALLY:
+        persons = [people[arg.name] for arg in division_expr.args if isinstance(arg, WMVariableReference)]
+        assets = [{'name': arg.value} for arg in division_expr.args if isinstance(arg, WMLiteralValue)]
+        divide_equally(persons, assets, db, division, shares)
+    else:
+        for share_expr in division_expr.args:
+            person, asset_name, share = share_expr.args[0].name, share_expr.args[1].value, share_expr.args[2].value
+            # Convert share to a percentage if necessary
+            f_share = float(Fraction(share))
+            if f_share :
+                f_share /= 100
+            person_real = people.get(person)
+            if person_real is None:
+                continue
+            if person_real['alive'] != 'true':
+                print(f'Person {person_real["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to their children.')
+                divide_by_stirpes(person_real, db,  shares, asset_name, f_share)
+            else:
+                division[asset_name][person] = f_share
+    # Update the division with any remaining shares
+    add_shares(division, shares)
+
+    for asset, asset_people in division.items():
+        people_div = list(asset_people.keys())
+        for person in people_div:
+            div_person_value = float(asset_people[person])
+            real_person = db.by_name(person)
+            if real_person and int(real_person['age']) < 18:
+                del division[asset][person]
+                division[asset][f"{person} (through custodian)"] = div_person_value
+
+    return division, ids, rule_text
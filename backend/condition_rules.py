@@ -0,0 +1,155 @@
+""" condition_rules.py -- rule identification of literal directive conditions
+
+Most conditions extracted by the frontend are short formulas ("in equal
+shares", "per stirpes", "60% to A and 40% to B", "if A predeceases me",
+"upon attaining the age of 21") that map directly onto the rule ids of
+gpt_req.rule_id_to_text.  identify_rule() matches them locally and
+extracts the rule parameters; it gives up (returns None) as soon as any
+part of the condition text is left unexplained, a condition is negated
+("does not attain", "unless", "until") or its subject is not one of the
+names, and the caller falls back to the LLM votes. """
+
+import re
+import threading
+
+from shares import find_shares, find_names, bind_shares, explained
+
+
+CONDITIONS_PATTERN = re.compile(r"with following conditions: (.*?)(?:\. The name of executor is .*)?\.?\s*$", re.S)
+
+STIRPES_PATTERN = re.compile(r"\bper\s+stirpes\b", re.I)
+EQUAL_PATTERN = re.compile(
+    r"\b(?:in\s+)?equal(?:ly)?(?:\s+(?:shares?|parts?|portions?|proportions?))?\b"
+    r"|\bshare\s+and\s+share\s+alike\b", re.I)
+UNALIVE_PATTERN = re.compile(
+    r"\b(?:if|in\s+the\s+event\s+(?:that\s+)?|should)\s+(?P<subject>[^,.;]*?)\s*,?\s+"
+    r"(?:predeceases?|predecease|does\s+not\s+survive|do\s+not\s+survive|did\s+not\s+survive|"
+    r"fails?\s+to\s+survive|shall\s+not\s+survive|is\s+not\s+(?:alive|living)|are\s+not\s+(?:alive|living)|"
+    r"dies?\s+before)\s+(?:me|my\s+death)\b", re.I)
+AGE_PATTERN = re.compile(
+    r"(?:(?:if|when|once|upon|after|provided\s+(?:that\s+)?)\s+)?(?P<subject>[^,.;]*?)\s*"
+    r"(?:attains?|attaining|reach(?:es)?|reaching|turns?|turning|is\s+at\s+least|being\s+at\s+least)\s+"
+    r"(?:the\s+)?(?:age\s+(?:of\s+)?)?(?:[a-z-]+\s+)?\(?(?P<age>\d{1,3})\)?(?:\s+years(?:\s+of\s+age|\s+old)?)?", re.I)
+# a conjunction opening the subject of an age condition that has none of its own
+SUBJECT_LEAD = re.compile(r"\b(?:if|when|once|upon|after|provided(?:\s+that)?)(?:\s+|$)", re.I)
+# words that turn a survivorship or age condition around ("does not attain", "unless", "until")
+NEGATION_PATTERN = re.compile(r"\b(?:not|never|unless|fails?|failed|failing|before|until|till|cannot)\b|n't", re.I)
+
+# ids that take precedence when several rules apply (see llm_directive_indentifier)
+RULE_PRECEDENCE = [11, 5, 3, 1, 0]
+
+RULE_STATS = {'local': 0, 'llm': 0}
+_stats_lock = threading.Lock()
+
+
+def condition_text(directive_text):
+    """The condition clause of a serialized directive, '' when it has none."""
+    match = CONDITIONS_PATTERN.search(directive_text)
+    return match.group(1).strip() if match else ''
+
+
+def subject_names(subject, names):
+    """Names the subject of a condition mentions; [] if it mentions nobody
+    and None if it says more than names and filler words ("my son", "she",
+    "does not")."""
+    if NEGATION_PATTERN.search(subject) or not explained(subject, [], names):
+        return None
+    return [name for (_, _, name) in find_names(subject, names)]
+
+
+def negated(text, start):
+    """True if the clause of the text before start holds a negation."""
+    clause = re.split(r"[,.;]", text[:start])[-1]
+    return NEGATION_PATTERN.search(clause) is not None
+
+
+def identify_rule(directive_text, assets, beneficiaries, children=()):
+    """Identify the rule of a directive from its literal conditions.
+
+    :param assets: oracle assets of the directive (dicts with a 'name')
+    :param beneficiaries: full names of the beneficiaries
+    :param children: full names of the testator's children
+    :return: None when the conditions need the LLM, else (ids, evals) in
+        the shape gpt_req.process_id returns them: [0]/[1] with no evals,
+        [3] with [(name, asset, percent)] (percents as Fractions), [5, sub] with (division,
+        unalive_people) and [11, sub] with (division, age_reqs)
+    """
+    text = condition_text(directive_text)
+    names = list(beneficiaries) + [c for c in children if c not in beneficiaries]
+    spans, found = [], set()
+
+    if not text:
+        return [1], []
+    for match in STIRPES_PATTERN.finditer(text):
+        spans.append(match.span())
+        found.add(0)
+    for match in EQUAL_PATTERN.finditer(text):
+        spans.append(match.span())
+        found.add(1)
+
+    shares = find_shares(text)
+    division = []
+    if shares:
+        if any(share is None for _, _, share in shares):
+            return None
+        bound = bind_shares(text, shares, beneficiaries)
+        if bound is None or sum(share for _, share in bound) > 1:
+            return None
+        # percent shares, as the LLM returns them, kept exact
+        division = [(name, asset['name'], share * 100) for name, share in bound for asset in assets]
+        spans += [(start, end) for start, end, _ in shares]
+        found.add(3)
+
+    unalive_people = []
+    for match in UNALIVE_PATTERN.finditer(text):
+        subjects = subject_names(match.group('subject'), names)
+        if not subjects or negated(text, match.start()):
+            return None  # pronouns, relations and negations are left to the LLM
+        unalive_people += subjects
+        spans.append(match.span())
+        found.add(5)
+
+    age_reqs = []
+    for match in AGE_PATTERN.finditer(text):
+        start, subject = match.start(), match.group('subject')
+        leads = list(SUBJECT_LEAD.finditer(subject))
+        if match.start() == match.start('subject') and leads:
+            # "60% to A upon attaining 21": the subject starts after "upon"
+            start, subject = match.start('subject') + leads[-1].start(), subject[leads[-1].end():]
+        if NEGATION_PATTERN.search(match.group('subject')) or negated(text, start):
+            return None
+        subjects = subject_names(subject, names)
+        if subjects is None:
+            return None  # a subject that is not one of the names is left to the LLM
+        age_reqs += [(name, int(match.group('age'))) for name in subjects or beneficiaries]
+        spans.append((start, match.end()))
+        found.add(11)
+
+    if not found or not explained(text, spans, names):
+        return None
+    if {1, 3} <= found:
+        return None  # equal shares and percentages contradict each other: let the LLM decide
+    if found & {5, 11} and found & {0}:
+        return None  # stirpes under a survivorship or age condition: let the LLM weigh it
+
+    rule_id = next(r for r in RULE_PRECEDENCE if r in found)
+    sub_id = 3 if 3 in found else 1
+    if rule_id == 5:
+        return [5, sub_id], (division, unalive_people)
+    if rule_id == 11:
+        return [11, sub_id], (division, age_reqs)
+    if rule_id == 3:
+        return [3], division
+    return [rule_id], []
+
+
+def record(local):
+    with _stats_lock:
+        RULE_STATS['local' if local else 'llm'] += 1
+
+
+def rule_summary():
+    """Returns a one-line report of the directives identified locally."""
+    total = RULE_STATS['local'] + RULE_STATS['llm']
+    rate = (100.0 * RULE_STATS['local'] / total) if total else 0.0
+    return f"... Rule fast path: {RULE_STATS['local']}/{total} directives identified locally ({rate:.1f}%)"
@@ -0,0 +1,122 @@
+""" devolution_record.py -- the oracle facts each directive's devolution read
+
+A directive's division only depends on a few facts of the oracle: how its
+names resolve to people, and the alive flag, age and children_ids of those
+people and, through the ones not alive, of their descendants (per stirpes
+shares and custodians).  The
+record of a devolution keeps these facts per directive, next to the
+directive's interpretation and the allocation ledger it was committed
+against, so that a later devolution against an updated oracle can reuse
+every directive whose facts still hold (see devolve_will.devolve). """
+
+import json
+import threading
+
+from compiled_rules import rule_people
+
+
+RECORD_SUFFIX = '.deps.json'
+FACT_FIELDS = ['full_name', 'alive', 'age', 'children_ids']
+
+REUSE_STATS = {'reused': 0, 'recomputed': 0}
+_stats_lock = threading.Lock()
+
+
+def record_path(devolution_path):
+    """The record file kept next to a devolution json."""
+    if devolution_path.endswith('.json'):
+        devolution_path = devolution_path[:-len('.json')]
+    return devolution_path + RECORD_SUFFIX
+
+
+def load_record(devolution_path):
+    """The record of an earlier devolution, or None if it has none."""
+    try:
+        with open(record_path(devolution_path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_record(record, devolution_path):
+    with open(record_path(devolution_path), 'w') as f:
+        json.dump(record, f, indent=1)
+    print(f"... Successfully saved devolution record to file {record_path(devolution_path)}.")
+
+
+def person_facts(person):
+    if person is None:
+        return None
+    return json.loads(json.dumps({field: person.get(field) for field in FACT_FIELDS}))
+
+
+def testator_facts(testator):
+    """What any directive may have read of the testator: their person
+    facts and assets."""
+    return json.loads(json.dumps({'id': testator['id'], 'facts': person_facts(testator), 'assets': testator['assets']}))
+
+
+def directive_facts(directive, beneficiaries, division, compiled, db):
+    """The oracle facts the devolution of one directive read.
+
+    :param beneficiaries: the directive's people as matched in the oracle
+    :param division: the directive's division (asset -> person -> share)
+    :param compiled: the directive's (bequeath ...) s-expression, if any
+    :return: dict with the 'names' and 'full_names' looked up (name ->
+        person id or None) and the 'people' reached from them through
+        the children_ids of people not alive ([id, facts] pairs, facts
+        None for missing people)
+    """
+    names = {}
+    for person in directive._beneficiaries:
+        match = db.match_name(person.name)
+        names[person.name] = match['id'] if match else None
+
+    full_names = {}
+    lookups = [person['full_name'] for person in beneficiaries or []]
+    if compiled is not None:
+        lookups += rule_people(compiled)
+    for asset_people in (division or {}).values():
+        lookups += [person.replace(' (through custodian)', '') for person in asset_people]
+    for name in lookups:
+        match = db.by_name(name)
+        full_names[name] = match['id'] if match else None
+
+    people, pending = {}, [p_id for p_id in list(names.values()) + list(full_names.values()) if p_id is not None]
+    while pending:
+        p_id = pending.pop()
+        if p_id in people:
+            continue
+        person = db.get(p_id)
+        people[p_id] = person_facts(person)
+        if person is not None and person.get('alive') != 'true':
+            pending += person.get('children_ids', [])  # a share per stirpes passes on to them
+    return {'names': names, 'full_names': full_names, 'people': [[p_id, facts] for p_id, facts in people.items()]}
+
+
+def facts_hold(facts, db):
+    """Whether the oracle still resolves the names and holds the facts of
+    a directive_facts() record."""
+    for name, p_id in facts['names'].items():
+        match = db.match_name(name)
+        if (match['id'] if match else None) != p_id:
+            return False
+    for name, p_id in facts['full_names'].items():
+        match = db.by_name(name)
+        if (match['id'] if match else None) != p_id:
+            return False
+    for p_id, person in facts['people']:
+        if person_facts(db.get(p_id)) != person:
+            return False
+    return True
+
+
+def record_reuse(reused):
+    with _stats_lock:
+        REUSE_STATS['reused' if reused else 'recomputed'] += 1
+
+
+def reuse_summary():
+    """Returns a one-line report of the directives reused from earlier devolutions."""
+    total = REUSE_STATS['reused'] + REUSE_STATS['recomputed']
+    return f"... Incremental devolution: {REUSE_STATS['reused']}/{total} directives reused"
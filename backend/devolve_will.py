@@ -1,16 +1,46 @@
 """ devolve_will.py -- devolve (execute) a will """
 
 import argparse
+import atexit
+import json
 import sys
 import pickle
-from collections import defaultdict
+import concurrent.futures
+from collections import defaultdict, namedtuple
 from hashlib import sha256
 import re
 from ORACLES.generate_tree import *
+from ORACLES.oracle import Oracle, as_oracle, clean_name
+from ORACLES.sqlite_oracle import SQLiteOracle, is_sqlite_path
 from schemas.model.wm.wm_will_model import WMWillModel
 import copy
 import ast
 from gpt_req import *
+import llm_client
+from stirpes import StirpesCycleError
+from asset_matching import match_assets, matching_summary
+from residuary import is_residuary, residuary_summary
+from condition_rules import rule_summary
+from shares import directive_shares
+from compiled_rules import (compile_rule, compile_bequest, bequest_parts, evaluate_rule,
+                            divide_by_stirpes, divide_equally, add_shares)
+from ledger import AllocationLedger, configure_ledger
+from will_format import load_will_model, save_will_model, is_will_model_file, content_checksum, WillFormatError
+from merkle import will_checksum
+from devolution_record import (load_record, save_record, testator_facts, directive_facts, facts_hold,
+                               record_reuse, reuse_summary)
+
+
+DIRECTIVE_WORKERS = 4  # directives interpreted concurrently by devolve(); 1 for one after the other
+USE_COMPILED_RULES = True  # execute the rules compiled on an earlier run instead of asking the LLM again
+
+# a directive as interpreted before its shares are allocated; `depends_on`
+# names the testator assets whose allocation the asset matching depended
+# on, `allocated` those of them that were fully allocated at the time, and
+# `compiled` is the directive's (bequeath ...) s-expression
+Interpretation = namedtuple('Interpretation', [
+    'valid', 'source_to_oracle_asset', 'assets', 'beneficiaries', 'division', 'ids', 'rule_text',
+    'asset_trace', 'rule_trace', 'depends_on', 'allocated', 'compiled'])
 
 ################################################################################
 #                                                                              #
@@ -31,7 +61,7 @@ def cmd_line_invocation():
         "--path-to-will",
         type=str,
         required=True,
-        help="Input path to the will's [pickle] object.",
+        help="Input path to the will's Will Model file.",
     )
     parser.add_argument(
         "-d",
@@ -39,7 +69,7 @@ def cmd_line_invocation():
         type=str,
         default="ORACLES/people_db.json",
         required=False,
-        help="Input path to the people's database.",
+        help="Input path to the people's database (json, or a .db/.sqlite store).",
     )
     parser.add_argument(
         "-o",
@@ -49,6 +79,104 @@ def cmd_line_invocation():
         help="Output path to the save the asset division json.",
     )
     parser.add_argument("-m", "--model", type=str, help="Frontend Model")
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        required=False,
+        help="Directory of the persistent LLM response cache.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query the LLM; do not read or write the response cache.",
+    )
+    parser.add_argument(
+        "--llm-workers",
+        type=int,
+        default=MAX_CONCURRENCY,
+        required=False,
+        help="Maximum number of concurrent LLM samples per majority vote.",
+    )
+    parser.add_argument(
+        "--llm-timeout",
+        type=float,
+        default=CALL_TIMEOUT,
+        required=False,
+        help="Timeout in seconds for a single LLM call.",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=llm_client.MAX_CONNECTIONS,
+        required=False,
+        help="Maximum number of pooled HTTP connections to the LLM API.",
+    )
+    parser.add_argument(
+        "--directive-workers",
+        type=int,
+        default=DIRECTIVE_WORKERS,
+        required=False,
+        help="Number of directives interpreted concurrently (1: one after the other).",
+    )
+    parser.add_argument(
+        "--recompile",
+        action="store_true",
+        help="Interpret every directive with the LLM again, ignoring the rules compiled on an earlier run.",
+    )
+    parser.add_argument(
+        "--save-will",
+        type=str,
+        nargs="?",
+        const="",
+        required=False,
+        help="Save the will with the rules compiled by this run, to the given path or, without one, "
+             "over the input Will Model file, so that devolving it again needs no LLM calls.",
+    )
+    parser.add_argument(
+        "--allocation-tolerance",
+        type=float,
+        required=False,
+        help="Share by which an asset may be over-allocated before a directive is refused (default 0.02).",
+    )
+    parser.add_argument(
+        "--previous",
+        type=str,
+        required=False,
+        help="Devolution json of an earlier run of this will; directives whose oracle facts did not change since are reused from its record.",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Identify every directive's rule with LLM votes, even literal conditions.",
+    )
+    parser.add_argument(
+        "--separate-rule-queries",
+        action="store_true",
+        help="Vote on a directive's rule, its items and its division sub-rule in separate rounds.",
+    )
+    parser.add_argument(
+        "--logprob-rule-ids",
+        action="store_true",
+        help="Classify rule ids from the token logprobs of a single LLM call, voting only when unsure.",
+    )
+    parser.add_argument(
+        "--rule-id-margin",
+        type=float,
+        required=False,
+        help="With --logprob-rule-ids, the lowest lead of the top rule id's probability over the runner-up accepted without voting (default 0.5).",
+    )
+    parser.add_argument(
+        "--adaptive-voting",
+        action="store_true",
+        help="Stop drawing LLM samples as soon as a majority vote is decided.",
+    )
+    parser.add_argument(
+        "--vote-confidence",
+        type=float,
+        required=False,
+        help="With --adaptive-voting, also stop once the leading answer holds this share of the samples (e.g. 0.8).",
+    )
 
 
     # to-do: use testator ID for will's location
@@ -66,11 +194,19 @@ def compute_hash(obj_bytes):
 
 
 def load_will(path):
-    """Load the given pickle file and return the Will object."""
-    with open(path, "rb") as f:
-        will_object = pickle.load(f)
-        print(f"... Successfully loaded will from file {path}.")
-    f.close()
+    """Load the given Will Model file and return the Will object.  Wills
+    saved as pickle files by earlier versions are still read."""
+    if is_will_model_file(path):
+        try:
+            will_object = load_will_model(path)
+        except WillFormatError as e:
+            print(f"... error: {e}")
+            sys.exit(1)
+    else:
+        with open(path, "rb") as f:
+            will_object = pickle.load(f)
+        print(f"... Loaded legacy pickled will; re-save it with te_to_wm.py to read it without unpickling.")
+    print(f"... Successfully loaded will from file {path}.")
     return will_object
 
 
@@ -105,244 +241,68 @@ def find_benficiariers(directive, db):
     """Find and validate the beneficiary from the database.
     Currently is based on matching fullname against the database."""
 
-    # remove special characters except period
-    pattern_clean_name = r'[^\w\s.]'
     beneficiaries = directive._beneficiaries
-    # print(directive)
-    # print(beneficiaries)
-    people_dict = {re.sub(pattern_clean_name, '', person["full_name"]).replace('-',''): person for person in db["people"]}
     output_beneficiaries=[]
     for person in beneficiaries:
-        len_b=len(output_beneficiaries)
-        found=False
-        cleaned_name = re.sub(pattern_clean_name, '', person.name).replace('-','')
-        if cleaned_name in people_dict:
-            output_beneficiaries.append(people_dict[cleaned_name])
-            found=True
-            # break
-        if not found:
-            print(f"Error. Beneficiary {cleaned_name} not found in db ... ")
+        match = db.match_name(person.name)
+        if match is None:
+            print(f"Error. Beneficiary {clean_name(person.name)} not found in db ... ")
             return None, False
+        output_beneficiaries.append(match)
 
 
     return output_beneficiaries, True
 
-def validate_and_evaluate_conditions(directive, assets,beneficiaries, db,testator,model_name,region='AZ'):
-    """Find and validate the conditions of each directive.
-    Return divison of assets to each party involved"""
+def interpret_conditions(directive, assets,beneficiaries, db,testator,model_name,trace=None):
+    """Identify the rule of a directive and its items with the LLM, and
+    compile them (see compiled_rules.py).  Returns the (rule ...)
+    s-expression, or None when the items do not fit the directive."""
 
     print(f"Processing Directive: {directive.serialized_text}")
     beneficiares_to_sent = [person['full_name'] for person in beneficiaries]
-    children = []
-    for person in db['people']:
-        if person['id'] in testator['children_ids']:
-            children.append(person['full_name'])
-    identifiers, evals, rule_text = process_rule(directive.serialized_text, assets, testator, beneficiares_to_sent,children,model_name)
-    identifiers.sort(reverse=True)
-    identifier = identifiers[0]
-    division = defaultdict(dict)
-    if identifier in [0,1]:
-        assert (beneficiaries)  # beneficiares are available
-        assert (assets) # assets to bequeath are available
-        shares = []
-        for asset in assets:
-            asset_dict = defaultdict(int)
-            asset_name = asset['name']
-            for person in beneficiaries:
-                equal_division = round(1/len(beneficiaries),5)
-                if person['alive']!='true':
-                    print(f'Person {person["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to thier children.')
-                    divide_by_stirpes(person,db['people'],shares,asset_name, equal_division)
-                    continue
-                asset_dict[person['full_name']]=equal_division
-                division[asset_name].update(asset_dict)
-        for (person,share,asset_name) in shares:
-            division[asset_name][person]=share
-
-    elif identifier  in [3,6]:
-        assert (beneficiaries)  # beneficiares are available
-        assert (assets) # assets to bequeath are available
-        # assert (all([person["alive"]=='true' for person in beneficiaries])) # all beneficiares are alive
-        # ensuring the shares, beneficiares, and assets are valid
-        shares = []
-        for (benef, _, share) in evals:
-            match = False
-            for person in beneficiaries:
-                if person['full_name']==benef:
-
-                    match = True
-            if not match:
-                print(f'No match of Beneficiary {benefs}')
-                return {}
-        for (_, asset_n, share) in evals:
-            match = False
-            for asset in assets:
-                if asset['name'] == asset_n:
-                    match = True
-            if not match:
-                print(f'No match of asset {asset_n}')
-                return {}
-        for person, asset_name, share in evals:
-            
-            # Convert share to a percentage if necessary
-            f_share = float(share)
-            if f_share :
-                f_share /= 100
-            
-            for person_real in beneficiaries:
-                if person == person_real['full_name']:
-                    if person_real['alive'] != 'true':
-                        print(f'Person {person_real["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to their children.')
-                        divide_by_stirpes(person_real, db['people'],  shares, asset_name, f_share)
-                    else:
-                        division[asset_name][person] = f_share
-                    break  
-        # Update the division with any remaining shares
-        for person, share, asset_name in shares:
-            division[asset_name][person] = share
-
-
-    elif identifier==5:
-        assert (beneficiaries)
-        assert (assets)
-        # assert (all([person["alive"]=='true' for person in beneficiaries])) # all beneficiares are alive
-        unalive_people = evals[1]
-        div_criteria = evals[0]
-        people_db = db ['people']
-        shares = []
-        beneficiary_names = [person['full_name'] for person in beneficiaries]
-        rule_text_alive = (
-            f"If the following person(s) are not alive:\n"
-            f"  - " + "\n  - ".join(unalive_people) + "\n"
-            f"Then, give the assets to:\n"
-            f"  - " + "\n  - ".join(beneficiary_names)
-        )
-        index_unalive = rule_text.index("If a person(s) is not alive, transfer assets to another person(s)")
-        rule_text[index_unalive]=rule_text_alive
-        for person_x in unalive_people:
-            for person_y in people_db:
-                if person_x ==person_y['full_name']:
-                    if person_y['alive']=='true':
-                        print(f'\n... Directive cannot be executed because {person_x} is still alive.\n')
-                        return {}
-        if div_criteria: # specific criteria
-            ## checking if all returned assets are real
-            for (_, asset_n, share) in div_criteria:
-                match = False
-                for asset in assets:
-                    if asset['name'] == asset_n:
-                        match = True
-                if not match:
-                    return {}
-
-            for person, asset_name, share in div_criteria:
-                # Convert share to a percentage if necessary
-                f_share = float(share)
-                if f_share :
-                    f_share /= 100
-                
-                for person_real in beneficiaries:
-                    if person == person_real['full_name']:
-                        if person_real['alive'] != 'true':
-                            print(f'Person {person_real["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to their children.')
-                            divide_by_stirpes(person_real, db['people'],  shares, asset_name, f_share)
-                        else:
-                            division[asset_name][person] = f_share
-                        break  
-
-        else: # equal allocation
-            for asset in assets:
-                asset_dict = defaultdict(int)
-                asset_name = asset['name']
-                for person in beneficiaries:
-                    equal_division = round(1/len(beneficiaries),5)
-                    if person['alive']!='true':
-                        print(f'Person {person["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to thier children.')
-                        divide_by_stirpes(person,db['people'],shares,asset_name, equal_division)
-                        continue
-                    asset_dict[person['full_name']]=equal_division
-                    division[asset_name].update(asset_dict)
-
-        for (person,share,asset_name) in shares:
-            division[asset_name][person]=share
-
-    elif identifier==11:
-        assert (beneficiaries)
-        assert (assets)
-        # assert (all([person["alive"]=='true' for person in beneficiaries])) # all beneficiares are alive
-        age_reqs_condition = evals[1]
-        div_criteria = evals[0]
-        people_db = db ['people']
-        shares = []
-        for person_x, age in age_reqs_condition:
-            for person_y in people_db:
-                if person_x ==person_y['full_name']:
-                    if person_y['age']<age:
-                        print(f'\n... Directive cannot be executed because {person_x} is still less than age: {age}.\n')
-                        return {}
-
-        
-        if div_criteria: # specific proportion
-            
-            for (_, asset_n, share) in div_criteria:
-                match = False
-                for asset in assets:
-                    if asset['name'] == asset_n:
-                        match = True
-                if not match:
-                    return {}
-
-            for person, asset_name, share in div_criteria:
-                # Convert share to a percentage if necessary
-                f_share = float(share)
-                if f_share:
-                    f_share /= 100
-                
-                for person_real in beneficiaries:
-                    if person == person_real['full_name']:
-                        if person_real['alive'] != 'true':
-                            print(f'Person {person_real["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to their children.')
-                            divide_by_stirpes(person_real, db['people'],  shares, asset_name, f_share)
-                        else:
-                            division[asset_name][person] = f_share
-                        break  
-
-        else: # equal allocation
-            for asset in assets:
-                asset_dict = defaultdict(int)
-                asset_name = asset['name']
-                for person in beneficiaries:
-                    equal_division = round(1/len(beneficiaries),5)
-                    if person['alive']!='true':
-                        print(f'Person {person["full_name"]} not alive. Dividing asset: {asset_name} per stirpes to thier children.')
-                        divide_by_stirpes(person,db['people'],shares,asset_name, equal_division)
-                        continue
-                    asset_dict[person['full_name']]=equal_division
-                    division[asset_name].update(asset_dict)
-        
-        for (person,share,asset_name) in shares:
-            division[asset_name][person]=share
-
-
-    for asset, asset_people in division.items():
-        people_div = list(asset_people.keys())        
-        for person in people_div:
-            div_person_value = float(asset_people[person])
-            real_person = next((p for p in db['people'] if p['full_name'] == person), None)
-            if real_person and int(real_person['age']) < 18:
-                del division[asset][person]
-                division[asset][f"{person} (through custodian)"] = div_person_value
-
+    children = [person['full_name'] for person in db.children(testator)]
+    shares = directive_shares(directive, beneficiares_to_sent, assets)
+    if shares and trace is not None:
+        trace['Shares'] = {f"{person} / {asset_name}": str(share) for person, asset_name, share in shares}
+    identifiers, evals, rule_text = process_rule(directive.serialized_text, assets, testator, beneficiares_to_sent,children,model_name,trace=trace,shares=shares)
+    return compile_rule(identifiers, evals, rule_text, beneficiaries, assets)
+
+def validate_and_evaluate_conditions(directive, assets,beneficiaries, db,testator,model_name,region='AZ',trace=None):
+    """Find and validate the conditions of each directive.
+    Return divison of assets to each party involved"""
 
+    rule = interpret_conditions(directive, assets, beneficiaries, db, testator, model_name, trace=trace)
+    if rule is None:
+        return {}
+    division, identifiers, rule_text = evaluate_rule(rule, db, beneficiaries)
+    if division is None:
+        return {}
     return division,identifiers, rule_text
 
-def validate_will(will):
-    """Validate the hash of will."""
-    """To-do: add better validation using RSA private key validation."""
+def legacy_checksum(will):
+    """Checksum of wills built by earlier versions: the hash of the will
+    pickled without its checksum and compiled rules."""
     checksum = will.checksum
     will.checksum = None
+    compiled = [(directive, directive.__dict__.pop('compiled_rule')) for directive in will._directives
+                if 'compiled_rule' in directive.__dict__]
     current_hash = compute_hash(pickle.dumps(will))
+    for directive, rule in compiled:
+        directive.compiled_rule = rule
     will.checksum = checksum
+    return current_hash
+
+def validate_will(will):
+    """Validate the hash of will, the root of the Merkle tree over its
+    content (see merkle.py).  The rules compiled by devolution are not part
+    of the checksummed will."""
+    """To-do: add better validation using RSA private key validation."""
+    checksum = will.checksum
+    current_hash = will_checksum(will)
+    for older_checksum in (content_checksum, legacy_checksum):  # wills saved by earlier versions
+        if current_hash == checksum:
+            break
+        current_hash = older_checksum(will)
     if current_hash == checksum:
         print(f"... [STUB] Successful will checksum validation; checksum:{checksum}")
     else:
@@ -351,21 +311,27 @@ def validate_will(will):
 
 def find_testator(will_obj, db,alive_test=False): ## set alive_test to true for realistic checking
     """Find and validate the assets of the testator from the db."""
-    pattern_clean_name = r'[^\w\s.]'
-    people_dict = {re.sub(pattern_clean_name, '', person["full_name"]): person for person in db["people"]}
     testaor=will_obj.testator
-    cleaned_name = re.sub(pattern_clean_name, '', testaor.name)
-    if cleaned_name in people_dict:
+    person = db.match_name(testaor.name, strip_hyphens=False)
+    if person is not None:
         if alive_test: ## mat
-            if people_dict[cleaned_name]['alive']=='true':
+            if person['alive']=='true':
                     print("... error: testator still alive. Cannot proceed further.")
-        return people_dict[cleaned_name]
+        return person
     print("... error: Could not find testator.")
     sys.exit(1)
 
-def find_assets(directive, testator, available_assets,model_name):
+def find_assets(directive, testator, available_assets,model_name,trace=None,dependencies=None):
     """Find and validate the assets of the testator from the db.
-    Supports 'all' and 'all the rest' logic with available_assets."""
+    Supports 'all' and 'all the rest' logic with available_assets.
+    If a trace dict is given, it records for each matched oracle asset
+    which path ('lexical' or 'llm') decided the match.  If a dependencies
+    set is given, it collects the testator assets whose allocation in
+    available_assets the result depends on."""
+    if trace is None:
+        trace = {}
+    if dependencies is None:
+        dependencies = set()
     
     assets_directive = directive._assets
     output_assets = []
@@ -374,21 +340,27 @@ def find_assets(directive, testator, available_assets,model_name):
     if len(assets_directive) == 1:
         asset_name = assets_directive[0].name.lower()
 
-        # Check if it's "all" or "all the rest"
-        llm_query = (
-            f'Give a boolean answer TRUE or FALSE under ans attribute. '
-            f'Evaluate whether the provided asset name "{asset_name}" means ALL or All the Rest of testator assets or Everything of Testator assets ?'
-            f'Do not return True if a specific location is listed in "{asset_name}"'
+        # Check if it's "all" or "all the rest"; formulaic descriptions are
+        # decided by the residuary lexicon, the others by the LLM
+        def ask_llm(asset_name):
+            llm_query = (
+                f'Give a boolean answer TRUE or FALSE under ans attribute. '
+                f'Evaluate whether the provided asset name "{asset_name}" means ALL or All the Rest of testator assets or Everything of Testator assets ?'
+                f'Do not return True if a specific location is listed in "{asset_name}"'
 
-        )
-        query_ans = query_llm_formatted(llm_query, Boolean,model_name)
-        
-        if query_ans.ans:
+            )
+            return query_llm_formatted(llm_query, Boolean,model_name).ans
+
+        means_all, path = is_residuary(asset_name, ask_llm)
+
+        if means_all:
+            dependencies.update(asset_t['name'] for asset_t in testator['assets'])
             for asset_t in testator['assets']:
                 name = asset_t['name']
                 # Include only unallocated or partially allocated assets
-                if name not in available_assets or available_assets[name]['allocation'] < 1.0:
+                if not available_assets.is_full(name):
                     source_to_oracle_asset[asset_t['name']]=asset_name
+                    trace[asset_t['name']] = {'MatchedBy': path, 'Score': None}
                     output_assets.append(asset_t)
             if not output_assets:
                 return source_to_oracle_asset,output_assets, False
@@ -396,31 +368,36 @@ def find_assets(directive, testator, available_assets,model_name):
 
 
     
-    # Fallback: match individual assets
-    for asset in assets_directive:
+    # Fallback: match individual assets (skipping testator assets that are
+    # already fully allocated); confident pairs are decided locally and the
+    # ambiguous ones are sent to the LLM in one query
+    candidates = [asset_t for asset_t in testator['assets']
+                  if not available_assets.is_full(asset_t['name'])]
+    matrix, decided_by = [], []
+    if candidates:
+        matrix, decided_by = match_assets(
+            [asset.name.lower() for asset in assets_directive], candidates,
+            lambda directive_assets, oracle_assets: query_asset_matches(directive_assets, oracle_assets, model_name))
+    if not candidates or any(path == 'llm' for row in decided_by for path, _ in row):
+        # the LLM saw (or would have seen) the other candidates too
+        dependencies.update(asset_t['name'] for asset_t in testator['assets'])
+    else:
+        # lexical decisions are made pair by pair: only the matches matter
+        dependencies.update(asset_t['name'] for i in range(len(assets_directive))
+                            for j, asset_t in enumerate(candidates) if matrix[i][j])
+    for i, asset in enumerate(assets_directive):
         match = False
-        for asset_t in testator['assets']:
-            asset_name = asset_t['name']
-            # Skip if already fully allocated
-            if asset_name in available_assets and available_assets[asset_name]['allocation'] >= 1.0:
-                continue
-
-            llm_query = (
-                f'Give a boolean answer TRUE or FALSE under ans attribute. '
-                f'Evaluate whether any of the assets listed in "{asset.name.lower()}" matches with the following asset (it does not have to be exact spelling match): {asset_t} ?'
-                f'if an automobile is listen in "{asset.name.lower()}", check if any appropriate automobile is listed in {asset_t}?'
-
-            )
-            query_ans = query_llm_formatted(llm_query, Boolean)
-            if query_ans.ans:
+        for j, asset_t in enumerate(candidates):
+            if matrix[i][j]:
                 source_to_oracle_asset[asset_t['name']]=asset.name
+                path, score = decided_by[i][j]
+                trace[asset_t['name']] = {'MatchedBy': path, 'Score': round(score, 3)}
                 output_assets.append(asset_t)
                 match = True
-            
 
         if not match:
             # Handle unmatched asset accordingly
-            random_asset = copy.deepcopy(asset_t)
+            random_asset = copy.deepcopy(testator['assets'][-1])
             random_asset['name'] = ', '.join([asset.name for asset in assets_directive])
             if random_asset not in output_assets:
                 output_assets.append(random_asset)
@@ -428,9 +405,9 @@ def find_assets(directive, testator, available_assets,model_name):
             return source_to_oracle_asset,output_assets, False
     return source_to_oracle_asset,output_assets, True, 
 
-def validate_directive(directive, testator, db, available_assets,model_name):
+def validate_directive(directive, testator, db, available_assets,model_name,asset_trace=None,dependencies=None):
     beneficiaries, cond_1 = find_benficiariers(directive, db)
-    source_to_oracle_asset,assets, cond_2 = find_assets(directive, testator, available_assets,model_name)
+    source_to_oracle_asset,assets, cond_2 = find_assets(directive, testator, available_assets,model_name,trace=asset_trace,dependencies=dependencies)
     if not (cond_1 and cond_2):
         print("Validation Check failed.")
         return False, (source_to_oracle_asset,assets), beneficiaries
@@ -444,79 +421,225 @@ def validate_directive(directive, testator, db, available_assets,model_name):
 #                                                                              #
 ################################################################################
 
-def execute_directive(directive, assets, beneficiaries, testator, db, available_assets,model_name):
-    """Execute the directive by transferring
-    the asset to the corresponding entity."""
+def fully_allocated(available_assets):
+    """Names of the assets no later directive can be given."""
+    return available_assets.fully_allocated()
 
+def evaluate_directive(directive, assets, beneficiaries, testator, db,model_name,trace=None,rule=None):
+    """Evaluate the conditions of the directive, interpreting them with the
+    LLM unless their compiled rule is given.  Returns (division, ids,
+    rule_text, rule); the division is None when the directive cannot be
+    executed, and the rule too when its conditions could not be compiled."""
     try:
-        asset_division, ids, rule_text = validate_and_evaluate_conditions(directive, assets, beneficiaries, db, testator,model_name)
+        if rule is None:
+            rule = interpret_conditions(directive, assets, beneficiaries, db, testator, model_name, trace=trace)
+            if rule is None:
+                return None, None, None, None
+        division, ids, rule_text = evaluate_rule(rule, db, beneficiaries)
+        return division, ids, rule_text, rule
+    except StirpesCycleError as e:
+        print(f"... error: cannot divide per stirpes, {e}.")
     except:
-        return {}
-
-    result = {}
-    valid = True
-
-    if asset_division:
-        for asset_name, asset_details in asset_division.items():
-            if '$' in asset_name:
-                continue
-
-            if asset_name not in result:
-                result[asset_name] = {'beneficiaries': {}}
-
-            for person, proportion in asset_details.items():
-                available_assets[asset_name]['allocation'] += proportion
-                available_assets[asset_name]['allocation'] = round(available_assets[asset_name]['allocation'], 4)
+        pass
+    return None, None, None, None
+
+def interpret_directive(directive, testator, db, available_assets,model_name,speculative=False):
+    """Phase one of executing a directive: match its beneficiaries and
+    assets and evaluate its conditions.  Only reads available_assets (the
+    fully allocated assets are not matched), so directives can be
+    interpreted concurrently against the same ledger.
+    A directive compiled on an earlier run is executed from its compiled
+    rule, without the LLM, as long as its assets are still available; a
+    speculative interpretation returns None rather than asking the LLM
+    when they are not (they may be once earlier directives are allocated)."""
+    compiled = getattr(directive, 'compiled_rule', None) if USE_COMPILED_RULES else None
+    if compiled is not None:
+        interpretation = interpret_compiled(directive, compiled, testator, db, available_assets)
+        if interpretation is not None or speculative:
+            return interpretation
+        print(f"... compiled rule no longer fits the testator's assets, interpreting again: {directive.serialized_text}")
+
+    asset_trace, rule_trace, depends_on = {}, {}, set()
+    validation, assets_packed, beneficiaries = validate_directive(directive, testator, db, available_assets,model_name,asset_trace,depends_on)
+    (source_to_oracle_asset,assets) = assets_packed
+    division, ids, rule_text, compiled = None, None, None, None
+    if validation:
+        division, ids, rule_text, rule = evaluate_directive(directive, assets, beneficiaries, testator, db,model_name,trace=rule_trace)
+        if rule is not None:
+            residuary = any(trace.get('Score', 0) is None for trace in asset_trace.values())
+            compiled = compile_bequest(rule, source_to_oracle_asset, assets, residuary)
+    depends_on = frozenset(depends_on)
+    return Interpretation(validation, source_to_oracle_asset, assets, beneficiaries, division, ids, rule_text,
+                          asset_trace, rule_trace, depends_on, fully_allocated(available_assets) & depends_on, compiled)
+
+def interpret_compiled(directive, compiled, testator, db, available_assets):
+    """Interpret a directive from its (bequeath ...) s-expression.  Returns
+    None if its assets are no longer what asset matching found: one of them
+    is gone from the testator or fully allocated, or, for a residuary
+    bequest, the testator's unallocated assets changed."""
+    rule, pinned, residuary = bequest_parts(compiled)
+    beneficiaries, found = find_benficiariers(directive, db)
+    if not found:
+        return None
+    testator_assets = {}
+    for asset_t in testator['assets']:
+        testator_assets.setdefault(asset_t['name'], asset_t)
+    allocated = fully_allocated(available_assets)
+    names = [name for name, _ in pinned]
+    if residuary:
+        if names != [asset_t['name'] for asset_t in testator['assets'] if asset_t['name'] not in allocated]:
+            return None
+        depends_on = frozenset(testator_assets)
+    else:
+        if any(name not in testator_assets or name in allocated for name in names):
+            return None
+        depends_on = frozenset(names)
+
+    print(f"Executing compiled rule of directive: {directive.serialized_text}")
+    assets = [testator_assets[name] for name in names]
+    asset_trace = {name: {'MatchedBy': 'compiled', 'Score': None} for name in names}
+    rule_trace = {'Compiled': True}
+    division, ids, rule_text, _ = evaluate_directive(directive, assets, beneficiaries, testator, db, None,
+                                                     trace=rule_trace, rule=rule)
+    return Interpretation(True, dict(pinned), assets, beneficiaries, division, ids, rule_text,
+                          asset_trace, rule_trace, depends_on, allocated & depends_on, compiled)
+
+def still_valid(interpretation, available_assets):
+    """Whether interpreting the directive against available_assets would
+    give the same result."""
+    return fully_allocated(available_assets) & interpretation.depends_on == interpretation.allocated
+
+def interpret_directives(directives, testator, db, model_name, workers=None, skip=()):
+    """Interpret all directives concurrently as if no asset was allocated
+    yet; devolve() re-interprets the ones for which that turns out wrong.
+    The directives at the indices in skip are left out (None)."""
+    workers = DIRECTIVE_WORKERS if workers is None else workers
+    if workers <= 1 or len(directives) <= 1:
+        return [None] * len(directives)
+    def interpret(k):
+        if k in skip:
+            return None
+        return interpret_directive(directives[k], testator, db, AllocationLedger(), model_name, speculative=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(directives))) as executor:
+        return list(executor.map(interpret, range(len(directives))))
+
+def interpretation_record(interpretation):
+    """The interpretation as a json object, without its compiled rule
+    (kept on the directive)."""
+    entry = interpretation._asdict()
+    entry.pop('compiled')
+    entry['depends_on'] = sorted(entry['depends_on'])
+    entry['allocated'] = sorted(entry['allocated'])
+    return json.loads(json.dumps(entry))
+
+def reused_interpretation(entry, directive):
+    """The interpretation of an interpretation_record(), traced as the
+    directive's compiled rule would be executed if it has one."""
+    entry = dict(entry)
+    entry['depends_on'] = frozenset(entry['depends_on'])
+    entry['allocated'] = frozenset(entry['allocated'])
+    compiled = getattr(directive, 'compiled_rule', None) if USE_COMPILED_RULES else None
+    if compiled is not None and entry['valid']:
+        entry['asset_trace'] = {name: {'MatchedBy': 'compiled', 'Score': None} for name, _ in bequest_parts(compiled)[1]}
+        entry['rule_trace'] = {'Compiled': True}
+    return Interpretation(compiled=compiled, **entry)
+
+def reusable_directives(previous, directives, testator, db):
+    """Indices of the directives whose recorded oracle facts still hold;
+    none if the testator or the will changed since the previous record."""
+    if not previous or previous.get('testator') != testator_facts(testator):
+        return set()
+    entries = previous.get('directives', [])
+    if len(entries) != len(directives):
+        return set()
+    return {k for k, (directive, entry) in enumerate(zip(directives, entries))
+            if entry['text'] == directive.serialized_text and facts_hold(entry['facts'], db)}
+
+def execute_directive(directive, assets, beneficiaries, testator, db, available_assets,model_name,trace=None):
+    """Execute the directive by transferring
+    the asset to the corresponding entity."""
 
-                if available_assets[asset_name]['allocation'] > 1.02:
-                    valid = False
-                    break
+    asset_division, ids, rule_text, _ = evaluate_directive(directive, assets, beneficiaries, testator, db,model_name,trace=trace)
+    if asset_division is None:
+        return {}
+    return allocate_division(asset_division, ids, rule_text, available_assets)
 
-                result[asset_name]['beneficiaries'][person] = {
-                    'share': round(proportion, 4),
-                    'rules_applied_text': rule_text,
-                    'rules_id': ids
-                }
+def allocate_division(asset_division, ids, rule_text, available_assets):
+    """Phase two of executing a directive: allocate its division in the
+    available_assets ledger, refusing it (and leaving the ledger as it was)
+    if any asset would be over-allocated."""
 
-    if not valid:
+    asset_division = {asset_name: asset_details for asset_name, asset_details in (asset_division or {}).items()
+                      if '$' not in asset_name}
+    if not available_assets.allocate(asset_division):
         print("The directive cannot be executed because one or more assets are already allocated.")
         return {}
 
+    result = {}
+    for asset_name, asset_details in asset_division.items():
+        result[asset_name] = {'beneficiaries': {}}
+        for person, proportion in asset_details.items():
+            result[asset_name]['beneficiaries'][person] = {
+                'share': round(proportion, 4),
+                'rules_applied_text': rule_text,
+                'rules_id': ids
+            }
     return result
 
-def divide_by_stirpes(root_beneficiary, people_db, shares, asset_name, current_percentage=1):
-    """
-    Calculate the stirpes of an asset according to the number of beneficiaries.
-    """
-    children_ids = root_beneficiary.get("children_ids", [])
-    stirped_percentage = current_percentage / len(children_ids) if children_ids else 0
-
-    for b_id in children_ids:
-        person = next((p for p in people_db if p['id'] == b_id), None)
-        if person:
-            if person["alive"] == "true":
-                shares.append((person["full_name"], stirped_percentage,asset_name))
-            else:
-                divide_by_stirpes(person, people_db, shares, asset_name,stirped_percentage)
-
-
 ################################################################################
 #                                                                              #
 #                              Driver Code                                     #
 #                                                                              #
 ################################################################################
-def main():
-    """Load the will, validate its hash,
-    validate each directive,
-    and execute the validated directives."""
+def configure_devolution(directive_workers=None, compiled_rules=None, allocation_tolerance=None):
+    global DIRECTIVE_WORKERS, USE_COMPILED_RULES
+    configure_ledger(allocation_tolerance)
+    if directive_workers is not None:
+        DIRECTIVE_WORKERS = max(1, directive_workers)
+    if compiled_rules is not None:
+        USE_COMPILED_RULES = compiled_rules
+
+
+def configure_llm(cache_dir=DEFAULT_CACHE_DIR, no_cache=False, llm_workers=None,
+                  llm_timeout=None, adaptive_voting=None, vote_confidence=None, max_connections=None):
+    """Apply the LLM runtime options (cache, pooling, sampling and voting)."""
+    if max_connections is not None:
+        llm_client.configure(max_connections=max_connections)
+    configure_sampling(llm_workers, llm_timeout)
+    configure_voting(adaptive_voting, vote_confidence)
+    if no_cache:
+        disable_cache()
+    else:
+        enable_cache(cache_dir)
 
-    args = cmd_line_invocation()
-    path_to_will = args.path_to_will
-    db_path = args.path_to_database
-    output_json_path = args.save_output_json
-    will_object = load_will(path_to_will)
-    db = load_json_obj(db_path)
-    model_name = args.model
+
+def run_summary():
+    """Report of the LLM votes, cache and calls avoided so far."""
+    return "\n".join([voting_summary(), confidence_summary(), cache_summary(), matching_summary(),
+                      residuary_summary(), rule_summary(), reuse_summary()])
+
+
+def devolve(will_object, db, model_name, previous=None, record=None):
+    """Validate the will and its testator, then validate and execute
+    each directive in order. Returns the overall division of assets.
+
+    Each executed directive keeps its compiled rule (compiled_rule), which
+    later runs execute instead of asking the LLM (see interpret_directive).
+
+    The directives are interpreted concurrently first (see
+    interpret_directives) and their divisions allocated in order.  A
+    directive whose asset matching depended on assets that earlier
+    directives have since fully allocated is interpreted again, so the
+    result is the same as executing the directives one by one.
+
+    :param previous: the record of an earlier devolution of the will
+        (see devolution_record.py); a directive whose oracle facts still
+        hold and that meets the same allocations as then is not
+        interpreted again
+    :param record: dict filled with the record of this devolution
+    """
+
+    db = as_oracle(db)
 
     # validate hash of the will
     validate_will(will_object)
@@ -525,49 +648,126 @@ def main():
     testator=find_testator(will_object,db)
     print(f"... Successfully validated testator: {testator['full_name']}.")
 
-    available_assets = {}
-    division_global = {}
-
-    for directive in will_object._directives:
-        validation, assets_packed, beneficiaries = validate_directive(directive, testator, db, available_assets,model_name)
-        (source_to_oracle_asset,assets) = assets_packed
-        if not validation:
+    available_assets = AllocationLedger()
+    rules_applied, traces = {}, {}  # asset name -> {person: rules of the last directive giving them a share}, traces
+    identified, identified_locally = 0, 0  # rules identified by this devolution, counted here as wills run concurrently
+
+    directives = list(will_object._directives)
+    reusable = reusable_directives(previous, directives, testator, db)
+    interpretations = interpret_directives(directives, testator, db, model_name, skip=reusable)
+    entries, reused = [], 0
+
+    for k, (directive, interpretation) in enumerate(zip(directives, interpretations)):
+        ledger = available_assets.allocations()
+        reuse = k in reusable and previous['directives'][k]['ledger'] == ledger
+        if reuse:
+            interpretation = reused_interpretation(previous['directives'][k]['interpretation'], directive)
+            reused += 1
+        elif interpretation is None or not still_valid(interpretation, available_assets):
+            if interpretation is not None:
+                print(f"... re-interpreting directive after earlier allocations: {directive.serialized_text}")
+            interpretation = interpret_directive(directive, testator, db, available_assets,model_name)
+        if previous is not None:
+            record_reuse(reuse)
+        if not reuse and interpretation.valid and 'Compiled' not in interpretation.rule_trace:
+            identified += 1
+            identified_locally += 'FastPath' in interpretation.rule_trace
+        source_to_oracle_asset, assets = interpretation.source_to_oracle_asset, interpretation.assets
+        asset_trace, rule_trace = interpretation.asset_trace, interpretation.rule_trace
+        entries.append({
+            'text': directive.serialized_text,
+            'facts': directive_facts(directive, interpretation.beneficiaries, interpretation.division,
+                                     interpretation.compiled, db),
+            'ledger': ledger,
+            'interpretation': interpretation_record(interpretation),
+        })
+        if not interpretation.valid:
             continue
+        if interpretation.compiled is not None:
+            directive.compiled_rule = interpretation.compiled
 
         for asset in assets:
-            name = asset['name']
-            if name not in available_assets:
-                asset_c = asset.copy()
-                asset_c['allocation'] = 0
-                available_assets[name] = asset_c
+            available_assets.add_asset(asset)
 
-        #  Execute directive immediately (allocates into available_assets)
-        div = execute_directive(directive, assets, beneficiaries, testator, db, available_assets,model_name)
+        #  Allocate the directive's division into available_assets, in document order
+        div = {}
+        if interpretation.division is not None:
+            div = allocate_division(interpretation.division, interpretation.ids, interpretation.rule_text, available_assets)
 
-        # Merge result into output json
+        # Keep the rules applied and the source text of the assets and conditions for the output json
         for asset_name, info in div.items():
-            if asset_name not in division_global:
-                division_global[asset_name] = {'beneficiaries': {}}
             for person, details in info['beneficiaries'].items():
-                division_global[asset_name]['beneficiaries'][person] = details
+                rules_applied.setdefault(asset_name, {})[person] = {
+                    'rules_applied_text': details['rules_applied_text'], 'rules_id': details['rules_id']}
 
-            #  Attach source_text for assets and conitions
-
-            if 'Traces' not in division_global[asset_name]:
-                division_global[asset_name]['Traces'] = {}
-            if 'Assets' not in division_global[asset_name]['Traces']:
-                division_global[asset_name]['Traces']['Assets'] = {}
-            division_global[asset_name]['Traces']['Assets']['SourceText'] = source_to_oracle_asset[asset_name]
+            asset_traces = traces.setdefault(asset_name, {})
+            if 'Assets' not in asset_traces:
+                asset_traces['Assets'] = {}
+            asset_traces['Assets']['SourceText'] = source_to_oracle_asset[asset_name]
+            if asset_name in asset_trace:
+                asset_traces['Assets'].update(asset_trace[asset_name])
+            asset_traces['Rule'] = rule_trace
 
             if hasattr(directive, 'conditions') and directive.conditions:
-                if 'Conditions' not in division_global[asset_name]['Traces']:
-                    division_global[asset_name]['Traces']['Conditions'] = defaultdict(dict)
+                if 'Conditions' not in asset_traces:
+                    asset_traces['Conditions'] = defaultdict(dict)
 
                 condition_traces = []
                 for cond in directive.conditions:
                     condition_traces.append(cond.source_text)
                 for person, details in info['beneficiaries'].items():
-                    division_global[asset_name]['Traces']['Conditions'][person]['SourceText']= condition_traces
+                    asset_traces['Conditions'][person]['SourceText']= condition_traces
+
+    # Render the output json from the ledger
+    division_global = available_assets.division()
+    for asset_name, info in division_global.items():
+        for person, details in info['beneficiaries'].items():
+            details.update(rules_applied[asset_name][person])
+        info['Traces'] = traces[asset_name]
+
+    print(f"... Rule fast path: {identified_locally}/{identified} directives of this will identified without the LLM.")
+    if previous is not None:
+        print(f"... Incremental devolution: {reused}/{len(directives)} directives of this will reused.")
+    if record is not None:
+        record['testator'] = testator_facts(testator)
+        record['directives'] = entries
+    return division_global
+
+
+def main():
+    """Load the will, validate its hash,
+    validate each directive,
+    and execute the validated directives."""
+
+    args = cmd_line_invocation()
+    path_to_will = args.path_to_will
+    db_path = args.path_to_database
+    output_json_path = args.save_output_json
+    will_object = load_will(path_to_will)
+    if is_sqlite_path(db_path):
+        db = SQLiteOracle(db_path)
+        print(f"... Successfully opened people's database {db_path}.")
+    else:
+        db = Oracle(load_json_obj(db_path))
+    model_name = args.model
+
+    configure_llm(args.cache_dir, args.no_cache, args.llm_workers, args.llm_timeout,
+                  args.adaptive_voting, args.vote_confidence, args.max_connections)
+    configure_rules(fast_path=not args.no_fast_path, combined=not args.separate_rule_queries,
+                    logprobs=args.logprob_rule_ids, margin=args.rule_id_margin)
+    configure_devolution(args.directive_workers, compiled_rules=not args.recompile,
+                         allocation_tolerance=args.allocation_tolerance)
+    atexit.register(lambda: print(run_summary()))
+
+    previous = None
+    if args.previous:
+        previous = load_record(args.previous)
+        if previous is None:
+            print(f"... No devolution record next to {args.previous}, devolving every directive.")
+    record = {}
+    division_global = devolve(will_object, db, model_name, previous=previous, record=record)
+    if args.save_will is not None:
+        save_will_model(will_object, args.save_will or path_to_will)
 
     if not division_global:
         print("No directives could be executed due to allocation conflicts.")
@@ -578,6 +778,7 @@ def main():
 
     if output_json_path:
         save_json_obj(division_global, output_json_path)
+        save_record(record, output_json_path)
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import json
 import sys
 import os
 from datetime import datetime
+from ORACLES.sqlite_oracle import SQLiteOracle, is_sqlite_path
 
 def load_json_obj(path):
     if os.path.exists(path):
@@ -32,6 +33,43 @@ def create_person_entry(full_name, age, assets, spouse, alive_status, json_data)
         new_id = len(json_data["people"]) + 1
         print(f"Adding new person with ID {new_id}")
 
+    new_person = new_person_entry(new_id, first_name, last_name, full_name, age, alive_status, assets)
+
+    if spouse:
+        for person in json_data["people"]:
+            if person['full_name'] == spouse:
+                new_person["spouse_id"] = person["id"]
+                person["spouse_id"] = new_id 
+
+    return new_person
+
+def create_person_entry_sqlite(full_name, age, assets, spouse, alive_status, store):
+    """Same as create_person_entry for a SQLite store: only the edited
+    person and their spouse are read and written."""
+    names = full_name.split()
+    first_name = names[0]
+    last_name = " ".join(names[1:]) if len(names) > 1 else ""
+
+    existing_person = store.by_name(full_name)
+    if existing_person:
+        new_id = existing_person["id"]
+        print(f"Replacing existing person with ID {new_id}")
+    else:
+        new_id = store.next_id()
+        print(f"Adding new person with ID {new_id}")
+
+    new_person = new_person_entry(new_id, first_name, last_name, full_name, age, alive_status, assets)
+
+    if spouse:
+        spouse_person = store.by_name(spouse)
+        if spouse_person:
+            new_person["spouse_id"] = spouse_person["id"]
+            spouse_person = dict(spouse_person, spouse_id=new_id)
+            store.put_person(spouse_person)
+
+    return new_person
+
+def new_person_entry(new_id, first_name, last_name, full_name, age, alive_status, assets):
     new_person = {
         "id": new_id,
         "first_name": first_name,
@@ -56,17 +94,11 @@ def create_person_entry(full_name, age, assets, spouse, alive_status, json_data)
         else:
             print(f"Invalid asset format: {asset}. Expected format: 'name,type'")
 
-    if spouse:
-        for person in json_data["people"]:
-            if person['full_name'] == spouse:
-                new_person["spouse_id"] = person["id"]
-                person["spouse_id"] = new_id 
-
     return new_person
 
 if __name__ == "__main__":
     if len(sys.argv) < 6:
-        print("Usage: python add_person.py <json_file> <full_name> <age> <assets (comma-separated)> <alive_status (true/false)> <spouse_name (optional)>")
+        print("Usage: python edit_db.py <json_file or .db/.sqlite store> <full_name> <age> <assets (comma-separated)> <alive_status (true/false)> <spouse_name (optional)>")
         sys.exit(1)
 
     json_file = sys.argv[1]
@@ -80,13 +112,17 @@ if __name__ == "__main__":
         print("Invalid alive status. Use 'true' or 'false'.")
         sys.exit(1)
 
-    json_data = load_json_obj(json_file)
-
     assets = [asset.strip() for asset in assets_input.split(';')]
 
-    new_person = create_person_entry(full_name, age, assets, spouse_name, alive_status, json_data)
-
-    json_data["people"].append(new_person)
-    save_json_obj(json_file, json_data)
+    if is_sqlite_path(json_file):
+        store = SQLiteOracle(json_file)
+        new_person = create_person_entry_sqlite(full_name, age, assets, spouse_name, alive_status, store)
+        store.put_person(new_person)
+        store.close()
+    else:
+        json_data = load_json_obj(json_file)
+        new_person = create_person_entry(full_name, age, assets, spouse_name, alive_status, json_data)
+        json_data["people"].append(new_person)
+        save_json_obj(json_file, json_data)
 
     print(f"Added or replaced person: {full_name} with ID {new_person['id']}")
@@ -0,0 +1,212 @@
+""" estates.py -- devolve the wills of a family together
+
+When a beneficiary of a will is also the testator of another will, what
+they inherit becomes part of their own estate and passes on by their
+will.  devolve_estates() takes a set of wills against one oracle, orders
+the estates so that every estate is devolved after the estates of the
+wills naming its testator (EstateCycleError when the wills name each
+other in a cycle), adds the inherited shares of assets to each estate
+and consolidates the result into one ownership graph: for every asset of
+every estate, who finally holds which share of it.
+
+The oracle has no dates of death, so a testator named by another will of
+the set is taken to have survived that will's testator: the share goes to
+their estate rather than per stirpes to their descendants.  Each estate's
+devolution is memoized on its will and inherited assets. """
+
+import argparse
+import json
+import threading
+
+from ORACLES.oracle import Oracle, OverlayOracle
+from ORACLES.sqlite_oracle import SQLiteOracle, is_sqlite_path
+import devolve_will
+from devolve_will import load_will, load_json_obj, save_json_obj, devolve, configure_llm, configure_devolution
+
+
+ESTATE_MEMO = {}  # (will checksum, testator id, inherited assets) -> division
+ESTATE_STATS = {'devolved': 0, 'memoized': 0}
+_memo_lock = threading.Lock()
+
+
+class EstateCycleError(ValueError):
+    """The wills name each other's testators in a cycle."""
+
+
+def estate_order(testators, named, names):
+    """Order the estates so that each comes after the estates naming it.
+
+    :param testators: testator ids, in the order the wills were given
+    :param named: testator id -> ids of the other testators their will names
+    :param names: testator id -> full name, for the cycle error
+    :return: the testator ids in devolution order
+    """
+    named_by = {t_id: [other for other in testators if t_id in named[other]] for t_id in testators}
+    order, done = [], set()
+
+    def visit(t_id, path):
+        if t_id in done:
+            return
+        if t_id in path:
+            cycle = path[path.index(t_id):] + [t_id]
+            raise EstateCycleError("cycle between wills: " + " -> ".join(names[p_id] for p_id in reversed(cycle)))
+        path.append(t_id)
+        for other in named_by[t_id]:
+            visit(other, path)
+        path.pop()
+        done.add(t_id)
+        order.append(t_id)
+
+    for t_id in testators:
+        visit(t_id, [])
+    return order
+
+
+def holder_name(person):
+    return person.replace(' (through custodian)', '')
+
+
+def inherited_asset_name(asset_name, from_name, taken):
+    """The name of an inherited asset in the heir's estate; the asset's own
+    name unless the heir has an asset of that name already."""
+    if asset_name not in taken:
+        return asset_name
+    return f"{asset_name} (from {from_name})"
+
+
+def devolve_estate(will_object, db, testator, inherited, named, model_name):
+    """Devolve one estate, from memo if it was devolved with the same
+    inherited assets before.
+
+    :param inherited: assets the testator inherited, as oracle assets
+    :param named: ids of the testators of other wills the will names;
+        they are taken as alive
+    """
+    key = (will_object.checksum, testator['id'], json.dumps(inherited, sort_keys=True), tuple(sorted(named)))
+    with _memo_lock:
+        if key in ESTATE_MEMO:
+            ESTATE_STATS['memoized'] += 1
+            return ESTATE_MEMO[key]
+    overrides = {t_id: {'alive': 'true'} for t_id in named}
+    if inherited:
+        overrides.setdefault(testator['id'], {})['assets'] = list(testator.get('assets', [])) + inherited
+    division = devolve(will_object, OverlayOracle(db, overrides) if overrides else db, model_name)
+    with _memo_lock:
+        ESTATE_MEMO[key] = division
+        ESTATE_STATS['devolved'] += 1
+    return division
+
+
+def devolve_estates(wills, db, model_name):
+    """Devolve a family's wills against one oracle.
+
+    :param wills: the WMWillModel objects, one per testator
+    :return: dict with the 'order' of the estates (testator full names),
+        the 'estates' (testator full name -> division of their estate,
+        inherited assets included), the 'transfers' ([from, to, asset,
+        share] edges, shares of the asset's whole) and the consolidated
+        'ownership' ("<original owner>: <asset>" -> {holder: share})
+    """
+    testators, will_of = [], {}
+    for will_object in wills:
+        testator = devolve_will.find_testator(will_object, db)
+        if testator['id'] in will_of:
+            raise ValueError(f"More than one will of {testator['full_name']}.")
+        testators.append(testator['id'])
+        will_of[testator['id']] = will_object
+
+    named = {}
+    for t_id, will_object in will_of.items():
+        names = [person.name for directive in will_object._directives for person in directive._beneficiaries]
+        matches = [db.match_name(name) for name in names]
+        named[t_id] = {match['id'] for match in matches if match is not None and match['id'] in will_of
+                       and match['id'] != t_id}
+
+    order = estate_order(testators, named, {t_id: db.get(t_id)['full_name'] for t_id in testators})
+    print("... Estates in devolution order: " + ", ".join(db.get(t_id)['full_name'] for t_id in order))
+
+    inherited = {t_id: [] for t_id in testators}  # oracle assets of each heir's estate
+    origin = {t_id: {} for t_id in testators}  # estate asset name -> (original owner: asset, share held)
+    estates, transfers, ownership = {}, [], {}
+    for t_id in order:
+        testator = db.get(t_id)
+        name = testator['full_name']
+        for asset in testator.get('assets', []):
+            origin[t_id].setdefault(asset['name'], (f"{name}: {asset['name']}", 1.0))
+        print(f"... Devolving the estate of {name}.")
+        division = devolve_estate(will_of[t_id], db, testator, inherited[t_id], named[t_id], model_name)
+        estates[name] = division
+
+        for asset_name, (source, held) in origin[t_id].items():
+            holders = ownership.setdefault(source, {})
+            given = 0
+            for person, details in division.get(asset_name, {}).get('beneficiaries', {}).items():
+                share = round(held * details['share'], 4)
+                given += details['share']
+                transfers.append([name, person, source, share])
+                heir = db.match_name(holder_name(person))
+                if heir is not None and heir['id'] in named[t_id]:
+                    taken = {asset['name'] for asset in heir.get('assets', [])} | set(origin[heir['id']])
+                    heir_asset = inherited_asset_name(asset_name, name, taken)
+                    inherited[heir['id']].append({'name': heir_asset, 'type': 'Inherited', 'from': name})
+                    origin[heir['id']][heir_asset] = (source, share)
+                else:
+                    holders[person] = round(holders.get(person, 0) + share, 4)
+            if given < 0.9999:
+                # what the will does not give away stays with the estate
+                holders[name] = round(holders.get(name, 0) + held * (1 - given), 4)
+
+    return {'order': [db.get(t_id)['full_name'] for t_id in order], 'estates': estates,
+            'transfers': transfers, 'ownership': ownership}
+
+
+def estate_summary():
+    """Returns a one-line report of the estates devolved and memoized."""
+    return (f"... Estates: {ESTATE_STATS['devolved']} devolved, "
+            f"{ESTATE_STATS['memoized']} reused from memo")
+
+
+def cmd_line_invocation():
+    parser = argparse.ArgumentParser(description="Devolve the wills of a family together, chaining inherited estates.")
+    parser.add_argument("-w", "--wills", type=str, nargs='+', required=True,
+                        help="Input paths to the wills' Will Model files, one per testator.")
+    parser.add_argument("-d", "--path-to-database", type=str, default="ORACLES/people_db.json",
+                        help="Input path to the people's database (json, or a .db/.sqlite store).")
+    parser.add_argument("-o", "--save-output-json", type=str, required=False,
+                        help="Output path to save the estates and the consolidated ownership.")
+    parser.add_argument("-m", "--model", type=str, help="Backend Model")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the LLM response cache.")
+    parser.add_argument("--directive-workers", type=int, default=devolve_will.DIRECTIVE_WORKERS,
+                        help="Number of directives interpreted concurrently (1: one after the other).")
+    return parser.parse_args()
+
+
+def main():
+    args = cmd_line_invocation()
+    wills = [load_will(path) for path in args.wills]
+    if is_sqlite_path(args.path_to_database):
+        db = SQLiteOracle(args.path_to_database)
+    else:
+        db = Oracle(load_json_obj(args.path_to_database))
+
+    configure_llm(no_cache=args.no_cache)
+    configure_devolution(args.directive_workers)
+    try:
+        result = devolve_estates(wills, db, args.model)
+    except EstateCycleError as e:
+        print(f"... error: cannot order the estates, {e}.")
+        raise SystemExit(1)
+
+    print("... Consolidated ownership:")
+    for source, holders in result['ownership'].items():
+        print(f"    {source}: " + ", ".join(f"{person} {share}" for person, share in holders.items()))
+    print(devolve_will.run_summary())
+    print(estate_summary())
+
+    if args.save_output_json:
+        save_json_obj(result, args.save_output_json)
+
+
+if __name__ == "__main__":
+    main()
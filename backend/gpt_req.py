@@ -1,9 +1,30 @@
-from openai import OpenAI
+import sys
+import json
+import math
+import concurrent.futures
+from typing import Literal, Union
 from pydantic import BaseModel
 from collections import Counter
+from llm_cache import ResponseCache, make_key, DEFAULT_CACHE_DIR
+from llm_backend import get_backend
+import condition_rules
 
 
 BASE_TEMP = 0.3
+CACHE = None  # ResponseCache shared by all queries; see enable_cache()
+MAX_CONCURRENCY = 10  # samples of a majority vote that may be in flight at once
+CALL_TIMEOUT = 60  # seconds allowed for a single LLM call
+ADAPTIVE_VOTING = False  # stop drawing samples once the vote is decided
+VOTE_CONFIDENCE = None  # optionally also stop once the leader holds this share of the votes
+MIN_VOTE_SAMPLES = 3  # samples drawn before VOTE_CONFIDENCE is consulted
+VOTE_STATS = []  # one {'decision', 'samples', 'budget'} record per vote
+RULE_FAST_PATH = True  # identify literal conditions locally (see condition_rules.py)
+COMBINED_RULE_QUERY = True  # vote on the rule and its items in one round (see RuleDecision)
+LOGPROB_RULE_IDS = False  # classify rule ids from the logprobs of one completion, voting only if unsure
+RULE_ID_MARGIN = 0.5  # lead of the most likely rule id over the runner-up accepted without voting
+LOGPROB_STATS = []  # one {'decision', 'rule_id', 'margin', 'voted'} record per logprob classification
+RULE_IDS = ['0', '1', '3', '5', '6', '11']
+DIVISION_RULE_IDS = ['1', '3']
 ## Defining Output Objects
 
 class RuleID (BaseModel):
@@ -32,6 +53,43 @@ class RuleOutput11(BaseModel):
 
 class RuleOutputDivision(BaseModel):
     division: list[Division]
+
+class AssetMatchMatrix(BaseModel):
+    matrix: list[list[bool]]
+
+## Rule decisions: the rule id together with the items of that rule, one
+## variant per rule, told apart by their rule_id literal.
+
+class StirpesDecision(BaseModel):
+    rule_id: Literal[0]
+
+class EqualDecision(BaseModel):
+    rule_id: Literal[1]
+
+class ProportionDecision(BaseModel):
+    rule_id: Literal[3]
+    division: list[Division]
+
+class UnaliveDecision(BaseModel):
+    rule_id: Literal[5]
+    unalive_people: list[str]
+    division_rule_id: Literal[1, 3]
+    division: list[Division]
+
+class StateDecision(BaseModel):
+    rule_id: Literal[6]
+    division: list[Division]
+
+class AgeDecision(BaseModel):
+    rule_id: Literal[11]
+    age_reqs: list[AgeRequirement]
+    division_rule_id: Literal[1, 3]
+    division: list[Division]
+
+class RuleDecision(BaseModel):
+    # a plain union: structured outputs accept anyOf but not oneOf, and the
+    # rule_id literals already select the variant when validating
+    decision: Union[StirpesDecision, EqualDecision, ProportionDecision, UnaliveDecision, StateDecision, AgeDecision]
     
 
 rules_text_full_response="""Rules abstraction:
@@ -178,6 +236,10 @@ llm_directive_indentifier = 'Based on the provided rules and directive evaluate
 llm_directive_sub_indentifier = 'Based on the provided rules, testator, directive, available assets and beneficiaries, evaluate which sub rule of Division will be applied (i.e., CHECK any division criteria in the conditions specified, etc). Return an id related with the rule. Return ONLY this Output Format: ID. Example output1: ID: 1, Example output2: ID: 2. Directive: {directive_text}. Testaor name: {t}, Testator Assets: {a}, Beneficiaries of Directive: {b}.\n Sub Rules: '+sub_rules 
 
 llm_directive_return_items = 'Based on the provided rule, directive, testator, available assets and beneficiaries, evaluate the people, assets, and other things requested under the "return" tab. Return the items.  For Asset Division, return Assets ONLY from heading "Testator Assets." Return ONLY the Example Output Format and no other text. Rule: {r}, Directive: {directive_text}. Testator Assets: {a}. Beneficiaries: {b}. Testaor: {t}. Testator children/heir: {children}' 
+
+llm_logprob_answer = '\nAnswer with the id number alone, e.g. 1.'
+
+llm_directive_decision = 'Based on the provided rules, directive, testator, available assets and beneficiaries, evaluate which rule will be applied (i.e., CHECK DIRECTLY THE DIRECTIVE CONDITIONS TO EVALUATE WHICH RULE WILL BE APPLIED) and return its id as rule_id under the decision attribute, together with the people, assets, and other things requested under the "return" tab of that rule. IMPORTANT: If multiple rules apply to the given situation, the RULE with HIGHER ID takes precendence only IF HIGHER ID RULE is APPLICABLE. For rules 5 and 11, also evaluate which sub rule of Division will be applied (i.e., CHECK any division criteria in the conditions specified) and return its id as division_rule_id, with the division of the assets if that sub rule is 3 and an empty division otherwise. For Asset Division, return Assets ONLY from heading "Testator Assets." Directive: {directive_text}. Testator Assets: {a}. Beneficiaries: {b}. Testaor: {t}. Testator children/heir: {children}.\n Rules: '+rules_text_full_response+'\n Sub Rules of Division: '+sub_rules
 # llm_directive_return_items = 'Based on the provided rule, and directive, evaluate the beneficiaries, assets, and other things requested under the "return" tab. Return the items. Return ONLY the Example Output Format and no other text. Rule: {r}, Directive: {directive_text}. Testator Assets: {a}. Beneficiaries: {b}. Testaor: {t}. Testator children/heir: {children}' 
 
 
@@ -211,7 +273,13 @@ def handle_rule(id,directive_text, assets, testator, beneficiaries,children):
     )
     return llm_directive, rule
 
-def process_query_response(id, query_ans,directive_text, assets, testator, beneficiaries, children, ids,model):
+def local_division(shares):
+    """(person, asset, percent) tuples of shares parsed from the directive's
+    conditions (see shares.directive_shares), in the shape of the LLM's
+    RuleOutputDivision items."""
+    return [(person, asset_name, share * 100) for person, asset_name, share in shares]
+
+def process_query_response(id, query_ans,directive_text, assets, testator, beneficiaries, children, ids,model,trace=None,shares=None):
     """Process the response from the LLM query based on the ID."""
     if id in [3, 6]:
         divisions = []
@@ -224,12 +292,15 @@ def process_query_response(id, query_ans,directive_text, assets, testator, benef
         unalive_people = query_ans.unalive_people
 
         llm_directive_division = handle_division_rule(directive_text, assets, testator, beneficiaries, children)
-        division_id = query_id_multiple_times(llm_directive_division,model)
+        division_id = query_id_multiple_times(llm_directive_division,model,trace=trace,decision='RuleID (division)',
+                                              choices=DIVISION_RULE_IDS)
         ids.append(division_id)
         if division_id == 1:
             return divisions, unalive_people
 
         elif division_id == 3:
+            if shares:
+                return local_division(shares), unalive_people
 
             llm_directive, rule = handle_rule(division_id, directive_text, assets, testator, beneficiaries, children)
             fmt = process_format(division_id)
@@ -248,11 +319,14 @@ def process_query_response(id, query_ans,directive_text, assets, testator, benef
             age_reqs.append(tuple_age)
 
         llm_directive_division = handle_division_rule(directive_text, assets, testator, beneficiaries, children)
-        division_id = query_id_multiple_times(llm_directive_division,model)
+        division_id = query_id_multiple_times(llm_directive_division,model,trace=trace,decision='RuleID (division)',
+                                              choices=DIVISION_RULE_IDS)
         ids.append(division_id)
         if division_id == 1:
             return divisions, age_reqs
         elif division_id == 3:
+            if shares:
+                return local_division(shares), age_reqs
 
             llm_directive, rule = handle_rule(division_id, directive_text, assets, testator, beneficiaries, children)
             fmt = process_format(division_id)
@@ -278,7 +352,9 @@ def process_format(id):
     return format
 
     
-def process_id(id_ans, directive_text, assets, testator, beneficiaries, children,model,n=10):
+def process_id(id_ans, directive_text, assets, testator, beneficiaries, children,model,n=10,trace=None,shares=None):
+    """Query the items of the identified rule.  Shares already parsed from
+    the directive's conditions replace the division items of rule 3."""
 
     ids = [id_ans]
     for _ in range(n):
@@ -289,9 +365,11 @@ def process_id(id_ans, directive_text, assets, testator, beneficiaries, children
             rule_id_text = fetch_rules(ids)
             if not fmt:
                 return ids, [], rule_id_text
+            if id == 3 and shares:
+                return ids, local_division(shares), rule_id_text
             # query_ans = query_llm_formatted(llm_directive, fmt)
-            query_ans= query_format_multiple_times (llm_directive,fmt,id,model)
-            result = process_query_response(id, query_ans,directive_text, assets, testator, beneficiaries, children,ids,model)
+            query_ans= query_format_multiple_times (llm_directive,fmt,id,model,trace=trace)
+            result = process_query_response(id, query_ans,directive_text, assets, testator, beneficiaries, children,ids,model,trace=trace,shares=shares)
             rule_id_text = fetch_rules(ids)
             return ids, result, rule_id_text
         except Exception as e:
@@ -300,36 +378,186 @@ def process_id(id_ans, directive_text, assets, testator, beneficiaries, children
     sys.exit(1)
 
 
-def query_llm_formatted(prompt, response_type=RuleOutputDivision, model='gpt-4o-2024-08-06'):
+def enable_cache(cache_dir=DEFAULT_CACHE_DIR, **limits):
+    """Serve repeated structured-output queries from a disk cache."""
+    global CACHE
+    CACHE = ResponseCache(cache_dir, **limits)
+    return CACHE
+
+def disable_cache():
+    global CACHE
+    CACHE = None
+
+def cache_summary():
+    if CACHE is None:
+        return "... LLM cache: disabled"
+    return CACHE.summary()
+
+
+def query_llm_formatted(prompt, response_type=RuleOutputDivision, model='gpt-4o-2024-08-06', sample=0):
+    """Query the LLM for a structured output. `sample` distinguishes the
+    draws of a majority vote so that each one is cached separately."""
     global BASE_TEMP
-    client = OpenAI()
-    response = client.beta.chat.completions.parse(
-        messages=[
+    key = None
+    backend = get_backend()
+    if CACHE is not None:
+        key = make_key(prompt, model, BASE_TEMP, response_type, sample,
+                       getattr(backend, 'cache_namespace', type(backend).__name__))
+        cached = CACHE.get(key)
+        if cached is not None:
+            return response_type.model_validate_json(cached)
+
+    message_content = backend.parse(
+        [
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-        model=model,
+        response_type,
+        model,
+        sample=sample,
         temperature=BASE_TEMP,
-        response_format=response_type
+        timeout=CALL_TIMEOUT
     )
-    
-    message_content = response.choices[0].message.parsed
+    if key is not None and message_content is not None:
+        CACHE.put(key, message_content.model_dump_json())
     return message_content
 
-def query_format_multiple_times (prompt,fmt,id,model,n=10):
-    answers = []
-    answers_formatted = []
-    
-    for _ in range(n):
+def query_asset_matches(directive_assets, oracle_assets, model='gpt-4o-2024-08-06'):
+    """Match every asset named in a directive against every candidate
+    asset of the testator in a single call.  Returns the match matrix as
+    a list of rows, one per directive asset, with one boolean per oracle
+    asset; rows or columns missing from the answer count as no match."""
+    llm_query = (
+        f'Directive assets: {directive_assets}. '
+        f'Testator assets: {oracle_assets}. '
+        f'Return under the matrix attribute one row per directive asset, in the order given, '
+        f'and in each row one boolean per testator asset, in the order given: TRUE if the directive asset '
+        f'matches with the testator asset (it does not have to be exact spelling match), FALSE otherwise. '
+        f'If an automobile is listed in a directive asset, check if any appropriate automobile is listed in the testator asset.'
+    )
+    query_ans = query_llm_formatted(llm_query, AssetMatchMatrix, model)
+    rows = query_ans.matrix if query_ans is not None else []
+    matrix = []
+    for i in range(len(directive_assets)):
+        row = rows[i] if i < len(rows) else []
+        matrix.append([bool(row[j]) if j < len(row) else False for j in range(len(oracle_assets))])
+    return matrix
+
+def configure_sampling(max_concurrency=None, call_timeout=None):
+    """Set the concurrency cap and per-call timeout used by the voting helpers."""
+    global MAX_CONCURRENCY, CALL_TIMEOUT
+    if max_concurrency is not None:
+        MAX_CONCURRENCY = max(1, max_concurrency)
+    if call_timeout is not None:
+        CALL_TIMEOUT = call_timeout
+
+def configure_voting(adaptive=None, confidence=None, min_samples=None):
+    """Switch early-stopping voting on or off and set its confidence bound."""
+    global ADAPTIVE_VOTING, VOTE_CONFIDENCE, MIN_VOTE_SAMPLES
+    if adaptive is not None:
+        ADAPTIVE_VOTING = adaptive
+    if confidence is not None:
+        VOTE_CONFIDENCE = confidence
+    if min_samples is not None:
+        MIN_VOTE_SAMPLES = min_samples
+
+def configure_rules(fast_path=None, combined=None, logprobs=None, margin=None):
+    """Switch the local rule fast path, the combined rule query and rule id
+    logprobs on or off, and set the logprob margin below which rule ids are voted."""
+    global RULE_FAST_PATH, COMBINED_RULE_QUERY, LOGPROB_RULE_IDS, RULE_ID_MARGIN
+    if fast_path is not None:
+        RULE_FAST_PATH = fast_path
+    if combined is not None:
+        COMBINED_RULE_QUERY = combined
+    if logprobs is not None:
+        LOGPROB_RULE_IDS = logprobs
+    if margin is not None:
+        RULE_ID_MARGIN = margin
+
+def voting_summary():
+    """Returns a one-line report of the samples drawn by all votes so far."""
+    used = sum(v['samples'] for v in VOTE_STATS)
+    budget = sum(v['budget'] for v in VOTE_STATS)
+    return (f"... LLM voting: {len(VOTE_STATS)} decisions, {used}/{budget} samples drawn "
+            f"({budget - used} saved)")
+
+def confidence_summary():
+    """Returns a one-line report of the rule ids classified from logprobs."""
+    if not LOGPROB_STATS:
+        return "... Rule id logprobs: disabled" if not LOGPROB_RULE_IDS else "... Rule id logprobs: 0 classifications"
+    confident = sum(1 for c in LOGPROB_STATS if not c['voted'])
+    margin = sum(c['margin'] for c in LOGPROB_STATS) / len(LOGPROB_STATS)
+    return (f"... Rule id logprobs: {confident}/{len(LOGPROB_STATS)} classifications above the "
+            f"{RULE_ID_MARGIN} margin (mean margin {margin:.3f})")
+
+def sample_concurrently(query, n, start=0):
+    """Run query(i) for i in range(start, start + n) on a bounded thread pool.
+    Returns the successful results in sample order; failed samples are
+    dropped, exactly as the sequential loop used to skip them."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, n))) as executor:
+        futures = [executor.submit(query, start + i) for i in range(n)]
+    results = []
+    for future in futures:
         try:
-            query_ans = query_llm_formatted(prompt, fmt,model)
-            output_str = str(query_ans)          
-            answers.append(output_str)           # Store string in answers
-            answers_formatted.append(query_ans)  # Store raw/structured in answers_formatted
+            results.append(future.result())
         except Exception as e:
             pass
+    return results
+
+def draw_votes(query, n, key=lambda ans: ans, accept=lambda ans: True, decision='', trace=None):
+    """Draw up to n samples of query(i) and return the successful answers
+    in sample order.
+
+    With ADAPTIVE_VOTING, samples are drawn in waves just large enough to
+    possibly settle the vote, stopping as soon as the leading answer (by
+    key) is acceptable and cannot be overtaken by the remaining samples,
+    or once it holds VOTE_CONFIDENCE of the votes. The majority is then
+    the same one the full n samples would produce."""
+    if not ADAPTIVE_VOTING:
+        answers, drawn = sample_concurrently(query, n), n
+    else:
+        answers, drawn = [], 0
+        while drawn < n:
+            remaining = n - drawn
+            margin = 0
+            ranked = Counter(key(ans) for ans in answers).most_common(2)
+            if ranked:
+                margin = ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0)
+                leader = answers[[key(ans) for ans in answers].index(ranked[0][0])]
+                if accept(leader):
+                    if margin > remaining:
+                        break
+                    if (VOTE_CONFIDENCE and drawn >= MIN_VOTE_SAMPLES
+                            and ranked[0][1] >= VOTE_CONFIDENCE * drawn):
+                        break
+            wave = min(remaining, max(1, (remaining - margin) // 2 + 1))
+            answers.extend(sample_concurrently(query, wave, start=drawn))
+            drawn += wave
+
+    record = {'decision': decision, 'samples': drawn, 'budget': n}
+    VOTE_STATS.append(record)
+    if trace is not None:
+        trace.setdefault('votes', []).append(record)
+    return answers
+
+def has_payload(query_ans, id):
+    """Whether a rule output carries the items its rule asks for."""
+    if id in [3,6]:
+        return len(getattr(query_ans, 'division', [])) > 0
+    elif id == 5:
+        return len(getattr(query_ans, 'unalive_people', [])) > 0
+    elif id == 11:
+        return len(getattr(query_ans, 'age_reqs', [])) > 0
+    return True
+
+def query_format_multiple_times (prompt,fmt,id,model,n=10,trace=None):
+    answers_formatted = draw_votes(
+        lambda i: query_llm_formatted(prompt, fmt,model,sample=i), n,
+        key=str, accept=lambda ans: has_payload(ans, id),
+        decision=fmt.__name__, trace=trace)  # raw/structured answers
+    answers = [str(query_ans) for query_ans in answers_formatted]   # string form used for voting
     
     counter = Counter(answers)
     common_items = counter.most_common()
@@ -356,22 +584,159 @@ def query_format_multiple_times (prompt,fmt,id,model,n=10):
     return answers_formatted[index]
 
 
-def query_id_multiple_times (prompt,model, n=10):
-    id_answers = []
-    for _ in range(n):
-        try:
-            query_ans=query_llm_formatted(prompt,RuleID,model)
-            id_answers.append(query_ans.id)
-        except Exception as e:
-            pass
+def decision_key(query_ans):
+    """The rule (and division sub-rule) a RuleDecision votes for."""
+    decision = query_ans.decision
+    return decision.rule_id, getattr(decision, 'division_rule_id', None)
+
+def decision_has_payload(query_ans):
+    decision = query_ans.decision
+    if not has_payload(decision, decision.rule_id):
+        return False
+    return getattr(decision, 'division_rule_id', None) != 3 or has_payload(decision, 3)
+
+def query_decision_multiple_times (prompt,model,n=10,trace=None):
+    """Vote on the rule of a directive and its items in one round.  The
+    rule (and division sub-rule) is the majority over all samples; the
+    items are the majority over the samples agreeing with it, preferring
+    the ones that carry the items their rule asks for."""
+    answers = draw_votes(
+        lambda i: query_llm_formatted(prompt, RuleDecision, model, sample=i), n,
+        key=decision_key, accept=decision_has_payload,
+        decision='RuleDecision', trace=trace)
+    if not answers:
+        return None
+    counts = Counter(decision_key(query_ans) for query_ans in answers)
+    rule = max(counts, key=counts.get)
+    agreeing = [query_ans for query_ans in answers if decision_key(query_ans) == rule]
+    agreeing = [query_ans for query_ans in agreeing if decision_has_payload(query_ans)] or agreeing
+    items = Counter(str(query_ans) for query_ans in agreeing)
+    most_common_str = items.most_common(1)[0][0]
+    return next(query_ans for query_ans in agreeing if str(query_ans) == most_common_str)
+
+def process_decision(query_ans, shares=None):
+    """(ids, evals) of a RuleDecision, in the shape process_id returns them."""
+    decision = query_ans.decision
+    rule_id = decision.rule_id
+    division_id = getattr(decision, 'division_rule_id', None)
+    divisions = [(div.person_name,div.asset_name,div.share) for div in getattr(decision, 'division', [])]
+    if shares and 3 in (rule_id, division_id):
+        divisions = local_division(shares)
+    if rule_id in [0, 1]:
+        return [rule_id], []
+    if rule_id in [3, 6]:
+        return [rule_id], divisions
+    if division_id == 1:
+        divisions = []
+    if rule_id == 5:
+        return [5, division_id], (divisions, list(decision.unalive_people))
+    age_reqs = [(req.person_name,req.minimum_age) for req in decision.age_reqs]
+    return [11, division_id], (divisions, age_reqs)
+
+
+def rule_id_probabilities(prompt, choices, model):
+    """Probabilities of the candidate ids (ints) as the answer to the
+    prompt, from the first-token logprobs of a single completion."""
+    prompt = prompt + llm_logprob_answer
+    backend = get_backend()
+    key, logprobs = None, None
+    if CACHE is not None:
+        key = make_key(prompt, model, 0, 'logprobs ' + ' '.join(choices), 0,
+                       getattr(backend, 'cache_namespace', type(backend).__name__))
+        cached = CACHE.get(key)
+        if cached is not None:
+            logprobs = json.loads(cached)
+    if logprobs is None:
+        logprobs = backend.classify(
+            [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            choices,
+            model,
+            temperature=0,
+            timeout=CALL_TIMEOUT
+        )
+        if key is not None:
+            CACHE.put(key, json.dumps(logprobs))
+    return {int(choice): math.exp(logprob) for choice, logprob in logprobs.items()}
+
+def confident_rule_id(prompt, choices, model, n=10, trace=None, decision='RuleID'):
+    """The most likely rule id by rule_id_probabilities if it leads the
+    runner-up by at least RULE_ID_MARGIN, else None (the caller votes).
+    The margin is recorded in the trace under 'confidence'."""
+    try:
+        probabilities = rule_id_probabilities(prompt, choices, model)
+    except Exception as e:
+        print(f"Error: {e}")
+        probabilities = {}
+    ranked = sorted(probabilities.items(), key=lambda p: -p[1])
+    margin = 0.0
+    if ranked:
+        margin = ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0.0)
+    confident = bool(ranked) and margin >= RULE_ID_MARGIN
+    record = {'decision': decision, 'rule_id': ranked[0][0] if ranked else None,
+              'margin': round(margin, 3), 'voted': not confident}
+    LOGPROB_STATS.append(record)
+    if trace is not None:
+        trace.setdefault('confidence', []).append(record)
+    if not confident:
+        return None
+    VOTE_STATS.append({'decision': decision, 'samples': 1, 'budget': n})
+    return ranked[0][0]
+
+def query_id_multiple_times (prompt,model, n=10, trace=None, decision='RuleID', choices=RULE_IDS):
+    """Majority vote on a rule id, or with LOGPROB_RULE_IDS a single
+    classification when it is confident enough."""
+    if LOGPROB_RULE_IDS:
+        rule_id = confident_rule_id(prompt, choices, model, n, trace=trace, decision=decision)
+        if rule_id is not None:
+            return rule_id
+    id_answers = draw_votes(
+        lambda i: query_llm_formatted(prompt,RuleID,model,sample=i).id, n,
+        decision=decision, trace=trace)
     counts = Counter(id_answers)
     return max(counts, key=counts.get)
 
 
-def process_rule(directive_text, assets, testator, beneficiaries,children,model_name):
+def process_rule(directive_text, assets, testator, beneficiaries,children,model_name,trace=None,shares=None):
+    """Identify the rule of a directive and query its rule-specific items.
+    Literal conditions are identified locally; the others by LLM votes.
+    If given, the trace dict collects the samples drawn by each vote, and
+    shares parsed from the conditions replace the LLM's division items.
+    With COMBINED_RULE_QUERY the rule and its items are voted on together
+    (RuleDecision), else the rule, its items and the division sub-rule of
+    rules 5 and 11 are voted on one after the other."""
+
+    if RULE_FAST_PATH:
+        fast = condition_rules.identify_rule(directive_text, assets, beneficiaries, children)
+        condition_rules.record(fast is not None)
+        if fast is not None:
+            ids, evals = fast
+            if trace is not None:
+                trace['FastPath'] = {'rule_ids': list(ids)}
+            return ids, evals, fetch_rules(ids)
 
     llm_directive_indentifier_with_attributes = llm_directive_indentifier.format(directive_text=directive_text)
-    query_ans=query_id_multiple_times(llm_directive_indentifier_with_attributes,model_name)
-    identifier, evals, rule = process_id(query_ans, directive_text, assets, testator, beneficiaries,children,model_name)
-
-    return identifier, evals, rule
\ No newline at end of file
+    if COMBINED_RULE_QUERY:
+        if LOGPROB_RULE_IDS:
+            rule_id = confident_rule_id(llm_directive_indentifier_with_attributes, RULE_IDS, model_name, trace=trace)
+            if rule_id is not None:
+                return process_id(rule_id, directive_text, assets, testator, beneficiaries,children,model_name,trace=trace,shares=shares)
+
+        llm_directive = llm_directive_decision.format(
+            directive_text=directive_text,
+            a=assets, t=testator, b=beneficiaries, children=children
+        )
+        query_ans = query_decision_multiple_times(llm_directive,model_name,trace=trace)
+        if query_ans is not None:
+            ids, evals = process_decision(query_ans, shares)
+            return ids, evals, fetch_rules(ids)
+        print("... no rule decision from the LLM: querying the rule and its items separately.")
+
+    query_ans=query_id_multiple_times(llm_directive_indentifier_with_attributes,model_name,trace=trace)
+    identifier, evals, rule = process_id(query_ans, directive_text, assets, testator, beneficiaries,children,model_name,trace=trace,shares=shares)
+
+    return identifier, evals, rule
@@ -0,0 +1,123 @@
+""" ledger.py -- allocation ledger of the testator's assets
+
+The shares allocated so far are kept in an asset x party matrix (rows and
+columns added as directives name new assets and beneficiaries), with the
+total allocation of each asset alongside.  A directive's division is added
+in one vectorized step and checked at once against the over-allocation
+tolerance; a directive that would over-allocate any asset is rolled back
+entirely.  Shares are summed without intermediate rounding; an asset is
+fully allocated once its total rounds to 1 at FULL_DIGITS decimals.
+division() renders the ledger as the devolution json's division. """
+
+import numpy as np
+
+
+ALLOCATION_TOLERANCE = 0.02  # an asset may be over-allocated by this much before a directive is refused
+FULL_DIGITS = 4  # decimals at which an asset's total allocation counts as 1
+
+
+class AllocationLedger:
+    """Shares of the testator's assets allocated to each party."""
+
+    def __init__(self, tolerance=None):
+        self.tolerance = ALLOCATION_TOLERANCE if tolerance is None else tolerance
+        self.assets = {}  # name -> row
+        self.parties = {}  # name -> column
+        self.details = {}  # name -> the oracle asset
+        self.allocated = {}  # asset name -> {party: column}, in the order the shares were allocated
+        self.shares = np.zeros((8, 8))
+        self.totals = np.zeros(8)
+
+    def _grow(self, rows, columns):
+        """Make room for the given number of assets and parties, doubling
+        the matrix so that growing it stays amortized constant."""
+        r, c = self.shares.shape
+        if rows <= r and columns <= c:
+            return
+        shares = np.zeros((r if rows <= r else max(rows, 2 * r), c if columns <= c else max(columns, 2 * c)))
+        shares[:r, :c] = self.shares
+        totals = np.zeros(shares.shape[0])
+        totals[:r] = self.totals
+        self.shares, self.totals = shares, totals
+
+    def add_asset(self, asset):
+        """Register an oracle asset (dict with a 'name'), unallocated."""
+        name = asset['name']
+        if name not in self.assets:
+            self._grow(len(self.assets) + 1, len(self.parties))
+            self.assets[name] = len(self.assets)
+            self.details[name] = asset
+        return self.assets[name]
+
+    def _party(self, name):
+        if name not in self.parties:
+            self._grow(len(self.assets), len(self.parties) + 1)
+            self.parties[name] = len(self.parties)
+        return self.parties[name]
+
+    def __contains__(self, name):
+        return name in self.assets
+
+    def __len__(self):
+        return len(self.assets)
+
+    def allocation(self, name):
+        """Total share of the asset allocated so far (0 if unknown)."""
+        return float(self.totals[self.assets[name]]) if name in self.assets else 0.0
+
+    def is_full(self, name):
+        return name in self.assets and round(self.allocation(name), FULL_DIGITS) >= 1.0
+
+    def fully_allocated(self):
+        """Names of the assets no later directive can be given."""
+        full = np.round(self.totals[:len(self.assets)], FULL_DIGITS) >= 1.0
+        return frozenset(name for name, row in self.assets.items() if full[row])
+
+    def allocations(self):
+        """{asset name: total allocation}, rounded at FULL_DIGITS decimals."""
+        return {name: round(self.allocation(name), FULL_DIGITS) for name in self.assets}
+
+    def allocate(self, division):
+        """Add a directive's division ({asset name: {party: share}}) to the
+        ledger, unless it would over-allocate an asset.
+
+        :return: True if allocated; False, with the ledger unchanged, if
+            any asset would exceed 1 + tolerance
+        """
+        entries = [(asset_name, party, share) for asset_name, parties in division.items()
+                   for party, share in parties.items()]
+        if not entries:
+            return True
+        rows = np.array([self.add_asset(self.details.get(asset_name, {'name': asset_name}))
+                         for asset_name, _, _ in entries])
+        columns = np.array([self._party(party) for _, party, _ in entries])
+        values = np.array([float(share) for _, _, share in entries])
+
+        touched = np.unique(rows)
+        saved_shares, saved_totals = self.shares[touched].copy(), self.totals[touched].copy()
+        np.add.at(self.shares, (rows, columns), values)
+        np.add.at(self.totals, rows, values)
+        if np.any(np.round(self.totals[touched], FULL_DIGITS) > 1.0 + self.tolerance):
+            self.shares[touched], self.totals[touched] = saved_shares, saved_totals
+            return False
+        for (asset_name, party, _), column in zip(entries, columns):
+            self.allocated.setdefault(asset_name, {})[party] = int(column)
+        return True
+
+    def division(self):
+        """{asset name: {'beneficiaries': {party: {'share': share}}}} of
+        everything allocated, in the shape of the devolution json: assets
+        and parties in the order they were first allocated, each share the
+        sum of the party's allocations rounded at 4 decimals."""
+        division = {}
+        for name, columns in self.allocated.items():
+            row = self.assets[name]
+            division[name] = {'beneficiaries': {party: {'share': round(float(self.shares[row, column]), 4)}
+                                                for party, column in columns.items()}}
+        return division
+
+
+def configure_ledger(tolerance=None):
+    global ALLOCATION_TOLERANCE
+    if tolerance is not None:
+        ALLOCATION_TOLERANCE = tolerance
@@ -0,0 +1,419 @@
+""" llm_backend.py -- pluggable LLM backends: OpenAI, fixture replay and a
+deterministic rule-based stub for offline runs and benchmarks.
+
+The backend is selected with the DASS_LLM_BACKEND environment variable
+(openai, stub, replay or record); replay and record read/write the JSON
+fixtures file named by DASS_LLM_FIXTURES. """
+
+import os
+import re
+import math
+import ast
+import json
+import atexit
+import threading
+from hashlib import sha256
+
+import llm_client
+
+
+BACKEND_ENV = "DASS_LLM_BACKEND"
+FIXTURES_ENV = "DASS_LLM_FIXTURES"
+DEFAULT_FIXTURES = "llm_fixtures.json"
+TOP_LOGPROBS = 20  # most likely first tokens requested by classify()
+
+_backend = None
+_lock = threading.Lock()
+
+
+################################################################################
+#                                                                              #
+#                                  BACKENDS                                    #
+#                                                                              #
+################################################################################
+
+
+class OpenAIBackend:
+    """Sends requests to the OpenAI API through the shared pooled client."""
+
+    cache_namespace = "openai"  # responses cached under this name are real model answers
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else llm_client.get_client()
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        """Structured output: returns an instance of response_format."""
+        response = self.client.beta.chat.completions.parse(
+            messages=messages, model=model, response_format=response_format, **params
+        )
+        return response.choices[0].message.parsed
+
+    def complete(self, messages, model, sample=0, **params):
+        """Free-text completion: returns the message content."""
+        response = self.client.chat.completions.create(
+            messages=messages, model=model, **params
+        )
+        return response.choices[0].message.content
+
+    def classify(self, messages, choices, model, sample=0, **params):
+        """Log-probabilities of the candidate answers as the first token of
+        one completion: returns {choice: logprob} for the choices among the
+        most likely tokens (choices never proposed are left out)."""
+        response = self.client.chat.completions.create(
+            messages=messages, model=model, logprobs=True, top_logprobs=TOP_LOGPROBS, max_tokens=1, **params
+        )
+        content = response.choices[0].logprobs.content
+        logprobs = {}
+        for candidate in (content[0].top_logprobs if content else []):
+            token = candidate.token.strip()
+            if token in choices and candidate.logprob > logprobs.get(token, -math.inf):
+                logprobs[token] = candidate.logprob
+        return logprobs
+
+
+def fixture_key(kind, messages, model, response_format=None, sample=0):
+    """Key of a recorded request: what was asked, of which model, in which
+    format, and which draw of a repeated sample it was."""
+    schema = response_format.__name__ if response_format is not None else None
+    payload = json.dumps(
+        {"kind": kind, "messages": messages, "model": model, "format": schema, "sample": sample},
+        sort_keys=True,
+    )
+    return sha256(payload.encode()).hexdigest()
+
+
+class ReplayBackend:
+    """Answers from a fixtures file recorded with RecordingBackend.
+    A request that was never recorded is sent to `fallback` if one is
+    given, and is an error otherwise."""
+
+    cache_namespace = "openai"
+
+    def __init__(self, fixtures_path, fallback=None):
+        with open(fixtures_path, "r") as f:
+            self.fixtures = json.load(f)
+        self.fallback = fallback
+
+    def _lookup(self, key):
+        if key not in self.fixtures:
+            return None
+        return self.fixtures[key]["response"]
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        response = self._lookup(fixture_key("parse", messages, model, response_format, sample))
+        if response is None:
+            if self.fallback is None:
+                raise KeyError(f"No recorded {response_format.__name__} response for this request.")
+            return self.fallback.parse(messages, response_format, model, sample, **params)
+        return response_format.model_validate_json(response)
+
+    def complete(self, messages, model, sample=0, **params):
+        response = self._lookup(fixture_key("complete", messages, model, None, sample))
+        if response is None:
+            if self.fallback is None:
+                raise KeyError("No recorded completion for this request.")
+            return self.fallback.complete(messages, model, sample, **params)
+        return response
+
+    def classify(self, messages, choices, model, sample=0, **params):
+        response = self._lookup(fixture_key("classify", messages, model, None, sample))
+        if response is None:
+            if self.fallback is None:
+                raise KeyError("No recorded logprobs for this request.")
+            return self.fallback.classify(messages, choices, model, sample, **params)
+        return response
+
+
+class RecordingBackend:
+    """Forwards requests to another backend and records the answers to a
+    fixtures file (saved at exit) for later replay."""
+
+    cache_namespace = "openai"
+
+    def __init__(self, inner, fixtures_path):
+        self.inner = inner
+        self.fixtures_path = fixtures_path
+        self.fixtures = {}
+        if os.path.isfile(fixtures_path):
+            with open(fixtures_path, "r") as f:
+                self.fixtures = json.load(f)
+        self._lock = threading.Lock()
+        atexit.register(self.save)
+
+    def _record(self, key, response):
+        with self._lock:
+            self.fixtures[key] = {"response": response}
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        answer = self.inner.parse(messages, response_format, model, sample, **params)
+        if answer is not None:
+            key = fixture_key("parse", messages, model, response_format, sample)
+            self._record(key, answer.model_dump_json())
+        return answer
+
+    def complete(self, messages, model, sample=0, **params):
+        answer = self.inner.complete(messages, model, sample, **params)
+        self._record(fixture_key("complete", messages, model, None, sample), answer)
+        return answer
+
+    def classify(self, messages, choices, model, sample=0, **params):
+        answer = self.inner.classify(messages, choices, model, sample, **params)
+        self._record(fixture_key("classify", messages, model, None, sample), answer)
+        return answer
+
+    def save(self):
+        with self._lock:
+            with open(self.fixtures_path, "w") as f:
+                json.dump(self.fixtures, f, indent=1, sort_keys=True)
+
+
+class StubBackend:
+    """Deterministic, rule-based stand-in for the LLM. It reads the prompts
+    built by gpt_req and the frontend and answers them with keyword
+    heuristics, returning the same pydantic types as the real model.
+    Answers are plausible, not accurate; use it to exercise and time the
+    pipeline, not to judge extraction quality."""
+
+    cache_namespace = "stub"
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        prompt = "\n".join(m["content"] for m in messages)
+        handler = getattr(self, "_parse_" + response_format.__name__, None)
+        if handler is None:
+            raise ValueError(f"StubBackend does not support the response format {response_format.__name__}.")
+        if response_format.__name__ == "Will":
+            return response_format.model_validate(handler(messages[-1]["content"]))
+        return response_format.model_validate(handler(prompt))
+
+    def complete(self, messages, model, sample=0, **params):
+        # coreference prompts end with "N. no antecedent": never resolve
+        match = re.search(r"(\d+)\. no antecedent", messages[-1]["content"])
+        return match.group(1) if match else "1"
+
+    def classify(self, messages, choices, model, sample=0, **params):
+        # rule id prompts only; the keyword rules are taken to be 90% sure
+        answer = str(self._parse_RuleID("\n".join(m["content"] for m in messages))["id"])
+        rest = math.log(0.1 / max(1, len(choices) - 1))
+        return {choice: math.log(0.9) if choice == answer else rest for choice in choices}
+
+    ## gpt_req prompts
+
+    def _parse_RuleID(self, prompt):
+        conditions = stub_conditions(prompt).lower()
+        if "sub rule of division" in prompt.lower():
+            return {"id": 3 if PERCENT_PATTERN.search(conditions) else 1}
+        return {"id": stub_rule_id(conditions)}
+
+    def _parse_RuleDecision(self, prompt):
+        conditions = stub_conditions(prompt).lower()
+        rule_id = stub_rule_id(conditions)
+        decision = {"rule_id": rule_id}
+        if rule_id in [3, 5, 11]:
+            decision.update(self._parse_RuleOutputDivision(prompt))
+        if rule_id in [5, 11]:
+            decision["division_rule_id"] = 3 if PERCENT_PATTERN.search(conditions) else 1
+            if decision["division_rule_id"] == 1:
+                decision["division"] = []
+            decision.update(self._parse_RuleOutput5(prompt) if rule_id == 5 else self._parse_RuleOutput11(prompt))
+        return {"decision": decision}
+
+    def _parse_Boolean(self, prompt):
+        quoted = re.search(r'"([^"]*)"', prompt)
+        asset_text = quoted.group(1).lower() if quoted else ""
+        if "means all" in prompt.lower():
+            is_all = bool(re.search(r"\b(all|rest|residue|remainder|everything|estate)\b", asset_text))
+            return {"ans": is_all and " in " not in f" {asset_text} "}
+        oracle_asset = prompt.split("spelling match):", 1)[-1].split("?", 1)[0].lower()
+        return {"ans": bool(stub_tokens(asset_text) & stub_tokens(oracle_asset))}
+
+    def _parse_AssetMatchMatrix(self, prompt):
+        directive_assets = stub_literal(prompt, r"Directive assets: (\[.*?\])\. Testator assets")
+        oracle_assets = stub_literal(prompt, r"Testator assets: (\[.*?\])\. Return")
+        return {"matrix": [[bool(stub_tokens(d) & stub_tokens(str(o).lower())) for o in oracle_assets]
+                           for d in directive_assets]}
+
+    def _parse_RuleOutputDivision(self, prompt):
+        division = []
+        shares = PERCENT_PATTERN.findall(stub_conditions(prompt))
+        beneficiaries = stub_literal(prompt, r"Beneficiaries(?: of Directive)?: (\[.*?\])")
+        assets = stub_literal(prompt, r"Testator Assets: (\[.*?\])\.")
+        if shares and len(shares) == len(beneficiaries):
+            for beneficiary, share in zip(beneficiaries, shares):
+                for asset in assets:
+                    division.append({"person_name": beneficiary, "asset_name": asset["name"],
+                                     "share": float(share)})
+        return {"division": division}
+
+    def _parse_RuleOutput5(self, prompt):
+        match = re.search(r"\bif (?:my \w+, )?(.+?),? (?:should not|does not|shall not|fails to|predeceases)",
+                          stub_conditions(prompt), re.I)
+        return {"unalive_people": [match.group(1).strip()] if match else []}
+
+    def _parse_RuleOutput11(self, prompt):
+        age = AGE_PATTERN.search(stub_conditions(prompt))
+        beneficiaries = stub_literal(prompt, r"Beneficiaries(?: of Directive)?: (\[.*?\])")
+        age_reqs = []
+        if age and age.group("age").isdigit():
+            age_reqs = [{"person_name": b, "minimum_age": int(age.group("age"))} for b in beneficiaries]
+        return {"age_reqs": age_reqs}
+
+    ## frontend prompt
+
+    def _parse_Will(self, text):
+        return stub_extract_will(text)
+
+
+################################################################################
+#                                                                              #
+#                               STUB HEURISTICS                                #
+#                                                                              #
+################################################################################
+
+
+PERCENT_PATTERN = re.compile(r"\(?(?P<num>\d+(?:\.\d+)?)\)?\s*(?:%|percent|per cent)", re.I)
+AGE_PATTERN = re.compile(r"age of (?:\w+ )?\(?(?P<age>\d+)\)?", re.I)
+UNALIVE_PATTERN = re.compile(
+    r"\b(?:not survive|predecease|not be living|not living|not alive|is deceased|fails to survive)", re.I
+)
+BEQUEST_PATTERN = re.compile(
+    r"\b(?:give|leave|bequeath|devise)s?\b(?:,?\s*(?:and|give|leave|bequeath|devise)\b)*\s+"
+    r"(?:(?:the )?ownership of )?(?P<asset>.+?)\s*(?:,?\s*as follows:|\s+(?:in fee,?\s+)?to\s)(?P<rest>.*)",
+    re.I,
+)
+NAME_PATTERN = re.compile(r"\[?\b[A-Z][\w-]*(?:\s+[A-Z][\w-]*)*\]?")
+CONDITION_PATTERNS = [
+    re.compile(r"\bper stirpes\b", re.I),
+    re.compile(r"\bin equal shares\b|\bequally\b", re.I),
+    PERCENT_PATTERN,
+    re.compile(r"\bif\b[^,.;]+", re.I),
+    re.compile(r"\b(?:attains?|reaches?) the age of \w+(?: \(\d+\))?", re.I),
+]
+
+
+def stub_tokens(text):
+    return set(re.findall(r"[a-z0-9]{3,}", text.lower()))
+
+
+def stub_rule_id(conditions):
+    if AGE_PATTERN.search(conditions):
+        return 11
+    if UNALIVE_PATTERN.search(conditions):
+        return 5
+    if PERCENT_PATTERN.search(conditions):
+        return 3
+    if "per stirpes" in conditions:
+        return 0
+    return 1
+
+
+def stub_conditions(prompt):
+    """The condition clause of a serialized directive in a prompt."""
+    match = re.search(r"with following conditions: (.*?)(?:\. The name of executor|\.\s|$)", prompt, re.S)
+    return match.group(1) if match else ""
+
+
+def stub_literal(prompt, pattern):
+    """A python literal (list of names or asset dicts) embedded in a prompt."""
+    match = re.search(pattern, prompt, re.S)
+    if not match:
+        return []
+    try:
+        return ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        return []
+
+
+def stub_extract_will(text):
+    """Keyword extraction of testator, bequests and their conditions,
+    shaped like the frontend's Will response."""
+    testator = re.search(r"\bI,\s*([^,]+?),", text)
+    testator_name = testator.group(1).strip() if testator else "Unknown"
+    date = re.search(r"\d{1,2}(?:st|nd|rd|th)? day of \w+,? \d{4}|\w+ \d{1,2}, \d{4}", text)
+
+    ids = iter(range(1, 10**6))
+    entities = {"testator": {"id": f"e{next(ids)}", "name": testator_name},
+                "executor": [], "beneficiary": [], "asset": [], "condition": []}
+    executor = re.search(r"appoint (?:my [\w ]+?, )?([^,]+?),? (?:as|to serve as) (?:the )?Execut", text, re.I)
+    if executor:
+        entities["executor"].append({"id": f"e{next(ids)}", "name": executor.group(1).strip()})
+
+    def entity_id(kind, field, value):
+        for entity in entities[kind]:
+            if entity[field] == value:
+                return entity["id"]
+        entity = {"id": f"e{next(ids)}", field: value}
+        entities[kind].append(entity)
+        return entity["id"]
+
+    events = []
+    for sentence in re.split(r"(?<=[.;])\s+", text):
+        match = BEQUEST_PATTERN.search(sentence)
+        if not match:
+            continue
+        conditions = []
+        for pattern in CONDITION_PATTERNS:
+            for cond in pattern.finditer(sentence):
+                conditions.append(entity_id("condition", "text", cond.group(0).strip()))
+        events.append({
+            "id": f"v{len(events) + 1}",
+            "type": "Bequest",
+            "Testator": entities["testator"]["id"],
+            "Executor": [e["id"] for e in entities["executor"]],
+            "Beneficiary": [entity_id("beneficiary", "name", name)
+                            for name in NAME_PATTERN.findall(match.group("rest")) if name not in ("I", "If")],
+            "Asset": [entity_id("asset", "description", match.group("asset").strip())],
+            "Condition": conditions,
+        })
+
+    return {
+        "testator_name": testator_name,
+        "date_of_will": date.group(0) if date else "",
+        "extractions": {"entities": [entities], "events": events},
+    }
+
+
+################################################################################
+#                                                                              #
+#                               BACKEND SELECTION                              #
+#                                                                              #
+################################################################################
+
+
+def backend_from_env():
+    """Build the backend named by DASS_LLM_BACKEND (default: openai)."""
+    name = os.environ.get(BACKEND_ENV, "openai").lower()
+    fixtures = os.environ.get(FIXTURES_ENV, DEFAULT_FIXTURES)
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "stub":
+        return StubBackend()
+    if name == "replay":
+        return ReplayBackend(fixtures)
+    if name == "record":
+        return RecordingBackend(OpenAIBackend(), fixtures)
+    raise ValueError(f"Unknown LLM backend '{name}'; expected openai, stub, replay or record.")
+
+
+def requires_api_key():
+    """Whether the configured backend talks to the OpenAI API."""
+    return os.environ.get(BACKEND_ENV, "openai").lower() in ("openai", "record")
+
+
+def get_backend():
+    """Return the process-wide backend, choosing it from the environment on first use."""
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = backend_from_env()
+        return _backend
+
+
+def set_backend(backend):
+    """Install a backend for all subsequent LLM requests (None: re-read the environment)."""
+    global _backend
+    with _lock:
+        _backend = backend
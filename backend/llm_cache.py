@@ -0,0 +1,144 @@
+""" llm_cache.py -- persistent, content-addressed cache of LLM responses """
+
+import os
+import json
+import time
+import threading
+from hashlib import sha256
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dass-wills", "llm")
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MiB
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60  # 30 days, in seconds
+EVICT_EVERY = 500  # run an eviction pass every N writes
+
+
+def schema_of(response_type):
+    """Returns a JSON-able description of the response format."""
+    if response_type is None:
+        return None
+    if hasattr(response_type, "model_json_schema"):
+        return response_type.model_json_schema()
+    return str(response_type)
+
+
+def make_key(prompt, model, temperature, response_type, sample=0, namespace="openai"):
+    """Hash of everything that determines a structured-output response:
+    prompt, model, temperature, response schema and the sample index
+    (so that the n draws of a majority vote are cached separately).
+    The namespace keeps answers of stand-in backends apart from real ones."""
+    payload = json.dumps(
+        {
+            "namespace": namespace,
+            "prompt": prompt,
+            "model": model,
+            "temperature": temperature,
+            "schema": schema_of(response_type),
+            "sample": sample,
+        },
+        sort_keys=True,
+    )
+    return sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """A directory of JSON entries, one file per key, sharded by the first
+    two hex characters of the key.  Entries older than `max_age` seconds
+    are dropped on read; the least recently used entries are evicted once
+    the cache grows past `max_entries` or `max_bytes`."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Returns the cached response text for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                self._count(False)
+                return None
+            with open(path, "r") as f:
+                entry = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        self._count(True)
+        return entry["response"]
+
+    def put(self, key, response):
+        """Stores the response text under key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, "created": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Removes expired entries, then the least recently used ones
+        until the cache is within its size limits."""
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.max_age:
+                    self._remove(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        total_entries = len(entries)
+        for _, size, path in entries:
+            if total_entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_entries -= 1
+            total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def summary(self):
+        """Returns a one-line hit/miss report."""
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return (f"... LLM cache: {self.hits} hits, {self.misses} misses "
+                f"({rate:.1f}% hit rate) in {self.cache_dir}")
@@ -0,0 +1,75 @@
+""" llm_client.py -- shared, connection-pooled OpenAI client """
+
+import threading
+import httpx
+from openai import OpenAI
+
+
+MAX_CONNECTIONS = 20  # concurrent HTTP connections to the API
+MAX_KEEPALIVE_CONNECTIONS = 20  # idle connections kept open for reuse
+KEEPALIVE_EXPIRY = 60  # seconds an idle connection is kept open
+
+_client = None
+_factory = None
+_lock = threading.Lock()
+
+
+def default_factory(api_key=None, base_url=None):
+    """Build an OpenAI client over a keep-alive HTTP connection pool."""
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+    )
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+
+def configure(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None):
+    """Set the pool limits; takes effect for the next client built."""
+    global MAX_CONNECTIONS, MAX_KEEPALIVE_CONNECTIONS, KEEPALIVE_EXPIRY
+    if max_connections is not None:
+        MAX_CONNECTIONS = max_connections
+        MAX_KEEPALIVE_CONNECTIONS = min(MAX_KEEPALIVE_CONNECTIONS, max_connections)
+    if max_keepalive_connections is not None:
+        MAX_KEEPALIVE_CONNECTIONS = max_keepalive_connections
+    if keepalive_expiry is not None:
+        KEEPALIVE_EXPIRY = keepalive_expiry
+    reset_client()
+
+
+def set_factory(factory):
+    """Replace the function used to build the shared client, e.g. with one
+    pointing at a local fake server. Pass None to restore the default."""
+    global _factory
+    with _lock:
+        _factory = factory
+    reset_client()
+
+
+def set_client(client):
+    """Inject a ready-made client to be returned by get_client()."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def get_client(api_key=None, base_url=None):
+    """Return the process-wide client, building it on first use.
+    The api key and base url default to OPENAI_API_KEY / OPENAI_BASE_URL."""
+    global _client
+    with _lock:
+        if _client is None:
+            factory = _factory or default_factory
+            _client = factory(api_key=api_key, base_url=base_url)
+        return _client
+
+
+def reset_client():
+    """Close and drop the shared client; the next get_client() rebuilds it."""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None and hasattr(client, "close"):
+        client.close()
@@ -0,0 +1,222 @@
+""" merkle.py -- Merkle tree checksums of Will Models
+
+The checksum of a will is the root of a hash tree over its parts rather
+than a hash of the whole serialized will:
+
+    root = node(node(<will fields>, <testator>), <directives>)    (will_root)
+
+where <directives> is the root of a binary tree over the directives, and
+each directive is itself the root of its own fields, its assets and its
+conditions.  Leaves hash the canonical json of a part (will_format.py);
+leaves and nodes are hashed with different prefixes, so one cannot be
+passed off as the other.
+
+A WillTree keeps every level of the tree.  After editing a directive,
+update_directive() re-hashes that directive and the log n nodes above it
+and sets the new checksum; verify_directive() checks a single directive
+against the checksum with its audit path, without hashing the others.
+Will Model files keep the leaf hashes of the tree next to the checksum
+(WillTree.hashes, will_format.py), and a loaded will's tree is set from
+them (load_tree): a directive edited since is then the only one that
+fails verify_directive(), and verifying it hashes that directive alone. """
+
+import hashlib
+import threading
+import weakref
+from functools import partial
+
+from will_format import to_canonical, write_canonical
+
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+EMPTY_HASH = hashlib.sha256(b"").digest()
+
+WILL_PARTS = ['_testator', '_directives', 'checksum']  # hashed as subtrees, or not at all
+DIRECTIVE_PARTS = ['_assets', 'conditions', 'compiled_rule']
+
+
+def leaf_hash(value):
+    """Hash of the canonical json of a value."""
+    digest = hashlib.sha256(LEAF_PREFIX)
+    write_canonical(to_canonical(value), digest)
+    return digest.digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def fields_hash(obj, parts):
+    """Leaf hash of a Will Model object's attributes other than its parts."""
+    return leaf_hash({'$fields': type(obj).__name__,
+                      'attrs': {key: value for key, value in vars(obj).items() if key not in parts}})
+
+
+class MerkleTree:
+    """Binary hash tree over a list of leaf hashes, keeping every level; an
+    odd node at the end of a level is carried up unchanged."""
+
+    def __init__(self, leaves):
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            self.levels.append([node_hash(level[k], level[k + 1]) if k + 1 < len(level) else level[k]
+                                for k in range(0, len(level), 2)])
+
+    @property
+    def root(self):
+        return self.levels[-1][0] if self.levels[0] else EMPTY_HASH
+
+    def update(self, index, leaf):
+        """Replace a leaf and re-hash the nodes above it."""
+        self.levels[0][index] = leaf
+        for depth in range(1, len(self.levels)):
+            index //= 2
+            below = self.levels[depth - 1]
+            left = below[2 * index]
+            self.levels[depth][index] = node_hash(left, below[2 * index + 1]) if 2 * index + 1 < len(below) else left
+
+    def proof(self, index):
+        """Audit path of a leaf: (sibling hash, sibling is on the left) from
+        the leaf up, skipping levels where the node has no sibling."""
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append((level[sibling], sibling < index))
+            index //= 2
+        return path
+
+
+def verify_proof(leaf, path, root):
+    """Whether the leaf hashes up to root along the audit path."""
+    for sibling, on_left in path:
+        leaf = node_hash(sibling, leaf) if on_left else node_hash(leaf, sibling)
+    return leaf == root
+
+
+def directive_hash(directive):
+    """Root of a directive's fields, assets and conditions."""
+    assets = MerkleTree([leaf_hash(asset) for asset in getattr(directive, '_assets', None) or []])
+    conditions = MerkleTree([leaf_hash(condition) for condition in getattr(directive, 'conditions', None) or []])
+    return MerkleTree([fields_hash(directive, DIRECTIVE_PARTS), assets.root, conditions.root]).root
+
+
+def will_header(fields, testator):
+    """Hash of a will's own fields and its testator."""
+    return node_hash(fields, testator)
+
+
+def will_root(fields, testator, directives):
+    """Root of a will's hash tree, the checksum of every will model
+    (WMWillModel here, wills.Will): node(node(fields, testator), directives)."""
+    return node_hash(will_header(fields, testator), directives)
+
+
+class WillTree:
+    """The hash tree of a WMWillModel.
+
+    :param ref: weak reference to the will
+    :param hashes: the tree's leaf hashes as kept in a Will Model file
+        (see hashes()); the will is hashed when not given
+    """
+
+    def __init__(self, will, ref, hashes=None):
+        self.will = ref
+        if hashes is None:
+            self.fields = fields_hash(will, WILL_PARTS)
+            self.testator = leaf_hash(will._testator)
+            self.directives = MerkleTree([directive_hash(directive) for directive in will._directives or []])
+        else:
+            self.fields = bytes.fromhex(hashes['fields'])
+            self.testator = bytes.fromhex(hashes['testator'])
+            self.directives = MerkleTree([bytes.fromhex(leaf) for leaf in hashes['directives']])
+
+    def hashes(self):
+        """The leaf hashes of the tree, as hex: the will's fields, its
+        testator and each of its directives."""
+        return {'fields': self.fields.hex(), 'testator': self.testator.hex(),
+                'directives': [leaf.hex() for leaf in self.directives.levels[0]]}
+
+    @property
+    def header(self):
+        return will_header(self.fields, self.testator)
+
+    @property
+    def root(self):
+        return will_root(self.fields, self.testator, self.directives.root)
+
+    @property
+    def checksum(self):
+        return self.root.hex()
+
+
+# id(will) -> WillTree.  Wills are not hashable (they define __eq__), so the
+# trees are keyed by id; each tree's weakref to its will removes the entry
+# when the will is dropped, and a tree found under a reused id is not its will's.
+_trees = {}
+_trees_lock = threading.RLock()  # the weakref callback may run inside will_tree(), on garbage collection
+
+
+def _drop_tree(key, ref):
+    with _trees_lock:
+        tree = _trees.get(key)
+        if tree is not None and tree.will is ref:
+            del _trees[key]
+
+
+def _set_tree(will, hashes=None):
+    key = id(will)
+    with _trees_lock:
+        tree = _trees.get(key)
+        ref = tree.will if tree is not None and tree.will() is will else weakref.ref(will, partial(_drop_tree, key))
+        tree = _trees[key] = WillTree(will, ref, hashes)
+        return tree
+
+
+def will_tree(will, rebuild=False):
+    """The WillTree of the will, built on first use and kept until the will
+    is dropped; rebuild=True hashes the whole will again."""
+    with _trees_lock:
+        tree = _trees.get(id(will))
+        if tree is not None and tree.will() is will and not rebuild:
+            return tree
+        return _set_tree(will)
+
+
+def load_tree(will, hashes):
+    """Set the WillTree of a will loaded from a Will Model file from the
+    leaf hashes kept in the file, without hashing the will."""
+    return _set_tree(will, hashes)
+
+
+def will_checksum(will):
+    """Merkle root of the will, as hex; hashes the whole will."""
+    return will_tree(will, rebuild=True).checksum
+
+
+def update_directive(will, index):
+    """Re-hash the directive at index after an edit and set the will's new
+    checksum; O(log n) nodes of the tree are re-hashed."""
+    tree = will_tree(will)
+    tree.directives.update(index, directive_hash(will._directives[index]))
+    will.checksum = tree.checksum
+    return will.checksum
+
+
+def update_testator(will):
+    """Re-hash the testator after an edit and set the will's new checksum."""
+    tree = will_tree(will)
+    tree.testator = leaf_hash(will._testator)
+    will.checksum = tree.checksum
+    return will.checksum
+
+
+def verify_directive(will, index):
+    """Whether the directive at index is the one the will's checksum was
+    computed over; hashes that directive and its audit path only, against
+    the tree loaded with the will (or built on first use)."""
+    tree = will_tree(will)
+    path = tree.directives.proof(index) + [(tree.header, True)]
+    return verify_proof(directive_hash(will._directives[index]), path, bytes.fromhex(will.checksum or ''))
@@ -0,0 +1,126 @@
+""" residuary.py -- detect asset descriptions meaning "all" or "all the rest"
+
+Residuary clauses are formulaic ("all the rest, residue and remainder of
+my estate", "all my property, real, personal and mixed"), and so are
+specific assets ("my house", "my 2015 Toyota").  The classifier decides
+these from a small lexicon and only reports low confidence for the
+descriptions in between ("all my tangible personal property"), which the
+caller escalates to the LLM. """
+
+import re
+import threading
+from collections import namedtuple
+
+
+CONFIDENCE_THRESHOLD = 0.8  # below this the caller asks the LLM
+
+ResiduaryDecision = namedtuple('ResiduaryDecision', ['is_all', 'confidence', 'reason'])
+
+ASSET_NOUNS = r"(?:estate|property|properties|assets|belongings|possessions|effects)"
+
+# words without which a description cannot mean all of the assets
+QUANTIFIER_PATTERN = re.compile(
+    r"\b(?:all|everything|entire|whole|whatever|whatsoever|rest|residue|residuary|remainder|balance)\b")
+
+RESIDUARY_PATTERNS = [
+    re.compile(r"\b(?:rest|residue|remainder|balance)\b(?:[\s,]+(?:and|or|the|rest|residue|remainder))*"
+               r"[\s,]+of\s+(?:the\s+|my\s+|our\s+)?" + ASSET_NOUNS + r"\b"),
+    re.compile(r"\bresiduary\s+" + ASSET_NOUNS + r"\b"),
+    re.compile(r"\ball\s+(?:of\s+)?(?:the\s+)?(?:rest|residue|remainder)\b"),
+    re.compile(r"^(?:all\s+)?(?:the\s+)?(?:rest|residue|remainder)$"),
+    re.compile(r"\ball\s+(?:of\s+)?(?:my|our|the)\s+" + ASSET_NOUNS + r"(?:\s+(?:that|which)\s+i\s+(?:own|have|possess)\w*)?"
+               r"(?:,?\s+real,?\s+(?:and\s+)?personal,?(?:\s+(?:and|or)\s+mixed)?)?\s*$"),
+    re.compile(r"\b(?:my|the)\s+(?:entire|whole)\s+" + ASSET_NOUNS + r"\b"),
+    re.compile(r"\beverything(?:\s+else)?(?:\s+(?:that|which))?\s+i\s+(?:own|have|possess)\w*\b"),
+    re.compile(r"^everything(?:\s+else)?$"),
+    re.compile(r"^(?:all\s+)?my\s+estate$"),
+]
+
+# boilerplate that widens rather than narrows the assets
+GENERAL_QUALIFIERS = re.compile(
+    r",?\s*(?:of\s+)?(?:whatever|whatsoever)\s+(?:kind|nature|description)(?:\s+(?:and|or)\s+(?:kind|nature|description))?"
+    r"|,?\s*(?:wherever|wheresoever)\s+(?:situated|situate|located|found)"
+    r"|,?\s*(?:both\s+)?real(?:\s+and|,)?\s+personal(?:,?\s+(?:and|or)\s+mixed)?(?=\s*$|,)"
+    r"|,?\s*(?:which|that)\s+i\s+(?:may\s+)?(?:own|have|possess)\w*(?:\s+at\s+(?:the\s+time\s+of\s+)?my\s+death)?"
+    r"|,?\s*(?:at\s+the\s+time\s+of\s+my\s+death|at\s+my\s+death)"
+)
+
+# a place narrows "all my property" down to specific assets
+LOCATION_PATTERN = re.compile(r"\b(?:in|at|inside|located|situated|on)\b\s+(?!the time\b)\w|\d{2,}")
+
+WHOLE_ESTATE_PATTERN = re.compile(
+    r"\b(?:all|rest|residue|remainder)\s+(?:of\s+)?(?:my|our|the)\s+" + ASSET_NOUNS + r"\b")
+
+# kinds of assets narrowing "all my ..." down to a class of assets
+CLASS_PATTERN = re.compile(
+    r"\ball\s+(?:of\s+)?(?:my|our|the)\s+(?:\w+\s+)*?(?:tangible|intangible|personal|real|household|"
+    r"jewelry|furniture|vehicles?|cars?|automobiles?|stocks?|bonds?|accounts?|shares|cash|money|"
+    r"clothing|books|tools|art|firearms|guns)\b")
+
+# a noun of the whole estate, for naming a residuary asset
+RESIDUARY_NOUN_PATTERN = re.compile(
+    r"\b(?:all|rest|residue|remainder|everything|entire|whole)\b.*?\b(property|estate|assets)\b")
+
+RESIDUARY_STATS = {'local': 0, 'llm': 0}
+_stats_lock = threading.Lock()
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", str(text).lower().replace('’', "'")).strip(" .;:")
+
+
+def classify_residuary(text):
+    """Classify an asset description as meaning all (the rest of) the
+    testator's assets or not.
+
+    :return: ResiduaryDecision(is_all, confidence, reason); confidence is
+        below CONFIDENCE_THRESHOLD when the lexicon cannot tell
+    """
+    text = normalize(text)
+    if not QUANTIFIER_PATTERN.search(text):
+        return ResiduaryDecision(False, 0.95, 'no quantifier')
+
+    general = normalize(re.sub(r"(?:[\s,]+(?:and|or))+$", "", GENERAL_QUALIFIERS.sub('', text)))
+    for pattern in RESIDUARY_PATTERNS:
+        if pattern.search(general) or pattern.search(text):
+            if LOCATION_PATTERN.search(general):
+                return ResiduaryDecision(False, 0.85, 'residuary phrase with a specific location')
+            return ResiduaryDecision(True, 0.95, 'residuary phrase: ' + pattern.pattern[:40])
+
+    if WHOLE_ESTATE_PATTERN.search(general) and LOCATION_PATTERN.search(general):
+        return ResiduaryDecision(False, 0.85, 'all assets at a specific location')
+    if CLASS_PATTERN.search(general):
+        return ResiduaryDecision(False, 0.6, 'class of assets')
+    return ResiduaryDecision(False, 0.4, 'quantifier without a residuary phrase')
+
+
+def is_residuary(text, ask_llm, threshold=None):
+    """Decide whether the description means all of the testator's assets,
+    calling ask_llm(text) -> bool only when the classifier is uncertain.
+
+    :return: (answer, path) with path 'lexical' or 'llm'
+    """
+    threshold = CONFIDENCE_THRESHOLD if threshold is None else threshold
+    decision = classify_residuary(text)
+    if decision.confidence >= threshold:
+        with _stats_lock:
+            RESIDUARY_STATS['local'] += 1
+        return decision.is_all, 'lexical'
+    with _stats_lock:
+        RESIDUARY_STATS['llm'] += 1
+    return ask_llm(text), 'llm'
+
+
+def residuary_noun(text):
+    """'property', 'estate' or 'assets' if the description names the whole
+    (rest of the) estate, else None."""
+    match = RESIDUARY_NOUN_PATTERN.search(normalize(text))
+    return match.group(1) if match else None
+
+
+def residuary_summary():
+    """Returns a one-line report of the residuary checks decided locally."""
+    total = RESIDUARY_STATS['local'] + RESIDUARY_STATS['llm']
+    rate = (100.0 * RESIDUARY_STATS['local'] / total) if total else 0.0
+    return (f"... Residuary detection: {RESIDUARY_STATS['local']}/{total} descriptions decided locally "
+            f"({rate:.1f}%)")
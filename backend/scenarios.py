@@ -0,0 +1,152 @@
+""" scenarios.py -- devolve a will under what-if changes of the oracle
+
+Estate planners ask what happens if a beneficiary predeceases the
+testator or a child is still under age.  A scenario overrides the alive
+flags and ages of some people (OverlayOracle, the database itself is not
+edited).  The will is devolved once against the oracle as it is, which
+interprets every directive and compiles its rule (see compiled_rules.py);
+every scenario is then devolved from that record (devolution_record.py):
+a directive whose facts the scenario leaves alone is reused, the others
+are executed again from their compiled rule, without the LLM.
+
+A scenarios file is either a list of scenarios
+
+    [{"name": "spouse predeceases", "alive": {"Person-2": false}},
+     {"name": "minor child", "age": {"Person-9": 17}}]
+
+or a matrix of the values to try, devolved for every combination
+
+    {"alive": {"Person-2": [true, false]}, "age": {"Person-9": [17, 25]}} """
+
+import argparse
+import itertools
+
+from ORACLES.oracle import Oracle, OverlayOracle
+from ORACLES.sqlite_oracle import SQLiteOracle, is_sqlite_path
+import devolve_will
+from devolve_will import load_will, load_json_obj, save_json_obj, devolve, configure_llm, configure_devolution
+
+
+SCENARIO_FIELDS = ['alive', 'age']
+
+
+def scenario_matrix(matrix):
+    """Every combination of the values of a matrix, as a list of scenarios."""
+    axes = [(field, name, values) for field in SCENARIO_FIELDS
+            for name, values in matrix.get(field, {}).items()]
+    scenarios = []
+    for combination in itertools.product(*[values for _, _, values in axes]):
+        scenario = {field: {} for field in SCENARIO_FIELDS}
+        for (field, name, _), value in zip(axes, combination):
+            scenario[field][name] = value
+        scenario['name'] = scenario_name(scenario)
+        scenarios.append(scenario)
+    return scenarios
+
+
+def scenario_name(scenario):
+    parts = [f"{name} {'alive' if alive_flag(value) == 'true' else 'not alive'}"
+             for name, value in scenario.get('alive', {}).items()]
+    parts += [f"{name} age {value}" for name, value in scenario.get('age', {}).items()]
+    return ", ".join(parts) or 'baseline'
+
+
+def alive_flag(value):
+    """The database's 'true'/'false' alive flag of a json bool or string."""
+    if isinstance(value, str):
+        value = value.strip().lower() == 'true'
+    return 'true' if value else 'false'
+
+
+def load_scenarios(spec):
+    """Scenarios of a scenarios file's content (a list, or a matrix)."""
+    if isinstance(spec, dict):
+        return scenario_matrix(spec)
+    return [dict(scenario, name=scenario.get('name') or scenario_name(scenario)) for scenario in spec]
+
+
+def scenario_overrides(scenario, db):
+    """The person id -> {field: value} overrides of a scenario; raises
+    ValueError for people the oracle does not know or unknown fields."""
+    unknown = [field for field in scenario if field not in SCENARIO_FIELDS + ['name']]
+    if unknown:
+        raise ValueError(f"Scenario '{scenario['name']}' changes unsupported field(s): {', '.join(unknown)}.")
+    overrides = {}
+    for field in SCENARIO_FIELDS:
+        for name, value in scenario.get(field, {}).items():
+            person = db.by_name(name) or db.match_name(name)
+            if person is None:
+                raise ValueError(f"Scenario '{scenario['name']}' names '{name}', who is not in the people's database.")
+            overrides.setdefault(person['id'], {})[field] = alive_flag(value) if field == 'alive' else int(value)
+    return overrides
+
+
+def run_scenarios(will_object, db, scenarios, model_name):
+    """Devolve the will against the oracle and under each scenario.
+
+    The scenarios are devolved one after the other from the baseline's
+    record, not in one pass over all of them: the directives allocate
+    through the ledger in document order, and a scenario only executes
+    again the compiled rules of the directives whose facts it changes.
+
+    :return: list of {'name', 'alive', 'age', 'division'}, the baseline
+        (the oracle as it is) first
+    """
+    overrides = [scenario_overrides(scenario, db) for scenario in scenarios]
+
+    print("... Scenario 'baseline'.")
+    record = {}
+    results = [{'name': 'baseline', 'alive': {}, 'age': {},
+                'division': devolve(will_object, db, model_name, record=record)}]
+    for scenario, scenario_override in zip(scenarios, overrides):
+        print(f"... Scenario '{scenario['name']}'.")
+        division = devolve(will_object, OverlayOracle(db, scenario_override), model_name, previous=record)
+        results.append({'name': scenario['name'], 'alive': scenario.get('alive', {}),
+                        'age': scenario.get('age', {}), 'division': division})
+    return results
+
+
+def cmd_line_invocation():
+    parser = argparse.ArgumentParser(description="Devolve a will under what-if changes of the people's database.")
+    parser.add_argument("-p", "--path-to-will", type=str, required=True,
+                        help="Input path to the will's Will Model file.")
+    parser.add_argument("-d", "--path-to-database", type=str, default="ORACLES/people_db.json",
+                        help="Input path to the people's database (json, or a .db/.sqlite store).")
+    parser.add_argument("-s", "--scenarios", type=str, required=True,
+                        help="Scenarios json: a list of scenarios or a matrix of alive flags and ages to try.")
+    parser.add_argument("-o", "--save-output-json", type=str, required=False,
+                        help="Output path to save the division of every scenario.")
+    parser.add_argument("-m", "--model", type=str, help="Backend Model")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the LLM response cache.")
+    parser.add_argument("--directive-workers", type=int, default=devolve_will.DIRECTIVE_WORKERS,
+                        help="Number of directives interpreted concurrently (1: one after the other).")
+    return parser.parse_args()
+
+
+def main():
+    args = cmd_line_invocation()
+    will_object = load_will(args.path_to_will)
+    if is_sqlite_path(args.path_to_database):
+        db = SQLiteOracle(args.path_to_database)
+    else:
+        db = Oracle(load_json_obj(args.path_to_database))
+    scenarios = load_scenarios(load_json_obj(args.scenarios))
+
+    configure_llm(no_cache=args.no_cache)
+    configure_devolution(args.directive_workers)
+    results = run_scenarios(will_object, db, scenarios, args.model)
+
+    for result in results:
+        print(f"\n... Scenario '{result['name']}':")
+        for asset_name, info in result['division'].items():
+            shares = ", ".join(f"{person} {details['share']}" for person, details in info['beneficiaries'].items())
+            print(f"    {asset_name}: {shares}")
+    print(devolve_will.run_summary())
+
+    if args.save_output_json:
+        save_json_obj(results, args.save_output_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,16 @@ class WMEnumNamedFunction(object):
     """
     TRUE = "true"
     IS_ALIVE = "is_alive"
+    AND = "and"
+    NOT = "not"
+    AGE_AT_LEAST = "age_at_least"
+    BEQUEATH = "bequeath"
+    ASSETS = "assets"
+    ASSET = "asset"
+    RULE = "rule"
+    DIVIDE = "divide"
+    DIVIDE_EQUALLY = "divide_equally"
+    SHARE = "share"
     """
     Attributes:
       swagger_types (dict): The key is attribute name
@@ -0,0 +1,235 @@
+""" shares.py -- parse share expressions of directive conditions
+
+Percentages and fractions as wills write them: "60%", "five (5) percent",
+"twenty-five per cent (25%)", "1/6", "one half", "two-thirds", "a
+one-third interest", "one and one-half percent".  Shares are exact
+Fractions of the whole asset. """
+
+import re
+from fractions import Fraction
+
+
+UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14,
+    'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70,
+    'eighty': 80, 'ninety': 90,
+}
+DENOMINATORS = {
+    'half': 2, 'halves': 2, 'third': 3, 'thirds': 3, 'quarter': 4, 'quarters': 4, 'fourth': 4,
+    'fourths': 4, 'fifth': 5, 'fifths': 5, 'sixth': 6, 'sixths': 6, 'seventh': 7, 'sevenths': 7,
+    'eighth': 8, 'eighths': 8, 'ninth': 9, 'ninths': 9, 'tenth': 10, 'tenths': 10,
+    'twelfth': 12, 'twelfths': 12, 'hundredth': 100, 'hundredths': 100,
+}
+
+_word = r"(?:" + "|".join(sorted(list(UNITS) + list(TENS) + ['hundred'], key=len, reverse=True)) + r")"
+# "and" only after "hundred" ("one hundred and five"); "one and one-half" is a mixed number
+WORDS = _word + r"(?:[\s-]+(?:(?<=hundred\s)and[\s-]+)?" + _word + r")*"
+DIGITS = r"\d+(?:\.\d+)?"
+NUMBER = (r"(?:(?P<digits>" + DIGITS + r")|(?P<words>" + WORDS + r")(?:\s*\(\s*(?P<dup>" + DIGITS + r")\s*\))?"
+          r"|\(\s*(?P<paren>" + DIGITS + r")\s*\))")
+PERCENT = r"(?:%|\bpercent\b|\bper\s+cent\b)"
+DENOMINATOR = r"(?:" + "|".join(sorted(DENOMINATORS, key=len, reverse=True)) + r")"
+
+PERCENT_PATTERN = re.compile(
+    r"(?<![\w./])" + NUMBER + r"\s*" + PERCENT + r"(?:\s*\(\s*(?P<pdup>" + DIGITS + r")\s*%\s*\))?", re.I)
+SLASH_PATTERN = re.compile(r"(?<![\d/])(?P<num>\d+)\s*/\s*(?P<den>\d+)(?![\d/])")
+WORD_FRACTION_PATTERN = re.compile(
+    r"\b(?:(?P<count>" + WORDS + r"|an?)[\s-]+)?(?P<den>" + DENOMINATOR + r")\b"
+    r"(?:\s*\(\s*(?P<num>\d+)\s*/\s*(?P<dnum>\d+)\s*\))?", re.I)
+# the whole part of a mixed number ("one and one-half", "1 1/2"), right before its fraction
+WHOLE_PATTERN = re.compile(r"(?<![\w./])(?:(?P<digits>\d+)|(?P<words>" + WORDS + r"))[\s-]+(?:and[\s-]+)?$", re.I)
+PERCENT_SUFFIX = re.compile(r"\s*" + PERCENT, re.I)
+
+# left-over words that carry no condition of their own
+FILLER_WORDS = {
+    'and', 'or', 'to', 'of', 'the', 'my', 'each', 'with', 'be', 'shall', 'will', 'go', 'goes', 'given',
+    'divided', 'distributed', 'among', 'amongst', 'between', 'them', 'as', 'follows', 'respectively',
+    'absolutely', 'outright', 'a', 'an', 'in', 'share', 'shares', 'interest', 'is', 'are', 'then',
+    'thereof', 'said', 'estate', 'property', 'asset', 'assets', 'following', 'who', 'that', 'me',
+    'receive', 'receives', 'get', 'gets', 'take', 'takes',
+}
+
+
+def words_to_number(text):
+    """'twenty-five' -> 25, 'one hundred' -> 100; None if not a number."""
+    total, current = 0, 0
+    for word in re.split(r"[\s-]+", text.lower()):
+        if word == 'and' or not word:
+            continue
+        if word in UNITS:
+            current += UNITS[word]
+        elif word in TENS:
+            current += TENS[word]
+        elif word == 'hundred':
+            current = (current or 1) * 100
+        else:
+            return None
+    return total + current
+
+
+def _number(match):
+    """Value of the NUMBER groups of a match; None when a parenthesised
+    duplicate disagrees with the spelled-out number."""
+    if match.group('digits'):
+        return Fraction(match.group('digits'))
+    if match.group('paren'):
+        return Fraction(match.group('paren'))
+    value = words_to_number(match.group('words'))
+    if value is None:
+        return None
+    if match.group('dup') and Fraction(match.group('dup')) != value:
+        return None
+    return Fraction(value)
+
+
+def _mixed(text, start, end, share):
+    """A fraction with the whole number before it ("one and one-half") and
+    the percent sign after it ("1/2%") taken in."""
+    if share is None:
+        return start, end, share
+    whole = WHOLE_PATTERN.search(text, 0, start)
+    if whole:
+        value = Fraction(whole.group('digits')) if whole.group('digits') else words_to_number(whole.group('words'))
+        if value is None:
+            return start, end, None
+        start, share = whole.start(), value + share
+    percent = PERCENT_SUFFIX.match(text, end)
+    if percent:
+        end, share = percent.end(), share / 100
+    return start, end, share
+
+
+def find_shares(text):
+    """Share expressions in the text, as (start, end, share) with share a
+    Fraction of the whole, or None where the expression contradicts
+    itself (e.g. "five (6) percent")."""
+    found = []
+    for match in PERCENT_PATTERN.finditer(text):
+        value = _number(match)
+        if value is not None and match.group('pdup') and Fraction(match.group('pdup')) != value:
+            value = None
+        found.append((match.start(), match.end(), value / 100 if value is not None else None))
+    percents = len(found)
+    for match in SLASH_PATTERN.finditer(text):
+        if int(match.group('den')):
+            found.append((match.start(), match.end(), Fraction(int(match.group('num')), int(match.group('den')))))
+    for match in WORD_FRACTION_PATTERN.finditer(text):
+        count = match.group('count')
+        if count is None:
+            numerator = 1
+            if match.group('den').lower() not in ('half', 'quarter'):
+                continue  # a bare "third" is an ordinal, not a share
+        elif count.lower() in ('a', 'an'):
+            numerator = 1
+        else:
+            numerator = words_to_number(count)
+        share = Fraction(numerator, DENOMINATORS[match.group('den').lower()])
+        if match.group('num') and Fraction(int(match.group('num')), int(match.group('dnum'))) != share:
+            share = None
+        found.append((match.start(), match.end(), share))
+    found[percents:] = [_mixed(text, *fraction) for fraction in found[percents:]]
+
+    # keep the longest expression where matches overlap ("one-half (1/2)")
+    found.sort(key=lambda f: (f[0], -(f[1] - f[0])))
+    shares = []
+    for start, end, share in found:
+        if shares and start < shares[-1][1]:
+            continue
+        shares.append((start, end, share))
+    return shares
+
+
+def parse_share(text):
+    """The single share expressed by the text, or None."""
+    shares = find_shares(text)
+    if len(shares) != 1:
+        return None
+    return shares[0][2]
+
+
+def find_names(text, names):
+    """(start, end, name) of each mention of the given full names."""
+    found = []
+    for name in names:
+        for match in re.finditer(r"(?<![\w-])" + re.escape(name) + r"(?![\w-])", text, re.I):
+            found.append((match.start(), match.end(), name))
+    return sorted(found)
+
+
+def explained(text, spans, names):
+    """True if nothing but filler words remains once the matched spans and
+    the mentioned names are removed from the condition text."""
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = [' '] * (end - start)
+    rest = ''.join(chars)
+    for name in names:
+        rest = re.sub(r"(?<![\w-])" + re.escape(name) + r"(?![\w-])", ' ', rest, flags=re.I)
+    words = re.findall(r"[a-z0-9]+", rest.lower())
+    return all(word in FILLER_WORDS for word in words)
+
+
+def bind_shares(text, shares, beneficiaries):
+    """Bind each (start, end, share) share to the beneficiary it is given
+    to ("60% to A") or, failing that, the one named right before it
+    ("A shall receive 60%").
+    Shares naming nobody are bound to the beneficiaries in the order the
+    directive lists them if they add up to the whole ("60% and 40%"), or
+    to every beneficiary if a single share is given to "each".
+    Returns [(name, share)] or None when the binding is not unique."""
+    mentions = find_names(text, beneficiaries)
+    if not mentions:
+        if len(shares) == len(beneficiaries) and sum(share for _, _, share in shares) == 1:
+            return [(name, share) for name, (_, _, share) in zip(beneficiaries, shares)]
+        if len(shares) == 1 and re.search(r"\beach\b", text, re.I):
+            return [(name, shares[0][2]) for name in beneficiaries]
+        return None
+    bound = []
+    for k, (start, end, share) in enumerate(shares):
+        next_start = shares[k + 1][0] if k + 1 < len(shares) else len(text)
+        prev_end = shares[k - 1][1] if k > 0 else 0
+        after = {name for (s, e, name) in mentions
+                 if end <= s < next_start and re.search(r"\bto\b", text[end:s], re.I)}
+        before = {name for (s, e, name) in mentions if prev_end <= s and e <= start}
+        if len(after) == 1:
+            bound.append((after.pop(), share))
+        elif not after and len(before) == 1:
+            bound.append((before.pop(), share))
+        else:
+            return None
+    if len({name for name, _ in bound}) != len(bound):
+        return None
+    return bound
+
+
+def directive_shares(directive, beneficiaries, assets):
+    """Bind the shares in the conditions of a WMDirectiveBequeath to its
+    beneficiaries and assets.
+
+    :param beneficiaries: full names of the directive's beneficiaries, in order
+    :param assets: oracle assets of the directive (dicts with a 'name')
+    :return: [(name, asset name, Fraction share)], or None when the
+        conditions hold no shares, say more than the shares of the
+        beneficiaries ("provided that she pays 10% of the mortgage") or
+        the shares cannot be bound unambiguously; shares naming nobody
+        are bound in order only when each condition is one bare share
+    """
+    conditions = [getattr(c, '_condition', None) or '' for c in getattr(directive, 'conditions', None) or []]
+    text = " and ".join(conditions)
+    shares = find_shares(text)
+    if not shares or any(share is None for _, _, share in shares):
+        return None
+    if not explained(text, [(start, end) for start, end, _ in shares], beneficiaries):
+        return None
+    if not find_names(text, beneficiaries):
+        # unnamed shares go by order only as one bare share per beneficiary ("60%", "40%")
+        if len(conditions) != len(beneficiaries) or any(parse_share(c) is None for c in conditions):
+            return None
+    bound = bind_shares(text, shares, beneficiaries)
+    if bound is None or sum(share for _, share in bound) > 1:
+        return None
+    return [(name, asset['name'], share) for name, share in bound for asset in assets]
@@ -0,0 +1,96 @@
+""" stirpes.py -- per stirpes distribution over the people's database
+
+The share of a deceased beneficiary passes to their children in equal
+parts, and the part of a deceased child passes on to that child's
+children in turn.  The vector of living descendants' shares only depends
+on the family tree, so it is computed once per deceased person and
+oracle, as exact fractions, and then scaled for every asset and share.
+Writes to the oracle bump its version, which drops the memo. """
+
+import threading
+import weakref
+from fractions import Fraction
+
+
+class StirpesCycleError(ValueError):
+    """The children_ids of the database form a cycle."""
+
+
+class StirpesEngine:
+    """Memoized per stirpes share vectors of one version of an oracle.
+    The engine only holds a weak reference to the oracle, so that
+    engine_for() can drop the engine once the oracle is gone."""
+
+    def __init__(self, oracle):
+        self.version = getattr(oracle, 'version', 0)
+        self._oracle = weakref.ref(oracle)
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    @property
+    def oracle(self):
+        oracle = self._oracle()
+        if oracle is None:
+            raise ReferenceError("the oracle of this StirpesEngine was dropped")
+        return oracle
+
+    def share_vector(self, person):
+        """Shares of the living descendants of the person, as a dict of
+        full name -> Fraction of the person's own share.
+
+        Each child in children_ids counts towards the split, even one that
+        is missing from the database (that part is not passed on), as does
+        a deceased child without descendants.  A descendant reached through
+        more than one line receives the sum of the shares."""
+        with self._lock:
+            return self._vector(person, [])
+
+    def _vector(self, person, path):
+        person_id = person['id']
+        if person_id in self._memo:
+            return self._memo[person_id]
+        if person_id in path:
+            names = [self.oracle.get(p_id)['full_name'] for p_id in path[path.index(person_id):]]
+            raise StirpesCycleError(
+                "cycle in children_ids: " + " -> ".join(names + [person['full_name']]))
+
+        vector = {}
+        children_ids = person.get('children_ids', [])
+        if children_ids:
+            part = Fraction(1, len(children_ids))
+            path.append(person_id)
+            for child in self.oracle.children(person):
+                if child['alive'] == 'true':
+                    vector[child['full_name']] = vector.get(child['full_name'], 0) + part
+                else:
+                    for name, share in self._vector(child, path).items():
+                        vector[name] = vector.get(name, 0) + part * share
+            path.pop()
+        self._memo[person_id] = vector
+        return vector
+
+    def distribute(self, person, share, asset_names):
+        """Split the person's share of each asset among their living
+        descendants, in one pass over the assets.
+
+        :return: dict of asset name -> {full name: Fraction share}
+        """
+        vector = self.share_vector(person)
+        share = Fraction(share)
+        return {asset_name: {name: part * share for name, part in vector.items()}
+                for asset_name in asset_names}
+
+
+_engines = weakref.WeakKeyDictionary()
+_engines_lock = threading.Lock()
+
+
+def engine_for(oracle):
+    """The StirpesEngine of the oracle, created on first use, created
+    again once the oracle was written to, and dropped with the oracle."""
+    version = getattr(oracle, 'version', 0)
+    with _engines_lock:
+        engine = _engines.get(oracle)
+        if engine is None or engine.version != version:
+            engine = _engines[oracle] = StirpesEngine(oracle)
+        return engine
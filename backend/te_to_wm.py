@@ -3,12 +3,13 @@ Convert text extractions to will model representation """
 
 import argparse
 import sys, os
-import pickle
 import json
 import datetime
 import re
 from pprint import pprint
-import hashlib
+from residuary import residuary_noun
+from will_format import save_will_model
+from merkle import will_checksum
 
 ################################################################################
 #                                                                              #
@@ -55,7 +56,7 @@ def cmd_line_invocation():
         "--path-to-wm-obj",
         type=str,
         required=True,
-        help="Output path to the converted will model's pickle file.",
+        help="Output path to the converted Will Model file.",
     )
 
     parser.add_argument(
@@ -101,16 +102,6 @@ def load_json_object(path):
     return obj
 
 
-def save_pickle_object(obj, path):
-    """Save an object as a pickle file."""
-    with open(path, "wb") as f:
-        pickle.dump(obj, f)
-        print(
-            f"... Successfully saved \
-Will Model pickle object to file {path}"
-        )
-
-
 def find_obj_with_id(list_of_objs, target_ids):
     """Returns the obj given an id"""
     if not isinstance(target_ids, list):
@@ -157,11 +148,12 @@ def find_unused(te_obj, used):
 
 
 def remove_surplus_assets(input_string):
-    """Removes surplus asset names given an asset name string."""
-    pattern = re.compile(r"\ball\b.*?(property|estate)")
-    match = pattern.search(input_string)
-    if match:
-        concise_property = "All the rest of " + match.group(1).strip().capitalize()
+    """Removes surplus asset names given an asset name string.
+    Descriptions naming the whole estate (see residuary.py) are shortened
+    to "All the rest of Property/Estate/Assets", keeping any location."""
+    noun = residuary_noun(input_string)
+    if noun:
+        concise_property = "All the rest of " + noun.capitalize()
         if ' in ' in input_string:
             concise_property = concise_property+' in ' +str(input_string.split(' in ')[1:])
         elif ' inside ' in input_string:
@@ -271,9 +263,10 @@ def serialize_directive(d_id, asset, beneficiary, condition, executor):
 ################################################################################
 
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 schema_paths = ["schemas/model/wm", "schemas/model/te"]
 for model_path in schema_paths:
-    for model_file in os.listdir(model_path):
+    for model_file in os.listdir(os.path.join(BASE_DIR, model_path)):
         module = path_to_module_name(model_file)
         if module:
             import_p1 = f"from {model_path.replace('/','.')}"
@@ -537,21 +530,13 @@ def find_person_by_dob_and_name(dob, full_name):
 ################################################################################
 
 
-def main():
-    """Load the te json,
-    fetch the testator, assets, and beneficiaries.
-    Infer the directives.
-    Add all of these to the WM
-    Output the WM to a pickle file."""
+def build_will_model(te_obj, provenance=False, verbose=False, serialize=False):
+    """Fetch the testator, assets, and beneficiaries from a te dict
+    (or the frontend's Will object), infer the directives and return
+    the checksummed Will Model."""
 
-    args = cmd_line_invocation()
-    path_to_te_json = args.path_to_te
-    path_to_wm_obj = args.path_to_wm_obj
-    te_obj = load_json_object(path_to_te_json)
-    provenance = args.provenance
-    verbose = args.verbose
-    serialize = args.serialize
-    highlight = args.highlight
+    if hasattr(te_obj, "model_dump"):
+        te_obj = te_obj.model_dump()
     used_ids = []  # to keep track of what's used and what's not
     sentence_ids = []
     testator = extract_testaor(te_obj["extractions"], used_ids)
@@ -586,11 +571,24 @@ def main():
         testator=testator,
     )
     ## add willmodel checksum
-    will_model.checksum = None
-    will_model_bytes = pickle.dumps(will_model)
-    will_model.checksum = hashlib.sha256(will_model_bytes).hexdigest()
+    will_model.checksum = will_checksum(will_model)
+    return will_model
+
+
+def main():
+    """Load the te json,
+    fetch the testator, assets, and beneficiaries.
+    Infer the directives.
+    Add all of these to the WM
+    Output the WM to a Will Model file."""
+
+    args = cmd_line_invocation()
+    path_to_te_json = args.path_to_te
+    path_to_wm_obj = args.path_to_wm_obj
+    te_obj = load_json_object(path_to_te_json)
+    will_model = build_will_model(te_obj, args.provenance, args.verbose, args.serialize)
     ## Save Will Model
-    save_pickle_object(will_model, path_to_wm_obj)
+    save_will_model(will_model, path_to_wm_obj)
 
 
 if __name__ == "__main__":
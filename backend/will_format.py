@@ -0,0 +1,155 @@
+""" will_format.py -- canonical serialization of the Will Model
+
+A Will Model file is plain text, one record per line:
+
+    DASS-WM 1
+    <content>       the will as canonical json, without its checksum and
+                    the rules compiled by devolution
+    <attachments>   {"checksum": ..., "compiled_rules": [...], "merkle": {...}}
+                    json, with the leaf hashes of the checksum's tree
+    sha256 <hex>    digest of the lines above
+
+Canonical json has sorted keys, no whitespace and UTF-8 text, so the same
+will always gives the same bytes.  Will Model objects are written as
+{"$type": <class name>, "$attrs": {<attribute>: <value>}}; only the Will
+Model classes are read back, and only their attributes are set, so
+loading a file runs no code from it (unlike unpickling).
+
+The will's checksum is the root of a Merkle tree over its content (see
+merkle.py).  The json is encoded in chunks that go straight to the file
+and the digest, without building the whole byte string. """
+
+import hashlib
+import json
+
+from schemas.model.wm import (WMWillModel, WMPerson, WMAsset, WMConditional, WMDirectiveBequeath,
+                              WMDirectiveBody, WMDirectiveStatement, WMSExpr, WMPredicate,
+                              WMLiteralValue, WMVariableReference, WMTypeBeneficiary)
+
+
+FORMAT_HEADER = b"DASS-WM 1\n"
+TRAILER_PREFIX = b"sha256 "
+
+WM_CLASSES = {cls.__name__: cls for cls in [
+    WMWillModel, WMPerson, WMAsset, WMConditional, WMDirectiveBequeath, WMDirectiveBody,
+    WMDirectiveStatement, WMSExpr, WMPredicate, WMLiteralValue, WMVariableReference, WMTypeBeneficiary]}
+
+_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False, allow_nan=False)
+
+
+class WillFormatError(ValueError):
+    """The file is not a valid Will Model file."""
+
+
+def to_canonical(obj):
+    """The json value of a Will Model object graph."""
+    if isinstance(obj, (list, tuple)):
+        return [to_canonical(value) for value in obj]
+    if isinstance(obj, dict):
+        if '$type' in obj:
+            raise ValueError("dict keys may not be '$type'")
+        return {str(key): to_canonical(value) for key, value in obj.items()}
+    if type(obj).__name__ in WM_CLASSES:
+        return {'$type': type(obj).__name__,
+                '$attrs': {key: to_canonical(value) for key, value in vars(obj).items()}}
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    raise TypeError(f"Cannot serialize {type(obj).__name__} in a Will Model.")
+
+
+def from_canonical(value):
+    """The Will Model object graph of a json value."""
+    if isinstance(value, list):
+        return [from_canonical(item) for item in value]
+    if isinstance(value, dict):
+        if '$type' not in value:
+            return {key: from_canonical(item) for key, item in value.items()}
+        cls = WM_CLASSES.get(value['$type'])
+        if cls is None:
+            raise WillFormatError(f"Unknown Will Model type '{value['$type']}'.")
+        obj = cls.__new__(cls)
+        obj.__dict__.update((key, from_canonical(item)) for key, item in value['$attrs'].items())
+        return obj
+    return value
+
+
+def split_will(will):
+    """(content, attachments) json values of a will: the checksummed will
+    and the checksum and compiled rules kept alongside it."""
+    content = to_canonical(will)
+    attrs = content['$attrs']
+    checksum = attrs.pop('checksum', None)
+    compiled_rules = []
+    for directive in attrs.get('_directives') or []:
+        compiled_rules.append(directive['$attrs'].pop('compiled_rule', None)
+                              if isinstance(directive, dict) and '$attrs' in directive else None)
+    return content, {'checksum': checksum, 'compiled_rules': compiled_rules}
+
+
+def write_canonical(value, *sinks):
+    """Encode the value as canonical json, passing each chunk of bytes to
+    every sink (hash objects or files)."""
+    for chunk in _encoder.iterencode(value):
+        data = chunk.encode('utf-8')
+        for sink in sinks:
+            (sink.update if hasattr(sink, 'update') else sink.write)(data)
+
+
+def content_checksum(will):
+    """sha256 hex digest of the will's canonical content, the checksum of
+    the first DASS-WM 1 wills (before Merkle checksums)."""
+    content, _ = split_will(will)
+    digest = hashlib.sha256()
+    write_canonical(content, digest)
+    return digest.hexdigest()
+
+
+def save_will_model(will, path):
+    """Write the will to a Will Model file."""
+    from merkle import will_tree  # merkle hashes the canonical json of this module
+    content, attachments = split_will(will)
+    attachments['merkle'] = will_tree(will).hashes()
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        f.write(FORMAT_HEADER)
+        digest.update(FORMAT_HEADER)
+        for value in (content, attachments):
+            write_canonical(value, f, digest)
+            f.write(b"\n")
+            digest.update(b"\n")
+        f.write(TRAILER_PREFIX + digest.hexdigest().encode('ascii') + b"\n")
+    print(f"... Successfully saved Will Model to file {path}")
+
+
+def is_will_model_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(FORMAT_HEADER)) == FORMAT_HEADER
+
+
+def load_will_model(path):
+    """Read a Will Model file, checking its digest; raises WillFormatError
+    if it is not one or was altered."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if header != FORMAT_HEADER:
+            raise WillFormatError(f"{path} is not a Will Model file.")
+        digest.update(header)
+        content = f.readline()
+        digest.update(content)
+        attachments = f.readline()
+        digest.update(attachments)
+        trailer = f.readline().strip()
+    if trailer != TRAILER_PREFIX + digest.hexdigest().encode('ascii'):
+        raise WillFormatError(f"{path} does not match its sha256 digest.")
+
+    will = from_canonical(json.loads(content))
+    attachments = json.loads(attachments)
+    will.checksum = attachments['checksum']
+    for directive, rule in zip(will._directives or [], attachments['compiled_rules']):
+        if rule is not None:
+            directive.compiled_rule = from_canonical(rule)
+    if 'merkle' in attachments:
+        from merkle import load_tree
+        load_tree(will, attachments['merkle'])
+    return will
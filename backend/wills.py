@@ -4,14 +4,14 @@
 # its data, a WillData object consisting of the testator, the directives of the  #
 # will, and the original text of the will; and its metadata, a WillMetadata      #
 # object containing information about its creation and edit history; and a       #
-# cryptographic hash of the data and metadata, to check against tampering.  Its  #
+# cryptographic hash of the data, to check against tampering.  Its               #
 # fields are:                                                                    #
 #                                                                                #
 #    -- _data : a WillData object, containing information about the testator     #
 #               and the directives of the will; and                              #
 #    -- _metadata : a WillMetadata object, containing metadata about the will.   #
-#    -- _hash: a cryptographic hash of the _data and _metadata fields, to ensure #
-#              that they have not been tampered with.                            #
+#    -- _hash: a cryptographic hash of the _data fields, to ensure that they     #
+#              have not been tampered with.                                      #
 #                                                                                #
 #                                                                                #
 # A WillData object contains the following fields:                               #
@@ -26,11 +26,18 @@
 # -- _creation_info: information about its creation (witnesses, dates, etc.)     #
 # -- _edit_history: a list of edits to the will                                  #
 #                                                                                #
+# The hash of a will is the root of a Merkle tree over its testator, text and    #
+# directives (see merkle.py), so an edit to one directive re-hashes only that    #
+# directive and the log n nodes above it, and its EditInfo records only the      #
+# directive that changed.                                                        #
+#                                                                                #
 ##################################################################################
 
 from hashlib import sha256
 from datetime import datetime
 
+from merkle import MerkleTree, leaf_hash, will_root
+
 class WillData:
     """ Data about the testator and directives of the will. """
     def __init__(self, testator, directives, text):
@@ -60,16 +67,32 @@ class Will:
         timestamp = self.curr_time()
 
         edit_info = EditInfo('create', None, w_data, testator, timestamp)
-        self._edit_history: [edit_info]
+        edit_history = [edit_info]
 
         creat_info = CreationInfo(witnesses, timestamp)
 
-        w_meta = WillMetadata(creat_info, edit_info)
-        w_hash = self.compute_hash(f'{str(w_data)}; {str(w_meta)}')
+        w_meta = WillMetadata(creat_info, edit_history)
 
         self._data = w_data
         self._metadata = w_meta
-        self._hash = w_hash
+        self._tree = MerkleTree([leaf_hash(directive) for directive in directives])
+        self._hash = self.merkle_root()
+
+    def merkle_root(self):
+        """Root of the hash tree over the testator, text and directives."""
+        return will_root(leaf_hash(self._data._text), leaf_hash(str(self._data._testator)), self._tree.root).hex()
+
+    def edit_directive(self, index, directive, who):
+        """Replace the directive at index, re-hashing only its path in the
+        tree, and record the old and new directive in the edit history."""
+        old = {'directive': index, 'value': self._data._directives[index], 'hash': self._tree.levels[0][index].hex()}
+        self._data._directives[index] = directive
+        self._tree.update(index, leaf_hash(directive))
+        change = {'directive': index, 'value': directive, 'hash': self._tree.levels[0][index].hex()}
+        self._metadata._edit_history.append(EditInfo('modify', old, change, who, self.curr_time()))
+        self._hash = self.merkle_root()
+        return self._hash
+
     def compute_hash(self, string):
         """Computes SHA-256 hash of the input string"""
         hash_digest = sha256(string.encode()).hexdigest()
@@ -122,7 +145,8 @@ class CreationInfo:
 # An EditInfo object records information about an edit to the will and contains  #
 # following information:                                                         #
 # -- _type: the nature of the edit ('create', 'modify', 'delete', ...)           #
-# -- _old: some representation of the will prior to this edit                    #
+# -- _old: some representation of the will prior to this edit (for a 'modify',   #
+#           the directive it replaced, with its index and hash)                  #
 # -- _change: some representation of the change(s) being made                    #
 # -- _who: who performed the edit                                                #
 # -- _timestamp: a timestamp of when the edit was performed                      #
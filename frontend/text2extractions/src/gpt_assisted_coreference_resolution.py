@@ -1,8 +1,11 @@
+import os, sys
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_random_exponential,
 )  # for exponential backoff
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'backend')))
+import llm_client, llm_backend
 
 def create_cr_prompt(current_extraction, prev_extractions):
     prompt = """%Instruction: Please carefully read the following passages. For each passage, you must identify which entity set, if any, the given entity set refers to. An entity set consists of a unique identifier ('id'), a type, and specific text references within the passage. If the given entity set does not correspond to any antecedent entity set, please select "no antecedent." When determining the antecedent, only consider the entity sets that refer to the exact same real-world entity as the co-referring sets. If one entity set includes another entity set, regard the two entity sets as not referring to the same real world entity (as the former entity set is larger than the latter entity set).
@@ -36,25 +39,25 @@ def create_cr_prompt(current_extraction, prev_extractions):
 
 
 @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-def coreference_resolution(prompt, client):
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
+def coreference_resolution(prompt, client=None):
+    backend = llm_backend.get_backend() if client is None else llm_backend.OpenAIBackend(client)
+    return backend.complete(
+        [
             {
                 "role": "user",
                 "content": prompt
             }
         ],
+        "gpt-4o",
         temperature=0,
         max_tokens=4096,
         top_p=1,
         frequency_penalty=0,
         presence_penalty=0
     )
-    return response.choices[0].message.content
 
 
-def main(current_extraction, prev_extractions, client):
+def main(current_extraction, prev_extractions, client=None):
     choices, prompt = create_cr_prompt(current_extraction, prev_extractions)
     if prompt:
         response = coreference_resolution(prompt, client)
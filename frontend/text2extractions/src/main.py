@@ -1,9 +1,10 @@
-import os, json
+import os, json, sys
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from openai import OpenAI
 import argparse
 import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'backend')))
+import llm_client, llm_backend
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -306,27 +307,27 @@ class Will(BaseModel):
 
 
 @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-def extract_from_full_doc(prompt, target_text, client,model_name="gpt-4o-2024-08-06"):
-    completion = client.beta.chat.completions.parse(
-        model=model_name,
-        messages=[
+def extract_from_full_doc(prompt, target_text, client=None,model_name="gpt-4o-2024-08-06"):
+    backend = llm_backend.get_backend() if client is None else llm_backend.OpenAIBackend(client)
+    extraction = backend.parse(
+        [
             {"role": "system", "content": prompt},
             {"role": "user", "content": target_text},
         ],
-        response_format=Will,
+        Will,
+        model_name,
         temperature=0,
         max_tokens=16384,
         top_p=1,
         frequency_penalty=0,
         presence_penalty=0
     )
-    extraction = completion.choices[0].message.parsed
     return extraction
 
 
 def export_to_json(json_object, file_path):
     with open(file_path, 'w') as json_file:
-        json_file.write(json_object.json(indent=4))
+        json_file.write(json_object.model_dump_json(indent=4))
 
 
 def read_and_tokenize(file_path):
@@ -360,10 +361,10 @@ def main(prompt):
     # Fetch the API key from the environment variable
     env_var_key = 'OPENAI_API_KEY'
     api_key = os.getenv(env_var_key)
-    if not api_key:
-        raise EnvironmentError(f"{env_var_key} not found in environment variables.")
-    
-    client = OpenAI(api_key=api_key)
+    if llm_backend.requires_api_key():
+        if not api_key:
+            raise EnvironmentError(f"{env_var_key} not found in environment variables.")
+        llm_client.get_client(api_key=api_key)
 
     for filename in os.listdir(input_dir):
         if filename.endswith(".txt"):
@@ -374,9 +375,9 @@ def main(prompt):
             with open(input_path, 'r', encoding='utf-8') as file:
                 target_text = file.read()
             if model_name:
-                extraction = extract_from_full_doc(prompt, target_text, client,model_name)
+                extraction = extract_from_full_doc(prompt, target_text, model_name=model_name)
             else:
-                extraction = extract_from_full_doc(prompt, target_text, client)
+                extraction = extract_from_full_doc(prompt, target_text)
             export_to_json(extraction, output_path)
             print(f"Extraction completed for {filename}")
 
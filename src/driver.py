@@ -3,9 +3,7 @@ End to end system to extract will model and output devolution items """
 
 import argparse
 import sys, os
-import shutil, subprocess
-import random
-from datetime import datetime
+from pipeline import run_pipeline, run_batch, save_outputs, load_stages
 
 
 ### DEFINE FRONT_END AND BACKEND_MODELS
@@ -20,30 +18,25 @@ BACKEND_MODEL = "gpt-4o-2024-08-06"
 #                                                                              #
 ################################################################################
 
-def remove_contents(folder_path):
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-        try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.remove(file_path)  # remove file or link
-            elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)  # remove directory and all its contents
-        except Exception as e:
-            print(f"Failed to delete {file_path}. Reason: {e}")
-
 
 def cmd_line_invocation():
     desc_text = """This is an end to end system that extracts the Will text extractions json, 
     Will Model, and Will Devolution items given input a Will text file."""
 
     parser = argparse.ArgumentParser(description=desc_text)
-    parser.add_argument(
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
         "-i",
         "--input-text-file",
         type=str,
-        required=True,
         help="Input path to the will text file. Ensure it's a text (.txt) file.",
     )
+    inputs.add_argument(
+        "--batch",
+        type=str,
+        help="Batch mode: a directory of will text (.txt) files, or a manifest \
+file listing one will text file per line.",
+    )
     parser.add_argument(
         "-o",
         "--output-path",
@@ -56,8 +49,8 @@ Will Model object, and Will Devolution text file.",
         "-k",
         "--key",
         type=str,
-        required=True,
-        help="OPEN AI API KEy.\n",
+        required=False,
+        help="OPEN AI API KEy (required by the openai and record backends).\n",
     )
     parser.add_argument(
         "-d",
@@ -66,6 +59,43 @@ Will Model object, and Will Devolution text file.",
         required=False,
         help="Specify the Path to ORACLE.\n",
     )
+    parser.add_argument(
+        "-b",
+        "--llm-backend",
+        type=str,
+        default="openai",
+        choices=["openai", "stub", "replay", "record"],
+        help="LLM backend: the OpenAI API, a rule-based offline stub, \
+replay of recorded fixtures, or the OpenAI API while recording fixtures.\n",
+    )
+    parser.add_argument(
+        "-f",
+        "--fixtures",
+        type=str,
+        required=False,
+        help="Path to the LLM fixtures json used by the replay and record backends.\n",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Batch mode: number of wills processed concurrently.\n",
+    )
+    parser.add_argument(
+        "--directive-workers",
+        type=int,
+        required=False,
+        help="Number of directives of a will interpreted concurrently (1: one after the other).\n",
+    )
+    parser.add_argument(
+        "--pool",
+        type=str,
+        default="thread",
+        choices=["thread", "process"],
+        help="Batch mode: run wills on a thread pool (shared oracle and LLM client) \
+or a process pool (oracle and client loaded once per worker).\n",
+    )
     args = parser.parse_args()
 
     return args
@@ -91,124 +121,47 @@ def main():
     key = args.key
 
     # Paths check
-    if not os.path.isfile(input_file):
+    if input_file and not os.path.isfile(input_file):
         print(f"Error: The input file '{input_file}' does not exist.")
         sys.exit(1)
+    if args.batch and not os.path.exists(args.batch):
+        print(f"Error: The batch input '{args.batch}' does not exist.")
+        sys.exit(1)
     if oracle:
         if not os.path.isfile(oracle):
-            print(f"Error: The oracle file '{input_foracleile}' does not exist.")
+            print(f"Error: The oracle file '{oracle}' does not exist.")
             sys.exit(1)
     if not os.path.isdir(output_path):
         print(f"The output directory '{output_path}' does not exist. Creating it now.")
         os.makedirs(output_path) 
 
-    env = os.environ.copy()
-    env['OPENAI_API_KEY'] = key
-
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    ## Front End Script Paths
-    te_script =  os.path.abspath(os.path.join(base_dir, '..','frontend', 'text2extractions', 'src', 'main.py'))
-    now = datetime.now()
-    timestamp = now.strftime("%Y%m%d_%H%M%S") + f"{now.microsecond // 1000:03d}"  # adds milliseconds (zero-padded to 3 digits)
-    suffix1 = random.randint(1, 6000)
-    suffix2 = random.randint(1, 9999)
-    suffix = f"{timestamp}_{suffix1}_{suffix2}"
-
-    # Construct the full path with randomized name
-    te_input_path = os.path.abspath(os.path.join(base_dir, '..', 'frontend', 'text2extractions', f'input_{suffix}'))
-    te_output_path = os.path.abspath(os.path.join(base_dir, '..', 'frontend', 'text2extractions', f'output_{suffix}'))
-    te_base_path = os.path.abspath(os.path.join(base_dir, '..','frontend', 'text2extractions', 'src'))
-    
-    
-    os.makedirs(te_input_path, exist_ok=True)
-    os.makedirs(te_output_path, exist_ok=True)
-
-    ## Backend Script Paths
-    backend_base_path = os.path.abspath(os.path.join(base_dir, '..','backend'))
-    te_to_wm_script = os.path.abspath(os.path.join(base_dir, '..','backend', 'te_to_wm.py'))
-    devolution_script = os.path.abspath(os.path.join(base_dir, '..','backend', 'devolve_will.py'))
-
-    if not os.path.isfile(te_script):
-        print(f"Error: The module 'text to extractions' does not exist.")
+    if args.llm_backend in ["openai", "record"] and not key:
+        print(f"Error: the '{args.llm_backend}' LLM backend requires an OPEN AI API key (-k).")
         sys.exit(1)
-    if not os.path.isfile(te_to_wm_script):
-        print(f"Error: The module 'text extractions to Will Model' does not exist.")
-        sys.exit(1)
-    if not os.path.isfile(devolution_script):
-        print(f"Error: The module 'Will Model Devulution' does not exist.")
-        sys.exit(1)
-    remove_contents(te_input_path)
-
-    try:
-        shutil.copy(input_file, te_input_path)
-    except shutil.SameFileError:
-        pass
-        
-    
-    cmd_te = ['python3', te_script, '-i', te_input_path, '-o', te_output_path,'-m',FRONTEND_MODEL]
-    print("... Will Text to TE Module processing.\n")
-    p1 = subprocess.Popen(cmd_te, stdout=subprocess.PIPE, stderr=subprocess.PIPE,cwd =te_base_path,env=env)
-    for stdout_line in iter(p1.stdout.readline, b''):
-        sys.stdout.write(stdout_line.decode())
-        sys.stdout.flush()
-
-    stdout1, stderr1 = p1.communicate()
-
-    if p1.returncode == 0:
-        print("Will Text to TE Module processed successfully.\n")
-    else:
-        print(f"Will Text to TE Module failed with return code {p1.returncode}")
-        print(f"Error:\n{stderr1.decode('utf-8')}\n")
-        sys.exit(1)
-    
-
-    will_text_extraction_json= os.path.splitext(os.path.basename(input_file))[0] + '.json'
-    
-    output_will_text_extraction_json = os.path.abspath(os.path.join(te_output_path, will_text_extraction_json))
-    shutil.copy(output_will_text_extraction_json, output_path)
-    
-    te_json_path= os.path.abspath(os.path.join(output_path,will_text_extraction_json))
-    print(f"Text Extraction Json file saved successfully:\n- {te_json_path}")
-
-    wm_obj = os.path.splitext(os.path.basename(input_file))[0] + '.obj'
-    wm_obj_path = os.path.abspath(os.path.join(output_path,wm_obj))
-    cmd_te_to_wm = ['python3', te_to_wm_script,'-t',te_json_path,'-o',wm_obj_path]
-    print("... TE to WM Module processing.\n")
-    p2 = subprocess.Popen(cmd_te_to_wm, stdout=subprocess.PIPE, stderr=subprocess.PIPE,cwd =backend_base_path)
-    for stdout_line in iter(p2.stdout.readline, b''):
-        sys.stdout.write(stdout_line.decode())
-        sys.stdout.flush()
-
-    stdout2, stderr2 = p2.communicate()
-
-    if p2.returncode == 0:
-        print("TE to WM Module processed successfully.\n")
-    else:
-        print(f"TE to WM Module failed with return code {p2.returncode}")
-        print(f"Error:\n{stderr2.decode('utf-8')}\n")
-        sys.exit(1)
-    print(f"Will Model file saved successfully:\n- {wm_obj_path}")
 
-    devolution_file = os.path.splitext(os.path.basename(input_file))[0] + '.devolution.json'
-    devolution_file_path = os.path.abspath(os.path.join(output_path,devolution_file))
-    cmd_devolution = ['python3', devolution_script,'-p',wm_obj_path,'-o',devolution_file_path,'-m',BACKEND_MODEL]
-    if oracle:
-        cmd_devolution= ['python3', devolution_script,'-p',wm_obj_path,'-o',devolution_file_path,'-d',oracle,'-m',BACKEND_MODEL]
-    print("... WM to Devolution Module processing.\n")
-    p3 = subprocess.Popen(cmd_devolution, stdout=subprocess.PIPE, stderr=subprocess.PIPE,cwd =backend_base_path,env=env)
-    for stdout_line in iter(p3.stdout.readline, b''):
-        sys.stdout.write(stdout_line.decode())
-        sys.stdout.flush()
-
-    stdout3, stderr3 = p3.communicate()
-
-    if p3.returncode == 0:
-        print("WM to Devolution Module processed successfully.\n")
-    else:
-        print(f"WM to Devolution Module failed with return code {p3.returncode}")
-        print(f"Error:\n{stderr3.decode('utf-8')}\n")
-        sys.exit(1)
-    
+    config = {
+        "frontend_model": FRONTEND_MODEL,
+        "backend_model": BACKEND_MODEL,
+        "api_key": key,
+        "llm_backend": args.llm_backend,
+        "fixtures": args.fixtures,
+        "directive_workers": args.directive_workers,
+    }
+    if args.batch:
+        summary = run_batch(args.batch, oracle, config, output_path, args.workers, args.pool)
+        if args.pool == "thread":  # process workers keep their own counters
+            _, _, devolve_will = load_stages()
+            print(devolve_will.run_summary())
+        sys.exit(1 if summary['failed'] else 0)
+
+    with open(input_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    result = run_pipeline(text, oracle, config)
+    save_outputs(result, input_file, output_path)
+    _, _, devolve_will = load_stages()
+    print(devolve_will.run_summary())
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,378 @@
+""" pipeline.py --
+In-process pipeline from will text to devolution items. The three stages
+(text extraction, Will Model conversion, devolution) run in one
+interpreter and hand the frontend's Will object and the WMWillModel
+directly to one another, with no temp folders or subprocesses.
+run_batch processes a directory or manifest of wills on a worker pool. """
+
+import os, sys
+import json
+import time
+import pprint
+import traceback
+import importlib.util
+import concurrent.futures
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'backend'))
+FRONTEND_SRC_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'frontend', 'text2extractions', 'src'))
+DEFAULT_ORACLE = os.path.join(BACKEND_DIR, 'ORACLES', 'people_db.json')
+
+DEFAULT_CONFIG = {
+    "frontend_model": "gpt-4o-2024-08-06",
+    "backend_model": "gpt-4o-2024-08-06",
+    "api_key": None,        # exported as OPENAI_API_KEY when given
+    "llm_backend": None,    # openai, stub, replay or record; None keeps DASS_LLM_BACKEND
+    "fixtures": None,       # fixtures json for the replay and record backends
+    "cache_dir": None,      # LLM response cache directory; None for the default
+    "no_cache": False,
+    "llm_workers": None,
+    "llm_timeout": None,
+    "adaptive_voting": None,
+    "vote_confidence": None,
+    "max_connections": None,
+    "directive_workers": None,  # directives of a will interpreted concurrently; None for the default
+    "allocation_tolerance": None,  # over-allocation of an asset allowed before a directive is refused
+}
+
+STAGES = ['text_to_te', 'te_to_wm', 'devolution']
+STATUS_SUFFIX = '.status.json'
+BATCH_SUMMARY = 'batch_summary.json'
+
+_stages = None
+_applied_config = None
+_batch_db = None
+_batch_config = None
+
+
+################################################################################
+#                                                                              #
+#                                  UTILITIES                                   #
+#                                                                              #
+################################################################################
+
+
+def load_stages():
+    """Import the frontend, te_to_wm and devolve_will modules once.
+    The frontend entry point is also called main.py, so it is loaded
+    under its own module name."""
+    global _stages
+    if _stages is None:
+        if BACKEND_DIR not in sys.path:
+            sys.path.insert(0, BACKEND_DIR)
+        if FRONTEND_SRC_DIR not in sys.path:
+            sys.path.append(FRONTEND_SRC_DIR)
+        spec = importlib.util.spec_from_file_location(
+            "text2extractions_main", os.path.join(FRONTEND_SRC_DIR, 'main.py'))
+        frontend = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(frontend)
+        import te_to_wm
+        import devolve_will
+        _stages = (frontend, te_to_wm, devolve_will)
+    return _stages
+
+
+def make_config(config=None):
+    """Fill the given config dict with DEFAULT_CONFIG values."""
+    full_config = dict(DEFAULT_CONFIG)
+    if config:
+        full_config.update(config)
+    return full_config
+
+
+def apply_config(config):
+    """Point the LLM runtime at the configured key, backend and cache.
+    Re-applying the same config is a no-op, so repeated runs share the
+    backend, client and cache."""
+    global _applied_config
+    if config == _applied_config:
+        return
+    _applied_config = dict(config)
+    if config["api_key"]:
+        os.environ['OPENAI_API_KEY'] = config["api_key"]
+    if config["fixtures"]:
+        os.environ['DASS_LLM_FIXTURES'] = os.path.abspath(config["fixtures"])
+    if config["llm_backend"]:
+        os.environ['DASS_LLM_BACKEND'] = config["llm_backend"]
+
+    _, _, devolve_will = load_stages()
+    import llm_backend
+    if config["llm_backend"] or config["fixtures"]:
+        llm_backend.set_backend(None)  # re-read the backend choice
+    cache_dir = config["cache_dir"] or devolve_will.DEFAULT_CACHE_DIR
+    devolve_will.configure_llm(cache_dir, config["no_cache"], config["llm_workers"],
+                               config["llm_timeout"], config["adaptive_voting"],
+                               config["vote_confidence"], config["max_connections"])
+    devolve_will.configure_devolution(config["directive_workers"],
+                                      allocation_tolerance=config["allocation_tolerance"])
+
+
+def load_oracle(oracle):
+    """Accepts a path to the people's database (json or SQLite) or an
+    already loaded one, and returns it as an indexed oracle."""
+    load_stages()
+    from ORACLES.oracle import as_oracle
+    from ORACLES.sqlite_oracle import open_oracle
+    if oracle is None:
+        oracle = DEFAULT_ORACLE
+    if isinstance(oracle, str):
+        return open_oracle(oracle)
+    return as_oracle(oracle)
+
+
+################################################################################
+#                                                                              #
+#                                  Pipeline                                    #
+#                                                                              #
+################################################################################
+
+
+def run_pipeline(text, oracle=None, config=None):
+    """Run will text through extraction, Will Model conversion and
+    devolution in memory.
+
+    :param text: the will text
+    :param oracle: path to the people's database, the loaded database or an Oracle
+    :param config: dict overriding DEFAULT_CONFIG
+    :return: dict with the frontend 'extractions' (Will), the 'will_model'
+        (WMWillModel), the 'devolution' (division of assets), its 'record'
+        (see backend/devolution_record.py) and per-stage 'timings' in seconds
+    """
+    config = make_config(config)
+    apply_config(config)
+    frontend, te_to_wm, devolve_will = load_stages()
+    db = load_oracle(oracle)
+    timings = {}
+
+    print("... Will Text to TE Module processing.\n")
+    start = time.time()
+    extractions = frontend.extract_from_full_doc(
+        frontend.full_prompt, text, model_name=config["frontend_model"])
+    timings['text_to_te'] = time.time() - start
+
+    print("... TE to WM Module processing.\n")
+    start = time.time()
+    will_model = te_to_wm.build_will_model(extractions)
+    timings['te_to_wm'] = time.time() - start
+
+    print("... WM to Devolution Module processing.\n")
+    start = time.time()
+    record = {}
+    devolution = devolve_will.devolve(will_model, db, config["backend_model"], record=record)
+    timings['devolution'] = time.time() - start
+
+    return {
+        'extractions': extractions,
+        'will_model': will_model,
+        'devolution': devolution,
+        'record': record,
+        'timings': timings,
+    }
+
+
+def save_outputs(result, input_file, output_path, name=None):
+    """Save the text extractions json, the Will Model object and the
+    devolution json of a pipeline run, named after the input file
+    unless a name is given."""
+    _, te_to_wm, devolve_will = load_stages()
+    if name is None:
+        name = os.path.splitext(os.path.basename(input_file))[0]
+
+    te_json_path = os.path.abspath(os.path.join(output_path, name + '.json'))
+    with open(te_json_path, 'w') as f:
+        f.write(result['extractions'].model_dump_json(indent=4))
+    print(f"Text Extraction Json file saved successfully:\n- {te_json_path}")
+
+    wm_obj_path = os.path.abspath(os.path.join(output_path, name + '.obj'))
+    te_to_wm.save_will_model(result['will_model'], wm_obj_path)
+    print(f"Will Model file saved successfully:\n- {wm_obj_path}")
+
+    if not result['devolution']:
+        print("No directives could be executed due to allocation conflicts.")
+        return None
+    print("... Overall Division of Assets:")
+    pprint.pprint(result['devolution'])
+    devolution_file_path = os.path.abspath(os.path.join(output_path, name + '.devolution.json'))
+    devolve_will.save_json_obj(result['devolution'], devolution_file_path)
+    if result.get('record'):
+        devolve_will.save_record(result['record'], devolution_file_path)
+    return devolution_file_path
+
+
+################################################################################
+#                                                                              #
+#                                  Batch Mode                                  #
+#                                                                              #
+################################################################################
+
+
+def list_batch_inputs(batch):
+    """Will text files of a batch: every .txt file under a directory, or
+    the files listed in a manifest, one per line.  Manifest paths are
+    relative to the manifest; blank lines and '#' comments are ignored."""
+    if os.path.isdir(batch):
+        inputs = []
+        for root, _, files in os.walk(batch):
+            inputs += [os.path.join(root, f) for f in files if f.endswith('.txt')]
+        return sorted(os.path.abspath(f) for f in inputs)
+
+    base = os.path.dirname(os.path.abspath(batch))
+    inputs = []
+    with open(batch, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                inputs.append(os.path.abspath(os.path.join(base, line)))
+    return inputs
+
+
+def batch_names(inputs):
+    """Output names for the batch inputs: their path below the common
+    folder with the extension dropped, so that e.g. test1/will.txt and
+    test2/will.txt don't overwrite each other's outputs."""
+    if not inputs:
+        return []
+    root = os.path.commonpath([os.path.dirname(f) for f in inputs])
+    names = []
+    for f in inputs:
+        rel = os.path.splitext(os.path.relpath(f, root))[0]
+        names.append(rel.replace(os.sep, '__'))
+    return names
+
+
+def read_status(output_path, name):
+    """The status record of a processed will, or None."""
+    try:
+        with open(os.path.join(output_path, name + STATUS_SUFFIX), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_status(output_path, name, status):
+    """Write the status record last and atomically, so an interrupted
+    will never looks completed."""
+    path = os.path.join(output_path, name + STATUS_SUFFIX)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def init_batch_worker(oracle, config):
+    """Load the oracle and apply the LLM config once per worker.  Thread
+    workers share what the main process loaded; process workers run this
+    as their pool initializer."""
+    global _batch_db, _batch_config
+    _batch_config = make_config(config)
+    apply_config(_batch_config)
+    load_stages()
+    _batch_db = load_oracle(oracle)
+
+
+def run_batch_item(input_file, name, output_path):
+    """Run one will of a batch and record its status."""
+    status = {'input': input_file, 'name': name, 'status': 'completed',
+              'timings': {}, 'error': None}
+    start = time.time()
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+        result = run_pipeline(text, _batch_db, _batch_config)
+        status['timings'] = result['timings']
+        save_outputs(result, input_file, output_path, name)
+    except (Exception, SystemExit) as e:
+        # the stages exit on invalid wills; that fails this will, not the batch
+        status['status'] = 'failed'
+        status['error'] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    status['total'] = time.time() - start
+    write_status(output_path, name, status)
+    return status
+
+
+def summarize_batch(statuses, wall_time):
+    """Counts of completed, skipped and failed wills, and per-stage timings
+    over the wills processed in this run."""
+    summary = {
+        'wills': len(statuses),
+        'completed': sum(s['status'] == 'completed' for s in statuses),
+        'skipped': sum(s['status'] == 'skipped' for s in statuses),
+        'failed': sum(s['status'] == 'failed' for s in statuses),
+        'wall_time': wall_time,
+        'stages': {},
+        'failures': {s['name']: s['error'] for s in statuses if s['status'] == 'failed'},
+    }
+    for stage in STAGES + ['total']:
+        times = [s['timings'][stage] if stage != 'total' else s['total']
+                 for s in statuses
+                 if s['status'] != 'skipped' and (stage == 'total' or stage in s['timings'])]
+        summary['stages'][stage] = {
+            'count': len(times),
+            'total': sum(times),
+            'mean': sum(times) / len(times) if times else 0.0,
+        }
+    return summary
+
+
+def print_batch_summary(summary):
+    print("... Batch summary:")
+    print(f"- {summary['wills']} wills: {summary['completed']} completed, "
+          f"{summary['skipped']} skipped, {summary['failed']} failed "
+          f"in {summary['wall_time']:.1f}s")
+    for stage, t in summary['stages'].items():
+        print(f"- {stage}: {t['total']:.1f}s total, {t['mean']:.2f}s mean over {t['count']} wills")
+    for name, error in summary['failures'].items():
+        print(f"- FAILED {name}: {error}")
+
+
+def run_batch(batch, oracle=None, config=None, output_path='.', workers=4, pool='thread'):
+    """Process every will of a directory or manifest concurrently.
+
+    Wills whose status record says completed are skipped, so an
+    interrupted batch resumes where it stopped; failed wills are retried.
+    The thread pool shares one oracle, LLM client and response cache; the
+    process pool loads them once per worker process.
+
+    :param batch: directory of will text files, or a manifest file
+    :param oracle: path to the people's database, the loaded database or an Oracle
+    :param config: dict overriding DEFAULT_CONFIG
+    :param output_path: folder for the outputs, status records and summary
+    :param workers: number of wills processed at a time
+    :param pool: 'thread' or 'process'
+    :return: the batch summary dict, also saved as batch_summary.json
+    """
+    os.makedirs(output_path, exist_ok=True)
+    inputs = list_batch_inputs(batch)
+    names = batch_names(inputs)
+
+    statuses, todo = [], []
+    for input_file, name in zip(inputs, names):
+        status = read_status(output_path, name)
+        if status and status['status'] == 'completed':
+            status['status'] = 'skipped'
+            statuses.append(status)
+        else:
+            todo.append((input_file, name))
+    print(f"... Batch of {len(inputs)} wills: {len(statuses)} already done, "
+          f"{len(todo)} to process on {workers} {pool} workers.\n")
+
+    start = time.time()
+    if pool == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_batch_worker, initargs=(oracle, config))
+    else:
+        init_batch_worker(oracle, config)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    with executor:
+        futures = [executor.submit(run_batch_item, input_file, name, output_path)
+                   for input_file, name in todo]
+        for future in concurrent.futures.as_completed(futures):
+            statuses.append(future.result())
+
+    summary = summarize_batch(statuses, time.time() - start)
+    with open(os.path.join(output_path, BATCH_SUMMARY), 'w') as f:
+        json.dump(summary, f, indent=4)
+    print_batch_summary(summary)
+    return summary
@@ -0,0 +1,91 @@
+import os, sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# the backend modules import each other as top-level modules, as when run from backend/
+BACKEND_DIR = os.path.abspath(os.path.join(TESTS_DIR, '..', 'backend'))
+SRC_DIR = os.path.abspath(os.path.join(TESTS_DIR, '..', 'src'))
+for path in (BACKEND_DIR, SRC_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# four directives over tests/test3's people_db.json: shares, no condition,
+# per stirpes through the dead Person-2, and the residue
+FAMILY_WILL = """I, Person-1, hereby declare this to be my Last Will and Testament, revoking all previous wills.
+I appoint Person-5 as the Executor of this Will.
+I leave ownership of my house as follows: 60% to Person-4 and 40% to Person-3.
+I leave my Toyota Camry to Person-5.
+I leave my savings account as follows: per stirpes to Person-2 and Person-3.
+I leave all the rest of my estate as follows: equally to Person-3 and Person-4.
+"""
+
+
+def make_will(n_directives=3):
+    """A WMWillModel as te_to_wm builds it, with n bequests of one asset
+    each to two beneficiaries split 60/40, checksummed."""
+    from schemas.model.wm import WMWillModel, WMPerson, WMAsset, WMConditional, WMDirectiveBequeath
+    from merkle import will_checksum
+
+    directives = []
+    for k in range(n_directives):
+        directives.append(WMDirectiveBequeath(
+            beneficiaries=[WMPerson(name='Person-4', id=f'b{k}a'), WMPerson(name='Person-3', id=f'b{k}b')],
+            assets=[WMAsset(name=f'asset {k}', id=f'a{k}')],
+            conditions=[WMConditional(f'c{k}a', condition='60%'), WMConditional(f'c{k}b', condition='40%')],
+            executor='Person-5',
+            serialized_text=f"Bequest asset/s 'asset {k}' to 'Person-4 and Person-3' with following conditions: 60% and 40%."))
+    will = WMWillModel(text='I leave my assets', _date='2024-01-01',
+                       testator=WMPerson(name='Person-1', id='t1', dass_type='Testator'), directives=directives)
+    will.checksum = will_checksum(will)
+    return will
+
+
+@pytest.fixture
+def will():
+    return make_will()
+
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    """The stub LLM backend, with the response cache off."""
+    import gpt_req
+    import llm_backend
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    llm_backend.set_backend(llm_backend.StubBackend())
+    yield llm_backend.get_backend()
+    llm_backend.set_backend(None)
+
+
+@pytest.fixture
+def extract_will(stub_backend):
+    """Function of a will text to its WMWillModel, extracted and converted
+    in-process on the stub backend."""
+    import pipeline
+    frontend, te_to_wm, _ = pipeline.load_stages()
+
+    def extract(text):
+        return te_to_wm.build_will_model(frontend.extract_from_full_doc(frontend.full_prompt, text, model_name='stub'))
+    return extract
+
+
+@pytest.fixture
+def family_will(extract_will):
+    return extract_will(FAMILY_WILL)
+
+
+@pytest.fixture
+def test3_db():
+    from ORACLES.oracle import Oracle
+    return Oracle.load(os.path.join(TESTS_DIR, 'test3', 'people_db.json'))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--llm-backend', default='stub',
+                     help="LLM backend of the driver test: stub (offline, default), openai (needs OPENAI_API_KEY), "
+                          "record or replay")
+
+
+@pytest.fixture
+def llm_backend(request):
+    return request.config.getoption('--llm-backend')
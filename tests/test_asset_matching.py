@@ -0,0 +1,106 @@
+import pytest
+
+import gpt_req
+from asset_matching import score_pair, match_assets, similarity, tokens
+from devolve_will import find_assets
+from gpt_req import query_asset_matches
+from ledger import AllocationLedger
+from llm_backend import StubBackend, set_backend
+from schemas.model.wm import WMPerson, WMAsset, WMDirectiveBequeath
+
+ORACLE_ASSETS = [
+    {'name': '2015 Toyota Camry', 'type': 'Vehicle'},
+    {'name': 'Savings Account', 'type': 'Financial', 'bank': 'Chase'},
+    {'name': 'My House', 'type': 'Property', 'Location': 'Tucson'},
+    {'name': 'Cabin', 'type': 'Property'},
+]
+
+
+def test_tokens_drop_stopwords():
+    assert tokens("my 2015 Toyota, located in Tucson") == {'2015', 'toyota', 'tucson'}
+
+
+def test_similarity():
+    assert similarity("my house", "My House") == 1.0
+    assert similarity("house", "") == 0.0
+
+
+@pytest.mark.parametrize("directive_asset, decisions", [
+    ("my 2015 Toyota Camry", ['match', 'reject', 'reject', 'reject']),
+    ("my house", ['reject', 'reject', 'match', 'ambiguous']),
+    ("my savings at Chase", ['reject', 'match', 'reject', 'reject']),
+    ("my car", ['ambiguous', 'reject', 'reject', 'reject']),
+    ("my piano", ['reject', 'reject', 'reject', 'reject']),
+])
+def test_score_pair(directive_asset, decisions):
+    assert [score_pair(directive_asset, asset)[0] for asset in ORACLE_ASSETS] == decisions
+
+
+def test_confident_matches_skip_the_llm():
+    matrix, decided_by = match_assets(["my house", "my 2015 Toyota Camry"], ORACLE_ASSETS,
+                                      lambda rows, cols: pytest.fail("asked the LLM"))
+    assert matrix == [[False, False, True, False], [True, False, False, False]]
+    assert all(path == 'lexical' for row in decided_by for path, _ in row)
+
+
+def test_ambiguous_candidates_asked_in_one_call():
+    calls = []
+
+    def ask_llm(rows, cols):
+        calls.append((rows, [asset['name'] for asset in cols]))
+        return [[True for _ in cols] for _ in rows]
+
+    matrix, decided_by = match_assets(["my lake home", "my house"], ORACLE_ASSETS, ask_llm, top_k=1)
+    assert len(calls) == 1
+    rows, cols = calls[0]
+    assert rows == ["my lake home"] and len(cols) == 1
+    assert sum(matrix[0]) == 1
+    assert matrix[1] == [False, False, True, False]
+    assert [path for path, _ in decided_by[0]].count('llm') == 1
+
+
+class MatrixStub(StubBackend):
+    """The stub backend, counting its asset match queries and answering
+    them with the first `rows` rows only."""
+
+    def __init__(self, rows=None):
+        self.calls = 0
+        self.rows = rows
+
+    def _parse_AssetMatchMatrix(self, prompt):
+        self.calls += 1
+        matrix = super()._parse_AssetMatchMatrix(prompt)['matrix']
+        return {'matrix': matrix[:self.rows] if self.rows is not None else matrix}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    backend = MatrixStub()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+
+def test_one_query_for_the_whole_matrix(stub):
+    matrix = query_asset_matches(["my toyota", "my cabin", "my piano"], ORACLE_ASSETS)
+    assert stub.calls == 1
+    assert matrix == [[True, False, False, False], [False, False, False, True], [False, False, False, False]]
+
+
+def test_missing_rows_do_not_match(stub):
+    stub.rows = 1
+    assert query_asset_matches(["my toyota", "my cabin"], ORACLE_ASSETS) == [
+        [True, False, False, False], [False, False, False, False]]
+
+
+def test_find_assets_asks_once_for_every_ambiguous_asset(stub):
+    directive = WMDirectiveBequeath(beneficiaries=[WMPerson(name='Person-4', id='b')],
+                                    assets=[WMAsset(name='toyota car', id='a1'), WMAsset(name='my lake cabin', id='a2')],
+                                    conditions=[], executor='Person-5', serialized_text='')
+    testator = {'assets': ORACLE_ASSETS}
+    trace = {}
+    mapping, assets, found = find_assets(directive, testator, AllocationLedger(), 'model', trace=trace)
+    assert found and stub.calls == 1
+    assert [asset['name'] for asset in assets] == ['2015 Toyota Camry', 'Cabin']
+    assert trace['2015 Toyota Camry']['MatchedBy'] == 'llm'
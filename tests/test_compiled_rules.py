@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+import pytest
+
+from ORACLES.oracle import Oracle
+from compiled_rules import (UNALIVE_RULE_TEXT, compile_rule, evaluate_rule, check, rule_people,
+                            divide_equally, divide_by_stirpes, add_shares)
+from schemas.model.wm.wm_predicate import WMPredicate
+from will_format import to_canonical, from_canonical, WillFormatError
+
+
+def person(person_id, name, alive, age, children_ids=()):
+    return {'id': person_id, 'full_name': name, 'alive': alive, 'age': age, 'children_ids': list(children_ids)}
+
+
+def family():
+    """Testator 1 with Alice (alive), Bob (deceased, children Carol and
+    Dave) and Eve; Carol and Eve are under age."""
+    return Oracle({'people': [
+        person(1, 'Testator', 'false', 80, [2, 3, 6]),
+        person(2, 'Alice', 'true', 50),
+        person(3, 'Bob', 'false', 55, [4, 5]),
+        person(4, 'Carol', 'true', 15),
+        person(5, 'Dave', 'true', 20),
+        person(6, 'Eve', 'true', 17),
+    ]})
+
+
+def interpreted(identifier, evals, beneficiaries, assets, db):
+    """The division of the branches of validate_and_evaluate_conditions
+    before rules were compiled; {} when a condition does not hold."""
+    division = defaultdict(dict)
+    shares = []
+
+    def give(criteria):
+        for name, asset_name, share in criteria:
+            f_share = float(share)
+            if f_share:
+                f_share /= 100
+            for person_real in beneficiaries:
+                if person_real['full_name'] == name:
+                    if person_real['alive'] != 'true':
+                        divide_by_stirpes(person_real, db, shares, asset_name, f_share)
+                    else:
+                        division[asset_name][name] = f_share
+                    break
+
+    if identifier in [0, 1]:
+        divide_equally(beneficiaries, assets, db, division, shares)
+    elif identifier in [3, 6]:
+        give(evals)
+    else:
+        for name in (evals[1] if identifier == 5 else []):
+            found = db.by_name(name)
+            if found and found['alive'] == 'true':
+                return {}
+        for name, age in (evals[1] if identifier == 11 else []):
+            found = db.by_name(name)
+            if found and found['age'] < age:
+                return {}
+        if evals[0]:
+            give(evals[0])
+        else:
+            divide_equally(beneficiaries, assets, db, division, shares)
+    add_shares(division, shares)
+
+    for asset, asset_people in division.items():
+        for name in list(asset_people):
+            real_person = db.by_name(name)
+            if real_person and int(real_person['age']) < 18:
+                division[asset][f"{name} (through custodian)"] = float(asset_people.pop(name))
+    return {asset: dict(parts) for asset, parts in division.items()}
+
+
+HOUSE = {'name': 'House'}
+CAR = {'name': 'Car'}
+
+
+@pytest.mark.parametrize("identifier, evals, names, assets", [
+    (0, [], ['Alice', 'Bob'], [HOUSE]),
+    (1, [], ['Alice', 'Eve'], [HOUSE, CAR]),
+    (3, [('Alice', 'House', '60'), ('Bob', 'House', '40')], ['Alice', 'Bob'], [HOUSE]),
+    (3, [('Eve', 'House', '50'), ('Alice', 'Car', '100')], ['Alice', 'Eve'], [HOUSE, CAR]),
+    (5, [[], ['Bob']], ['Alice', 'Eve'], [HOUSE]),
+    (5, [[('Alice', 'House', '25'), ('Bob', 'House', '75')], ['Bob']], ['Alice', 'Bob'], [HOUSE]),
+    (5, [[], ['Alice']], ['Eve'], [HOUSE]),
+    (11, [[], [('Dave', 18)]], ['Alice', 'Bob'], [HOUSE, CAR]),
+    (11, [[('Eve', 'House', '100')], [('Eve', 18)]], ['Eve'], [HOUSE]),
+    (11, [[('Carol', 'Car', '30'), ('Alice', 'Car', '70')], [('Alice', 21)]], ['Alice', 'Carol'], [CAR]),
+])
+def test_compiled_rule_matches_interpreted_evaluation(identifier, evals, names, assets):
+    db = family()
+    beneficiaries = [db.by_name(name) for name in names]
+    rule_text = [UNALIVE_RULE_TEXT if identifier == 5 else 'rule']
+    rule = compile_rule([identifier], evals, rule_text, beneficiaries, assets)
+    rule = from_canonical(to_canonical(rule))  # as stored with the will
+
+    division, ids, _ = evaluate_rule(rule, db, beneficiaries)
+    assert ids == [identifier]
+    assert {asset: dict(parts) for asset, parts in (division or {}).items()} == \
+        interpreted(identifier, evals, beneficiaries, assets, db)
+
+
+def test_unalive_condition_names_the_people():
+    db = family()
+    rule = compile_rule([5], [[], ['Bob']], [UNALIVE_RULE_TEXT], [db.by_name('Alice')], [HOUSE])
+    assert rule_people(rule) == ['Bob', 'Alice']
+    _, _, rule_text = evaluate_rule(rule, db, [db.by_name('Alice')])
+    assert rule_text[0].startswith("If the following person(s) are not alive:\n  - Bob")
+
+
+def test_unknown_asset_is_not_compiled():
+    db = family()
+    assert compile_rule([3], [('Alice', 'Boat', '100')], ['rule'], [db.by_name('Alice')], [HOUSE]) is None
+    assert compile_rule([3], [('Zed', 'House', '100')], ['rule'], [db.by_name('Alice')], [HOUSE]) is None
+
+
+def test_unknown_predicate_is_an_error():
+    db = family()
+    rule = compile_rule([0], [], ['rule'], [db.by_name('Alice')], [HOUSE])
+    rule.args[2] = WMPredicate(fn='is_rich', args=[])
+    with pytest.raises(ValueError, match="Unknown predicate function"):
+        evaluate_rule(rule, db, [db.by_name('Alice')])
+    with pytest.raises(ValueError):
+        check(WMPredicate(fn='is_rich', args=[]), db)
+
+
+def test_malformed_stored_rule_is_an_error():
+    db = family()
+    stored = to_canonical(compile_rule([0], [], ['rule'], [db.by_name('Alice')], [HOUSE]))
+    stored['$attrs']['_args'][2]['$type'] = 'WMNotAPredicate'
+    with pytest.raises(WillFormatError, match="Unknown Will Model type"):
+        from_canonical(stored)
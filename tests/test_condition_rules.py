@@ -0,0 +1,98 @@
+from fractions import Fraction
+
+import pytest
+
+from condition_rules import identify_rule, condition_text
+
+ASSETS = [{'name': 'House'}]
+BENEFICIARIES = ['Alice Smith', 'Bob Smith']
+
+
+def identify(condition, beneficiaries=BENEFICIARIES, children=()):
+    directive = f"Bequeath House to Alice Smith with following conditions: {condition}."
+    return identify_rule(directive, ASSETS, beneficiaries, children)
+
+
+def test_condition_text():
+    assert condition_text("Bequeath House to Alice Smith with following conditions: per stirpes.") == "per stirpes"
+    assert condition_text("Bequeath House to Alice Smith") == ''
+
+
+def test_no_conditions_is_equal_division():
+    assert identify_rule("Bequeath House to Alice Smith", ASSETS, BENEFICIARIES) == ([1], [])
+
+
+@pytest.mark.parametrize("condition, rule", [
+    ("per stirpes", [0]),
+    ("in equal shares", [1]),
+    ("share and share alike", [1]),
+])
+def test_literal_rules(condition, rule):
+    assert identify(condition) == (rule, [])
+
+
+def test_percent_division():
+    ids, division = identify("60% to Alice Smith and 40% to Bob Smith")
+    assert ids == [3]
+    assert division == [('Alice Smith', 'House', Fraction(60)), ('Bob Smith', 'House', Fraction(40))]
+
+
+def test_predecease():
+    assert identify("if Alice Smith predeceases me") == ([5, 1], ([], ['Alice Smith']))
+    assert identify("if Alice Smith dies before me") == ([5, 1], ([], ['Alice Smith']))
+
+
+def test_age():
+    assert identify("if Alice Smith attains the age of 21") == ([11, 1], ([], [('Alice Smith', 21)]))
+    assert identify("when Alice Smith turns 18") == ([11, 1], ([], [('Alice Smith', 18)]))
+
+
+def test_age_of_every_beneficiary():
+    assert identify("upon attaining the age of 21") == ([11, 1], ([], [('Alice Smith', 21), ('Bob Smith', 21)]))
+
+
+def test_age_after_shares():
+    ids, (division, age_reqs) = identify("60% to Alice Smith and 40% to Bob Smith upon attaining the age of 21")
+    assert ids == [11, 3]
+    assert division == [('Alice Smith', 'House', Fraction(60)), ('Bob Smith', 'House', Fraction(40))]
+    assert age_reqs == [('Alice Smith', 21), ('Bob Smith', 21)]
+
+
+@pytest.mark.parametrize("condition", [
+    "if Alice Smith does not attain the age of 21",
+    "unless Alice Smith attains the age of 21",
+    "if Alice Smith fails to reach the age of 21",
+    "if Alice Smith dies before attaining the age of 21",
+    "if Alice Smith should not reach the age of 21",
+    "if Alice Smith never turns 30",
+    "to Alice Smith until she reaches 25",
+    "if Alice Smith does not predecease me",
+    "if Alice Smith should not predecease me",
+    "should Alice Smith not survive me",
+])
+def test_negated_conditions_go_to_the_llm(condition):
+    assert identify(condition) is None
+
+
+@pytest.mark.parametrize("condition", [
+    "if my son never turns 30",
+    "if my son turns 30",
+    "if she reaches 25",
+    "if Alice Smith or her husband attains the age of 21",
+    "if my spouse predeceases me",
+])
+def test_unresolved_subjects_go_to_the_llm(condition):
+    assert identify(condition) is None
+
+
+def test_unexplained_words_go_to_the_llm():
+    assert identify("in equal shares for the upkeep of the garden") is None
+
+
+@pytest.mark.parametrize("condition", [
+    "in equal shares, 60% to Alice Smith",
+    "60% to Alice Smith and 40% to Bob Smith, share and share alike",
+    "equally, 50% to Alice Smith if Bob Smith predeceases me",
+])
+def test_equal_shares_and_percentages_go_to_the_llm(condition):
+    assert identify(condition) is None
@@ -0,0 +1,80 @@
+import copy
+import os
+
+import pytest
+
+from ORACLES.oracle import Oracle
+import devolve_will
+from devolve_will import devolve
+from devolution_record import record_path, load_record, save_record, directive_facts, facts_hold
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+
+
+@pytest.fixture
+def db():
+    return Oracle.load(PEOPLE_DB)
+
+
+@pytest.fixture
+def facts(will, db):
+    directive = will._directives[0]
+    beneficiaries = [db.match_name(person.name) for person in directive._beneficiaries]
+    division = {'asset 0': {'Person-4': 0.6, 'Person-3': 0.4}}
+    return directive_facts(directive, beneficiaries, division, None, db)
+
+
+def test_record_path():
+    assert record_path('out/t1_devolution.json') == 'out/t1_devolution.deps.json'
+    assert record_path('out/t1') == 'out/t1.deps.json'
+
+
+def test_save_and_load(facts, tmp_path):
+    path = str(tmp_path / 'devolution.json')
+    assert load_record(path) is None
+    save_record({'directives': [facts]}, path)
+    assert load_record(path) == {'directives': [facts]}
+
+
+def test_directive_facts(facts):
+    assert facts['names'] == {'Person-4': 4, 'Person-3': 3}
+    assert set(facts['full_names']) == {'Person-4', 'Person-3'}
+    assert {p_id for p_id, _ in facts['people']} == {3, 4}
+
+
+def test_facts_hold(facts, db):
+    assert facts_hold(facts, db)
+    db.get(2)['alive'] = 'true'
+    assert facts_hold(facts, db)
+    db.get(4)['age'] = 12
+    assert not facts_hold(facts, db)
+
+
+def test_descendants_of_people_not_alive_are_recorded(will, db):
+    db.get(4)['alive'] = 'false'
+    facts = directive_facts(will._directives[0], [db.match_name('Person-4')], {}, None, db)
+    assert set(db.get(4)['children_ids']) <= {p_id for p_id, _ in facts['people']}
+
+
+def test_incremental_matches_full_devolution(family_will, test3_db, monkeypatch):
+    monkeypatch.setattr(devolve_will, 'DIRECTIVE_WORKERS', 1)
+    record = {}
+    devolve(copy.deepcopy(family_will), test3_db, 'stub', record=record)
+
+    # Person-5, of the Toyota Camry and (through Person-2) the savings account, is now under age
+    test3_db.get(5)['age'] = 12
+    full = devolve(copy.deepcopy(family_will), test3_db, 'stub')
+
+    interpreted = []
+    interpret_directive = devolve_will.interpret_directive
+    def spy(directive, *args, **kwargs):
+        interpreted.append(directive.serialized_text)
+        return interpret_directive(directive, *args, **kwargs)
+    monkeypatch.setattr(devolve_will, 'interpret_directive', spy)
+    incremental = devolve(copy.deepcopy(family_will), test3_db, 'stub', previous=record)
+
+    assert incremental == full
+    assert full['Toyota Camry']['beneficiaries'].keys() == {'Person-5 (through custodian)'}
+    texts = [directive.serialized_text for directive in family_will._directives]
+    # the house and the residue, to Person-3 and Person-4, are reused
+    assert interpreted == [texts[1], texts[2]]
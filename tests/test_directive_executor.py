@@ -0,0 +1,47 @@
+import copy
+
+import pytest
+
+import devolve_will
+from devolve_will import devolve, interpret_directives, find_testator
+
+
+def shares(division):
+    return {asset: {person: details['share'] for person, details in info['beneficiaries'].items()}
+            for asset, info in division.items()}
+
+
+@pytest.fixture(autouse=True)
+def workers(monkeypatch):
+    monkeypatch.setattr(devolve_will, 'DIRECTIVE_WORKERS', 4)
+
+
+def test_interpreted_concurrently(family_will, test3_db):
+    directives = family_will._directives
+    testator = find_testator(family_will, test3_db)
+    interpretations = interpret_directives(directives, testator, test3_db, 'stub', skip={1})
+    assert interpretations[1] is None and all(interpretations[k].valid for k in (0, 2, 3))
+    assert interpret_directives(directives, testator, test3_db, 'stub', workers=1) == [None] * 4
+
+
+def test_concurrent_matches_sequential(family_will, test3_db, monkeypatch, capsys):
+    concurrent = devolve(copy.deepcopy(family_will), test3_db, 'stub')
+    # the residue was interpreted before the other directives allocated their assets
+    assert "re-interpreting directive after earlier allocations" in capsys.readouterr().out
+    monkeypatch.setattr(devolve_will, 'DIRECTIVE_WORKERS', 1)
+    sequential = devolve(copy.deepcopy(family_will), test3_db, 'stub')
+    assert concurrent == sequential
+    assert shares(concurrent) == {
+        'My House': {'Person-4': 0.6, 'Person-3': 0.4},
+        'Toyota Camry': {'Person-5': 1.0},
+        'Savings Account': {'Person-3': 0.5, 'Person-4': 0.25, 'Person-5': 0.25},
+        'Family Home': {'Person-4': 0.5, 'Person-3': 0.5},
+    }
+
+
+def test_same_record(family_will, test3_db, monkeypatch):
+    concurrent, sequential = {}, {}
+    devolve(copy.deepcopy(family_will), test3_db, 'stub', record=concurrent)
+    monkeypatch.setattr(devolve_will, 'DIRECTIVE_WORKERS', 1)
+    devolve(copy.deepcopy(family_will), test3_db, 'stub', record=sequential)
+    assert concurrent == sequential
@@ -1,61 +1,48 @@
 import json, sys, os, subprocess, shutil, time
 
 def check_division (devolution, ground_truth):
+    """Compare the devolution json (asset -> beneficiaries -> share and
+    rules) with the ground truth (asset -> beneficiares -> share, rule_id)."""
     for asset_g in ground_truth:
-        asset_found = False
         rule_text_g = ground_truth[asset_g]['rule_applied_text']
         rule_applied_g = int(ground_truth[asset_g]['rule_id'])
         print(f"Testing rule: {rule_text_g}")
+        if asset_g not in devolution:
+            print(f"Asset {asset_g} not found in devolution")
+            return False
+        beneficiaries_d = devolution[asset_g]['beneficiaries']
         for beneficiary_g in ground_truth[asset_g]['beneficiares']:
-            beneficiar_found = False
             division_b_g = ground_truth[asset_g]['beneficiares'][beneficiary_g]
-            for directive in devolution:
-                rule_text_d = devolution[directive]['rule_applied_text']
-                rule_applied_d = int(devolution[directive]['rule_applied_id'])
-                for asset_d in devolution[directive]:
-                    if asset_d == asset_g:
-                        asset_found  = True
-                        for beneficiary_d in devolution[directive][asset_d]:
-                            if beneficiary_g == beneficiary_d:
-                                beneficiar_found = True
-                                division_b_d = devolution[directive][asset_d][beneficiary_d]
-                                division_b_d = round(division_b_d,4)
-                                 ### checking if ground truth division equals devolution output division
-                                try:
-                                    assert (division_b_d == division_b_g)
-                                except AssertionError as error:
-                                         print(f"Division of asset '{asset_g}' to '{beneficiary_g}' incorrect.")
-                                         print(f"Expected a value of {division_b_g}, but instead found {division_b_d}.")
-                                         return False
-                                ### checking if rule applied is correct
-                                try:
-                                    assert (rule_applied_g == rule_applied_d)
-                                except AssertionError as error:
-                                         print(f"Division of asset '{asset_g}' to '{beneficiary_g}' with incorrect rule.")
-                                         print(f"Expected a rule'{rule_text_g}', but instead found '{rule_text_d}'.")
-                                         return False
-            if not beneficiar_found:
+            if beneficiary_g not in beneficiaries_d:
                 print(f"Beneficiary {beneficiary_g} for {asset_g} not found in devolution")
                 return False
-
-        if not asset_found :
-            print(f"Asset {asset_g} not found in devolution")
-            return False
+            division_b_d = round(beneficiaries_d[beneficiary_g]['share'],4)
+            rule_text_d = beneficiaries_d[beneficiary_g]['rules_applied_text']
+            rule_applied_d = int(beneficiaries_d[beneficiary_g]['rules_id'][0])
+            ### checking if ground truth division equals devolution output division
+            if division_b_d != division_b_g:
+                print(f"Division of asset '{asset_g}' to '{beneficiary_g}' incorrect.")
+                print(f"Expected a value of {division_b_g}, but instead found {division_b_d}.")
+                return False
+            ### checking if rule applied is correct
+            if rule_applied_g != rule_applied_d:
+                print(f"Division of asset '{asset_g}' to '{beneficiary_g}' with incorrect rule.")
+                print(f"Expected a rule'{rule_text_g}', but instead found '{rule_text_d}'.")
+                return False
     return True
 
-def main():
-    time_start = time.time()
-    
+TEST_FOLDERS = ['test1', 'test2', 'test3']
 
-    if len(sys.argv) <3:
-        print("Test format: python3 test_driver.py OPENAI_API_KEY test_folder")
-    key = sys.argv[1]
-    test_folder = sys.argv[2]
+def run_driver_test(test_folder, key=None, backend=None):
+    """Run the driver on the test folder's will and check the devolution
+    against its ground truth; True if it matches.  backend is the driver's
+    -b LLM backend (its own default, openai, if None)."""
+    time_start = time.time()
     base_dir = os.path.dirname(os.path.abspath(__file__))
     driver_script =  os.path.abspath(os.path.join(base_dir, '..', 'src', 'driver.py')) 
     if not os.path.isfile(driver_script):
             print(f"Error: The driver module does not exist.")
-            sys.exit(1)
+            return False
     input_test_file = os.path.abspath(os.path.join(test_folder, 'will.txt'))
     input_ground_truth = os.path.abspath(os.path.join(test_folder, 'ground_truth.json'))
     output_path = os.path.abspath(os.path.join(base_dir, 'output_test'))
@@ -67,16 +54,19 @@ def main():
 
     if not os.path.isfile(input_test_file):
             print(f"Error: The test file does not exist.")
-            sys.exit(1)
+            return False
     if not os.path.isfile(input_ground_truth):
             print(f"Error: The ground truth file does not exist.")
-            sys.exit(1)
+            return False
     if not os.path.isfile(people_db_path):
             people_db_path = None
+    cmd_run_driver = ['python3', driver_script,'-i',input_test_file,'-o',output_path]
+    if backend:
+        cmd_run_driver += ['-b',backend]
+    if key:
+        cmd_run_driver += ['-k',key]
     if people_db_path:
-        cmd_run_driver = ['python3', driver_script,'-i',input_test_file,'-o',output_path, '-k',key, '-d',people_db_path ]
-    else:
-        cmd_run_driver = ['python3', driver_script,'-i',input_test_file,'-o',output_path, '-k',key]
+        cmd_run_driver += ['-d',people_db_path]
     process = subprocess.Popen(cmd_run_driver, stdout=subprocess.PIPE, stderr=subprocess.PIPE,cwd = base_dir)
     stdout, stderr = process.communicate()
 
@@ -84,9 +74,9 @@ def main():
         print(f"Driver module failed with error code: {process.returncode}")
         if  os.path.isdir(output_path):
             shutil.rmtree(output_path)
-        print(f"Error:\n{stdout.decode()}\n")
+        print(f"Error:\n{stdout.decode()}\n{stderr.decode()}\n")
         print()
-        sys.exit(1)
+        return False
 
 
     devolution_file_path =   None
@@ -94,23 +84,40 @@ def main():
         if file.endswith("devolution.json"):
             devolution_file_path = os.path.abspath(os.path.join(output_path,file )) 
 
-    if not os.path.isfile(devolution_file_path):
+    if devolution_file_path is None or not os.path.isfile(devolution_file_path):
             print(f"Error: The devolution file does not exist.")
             if  os.path.isdir(output_path):
                 shutil.rmtree(output_path)
-            sys.exit(1)
+            return False
 
     with open(devolution_file_path, 'r') as file:
         devolution_data = json.load(file)
     with open(input_ground_truth, 'r') as file:
         GT_data = json.load(file)
+    shutil.rmtree(output_path)
 
-    assert(check_division (devolution_data, GT_data))
+    if not check_division (devolution_data, GT_data):
+        return False
 
     print("Test Passed Successfully.")
     time_taken = round(time.time() - time_start,2)
     print(f"Time taken: {time_taken}s")
-    shutil.rmtree(output_path)
+    return True
+
+def test_driver(llm_backend):
+    """The pipeline reproduces the ground truth of every test folder, on
+    the LLM backend of pytest's --llm-backend (stub, offline, by default)."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for test_folder in TEST_FOLDERS:
+        assert run_driver_test(os.path.join(base_dir, test_folder), os.environ.get('OPENAI_API_KEY'), llm_backend), test_folder
+
+def main():
+    if len(sys.argv) <3:
+        print("Test format: python3 test_driver.py OPENAI_API_KEY test_folder")
+    key = sys.argv[1]
+    test_folder = sys.argv[2]
+    if not run_driver_test(test_folder, key):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import estates
+from ORACLES.oracle import Oracle
+from estates import estate_order, EstateCycleError, inherited_asset_name, holder_name, devolve_estate, devolve_estates
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+NAMES = {1: 'Person-1', 2: 'Person-2', 3: 'Person-3'}
+
+
+def test_estate_order():
+    # 3's will names 1, 1's will names 2: 3 is devolved first, then 1, then 2
+    assert estate_order([1, 2, 3], {1: {2}, 2: set(), 3: {1}}, NAMES) == [3, 1, 2]
+    assert estate_order([1, 2, 3], {1: set(), 2: set(), 3: set()}, NAMES) == [1, 2, 3]
+
+
+def test_estate_cycle():
+    with pytest.raises(EstateCycleError, match="cycle between wills: Person-1 -> Person-2 -> Person-1"):
+        estate_order([1, 2, 3], {1: {2}, 2: {1}, 3: set()}, NAMES)
+    assert issubclass(EstateCycleError, ValueError)
+
+
+def test_inherited_asset_name():
+    assert inherited_asset_name('House', 'Person-1', {'Car'}) == 'House'
+    assert inherited_asset_name('House', 'Person-1', {'House'}) == 'House (from Person-1)'
+    assert holder_name('Person-9 (through custodian)') == 'Person-9'
+
+
+def test_devolve_estate_memo(will, monkeypatch):
+    db = Oracle.load(PEOPLE_DB)
+    calls = []
+
+    def devolve(will_object, oracle, model_name):
+        calls.append(oracle)
+        return {'asset 0': {'beneficiaries': {'Person-4': {'share': 1.0}}}}
+
+    monkeypatch.setattr(estates, 'devolve', devolve)
+    monkeypatch.setattr(estates, 'ESTATE_MEMO', {})
+    monkeypatch.setattr(estates, 'ESTATE_STATS', {'devolved': 0, 'memoized': 0})
+    testator = db.get(1)
+    inherited = [{'name': 'Cabin', 'type': 'Inherited', 'from': 'Person-2'}]
+    first = devolve_estate(will, db, testator, inherited, {2}, 'stub')
+    assert devolve_estate(will, db, testator, inherited, {2}, 'stub') is first
+    assert len(calls) == 1 and estates.ESTATE_STATS == {'devolved': 1, 'memoized': 1}
+    # the inherited asset and the named testator are seen only through the overlay
+    assert calls[0].get(1)['assets'][-1] == inherited[0] and calls[0].get(2)['alive'] == 'true'
+    assert inherited[0] not in db.get(1).get('assets', []) and db.get(2)['alive'] == 'false'
+
+    devolve_estate(will, db, testator, [], {2}, 'stub')
+    assert len(calls) == 2 and "1 reused from memo" in estates.estate_summary()
+
+
+def will_text(testator, directive):
+    return (f"I, {testator}, hereby declare this to be my Last Will and Testament, revoking all previous wills.\n"
+            f"I appoint Person-5 as the Executor of this Will.\n{directive}\n")
+
+
+def test_devolve_estates_chain(extract_will, test3_db, monkeypatch):
+    monkeypatch.setattr(estates, 'ESTATE_MEMO', {})
+    monkeypatch.setattr(estates, 'ESTATE_STATS', {'devolved': 0, 'memoized': 0})
+    parent = extract_will(will_text('Person-1', "I leave my house as follows: equally to Person-3 and Person-4."))
+    child = extract_will(will_text('Person-3', "I leave all the rest of my estate to Person-4."))
+
+    result = devolve_estates([child, parent], test3_db, 'stub')
+    assert result['order'] == ['Person-1', 'Person-3']
+    # Person-3's half of the house passes on by Person-3's will
+    assert result['ownership']['Person-1: My House'] == {'Person-4': 1.0}
+    assert [transfer for transfer in result['transfers'] if transfer[2] == 'Person-1: My House'] == [
+        ['Person-1', 'Person-3', 'Person-1: My House', 0.5],
+        ['Person-1', 'Person-4', 'Person-1: My House', 0.5],
+        ['Person-3', 'Person-4', 'Person-1: My House', 0.5],
+    ]
+    assert result['estates']['Person-3']['My House']['beneficiaries']['Person-4']['share'] == 1.0
+    # what Person-1's will does not give away stays with the estate
+    assert result['ownership']['Person-1: Toyota Camry'] == {'Person-1': 1.0}
+    assert 'My House' not in [asset['name'] for asset in test3_db.get(3).get('assets', [])]
@@ -0,0 +1,79 @@
+import pytest
+
+import ledger
+from ledger import AllocationLedger, configure_ledger
+
+
+def test_allocate():
+    book = AllocationLedger()
+    assert book.allocate({'House': {'Alice': 0.6, 'Bob': 0.4}})
+    assert book.allocation('House') == pytest.approx(1.0)
+    assert book.is_full('House')
+    assert book.fully_allocated() == {'House'}
+    assert book.division() == {'House': {'beneficiaries': {'Alice': {'share': 0.6}, 'Bob': {'share': 0.4}}}}
+
+
+def test_shares_add_up():
+    book = AllocationLedger()
+    assert book.allocate({'House': {'Alice': 0.25}})
+    assert book.allocate({'House': {'Alice': 0.25, 'Bob': 0.5}})
+    assert book.allocations() == {'House': 1.0}
+    assert book.division()['House']['beneficiaries'] == {'Alice': {'share': 0.5}, 'Bob': {'share': 0.5}}
+
+
+def test_division_in_allocation_order():
+    book = AllocationLedger()
+    book.add_asset({'name': 'Car'})
+    assert book.allocate({'House': {'Alice': 0.5, 'Bob': 0.25}})
+    assert book.allocate({'Car': {'Bob': 1.0}, 'House': {'Carol': 0.0, 'Alice': 0.25}})
+    division = book.division()
+    assert list(division) == ['House', 'Car']
+    assert list(division['House']['beneficiaries'].items()) == [
+        ('Alice', {'share': 0.75}), ('Bob', {'share': 0.25}), ('Carol', {'share': 0.0})]
+
+
+def test_thirds_are_full():
+    book = AllocationLedger()
+    assert book.allocate({'House': {name: 1 / 3 for name in ['Alice', 'Bob', 'Carol']}})
+    assert book.is_full('House')
+
+
+def test_over_allocation_rolls_back_the_whole_directive():
+    book = AllocationLedger()
+    assert book.allocate({'House': {'Alice': 0.6}, 'Car': {'Alice': 0.5}})
+    before = (book.allocations(), book.division())
+    assert not book.allocate({'Car': {'Bob': 0.5}, 'House': {'Bob': 0.5}})
+    assert (book.allocations(), book.division()) == before
+    assert 'Bob' not in {party for info in book.division().values() for party in info['beneficiaries']}
+
+
+def test_tolerance():
+    book = AllocationLedger(tolerance=0.02)
+    assert book.allocate({'House': {'Alice': 0.51, 'Bob': 0.51}})
+    assert not AllocationLedger(tolerance=0.0).allocate({'House': {'Alice': 0.51, 'Bob': 0.51}})
+
+
+def test_configure_ledger(monkeypatch):
+    monkeypatch.setattr(ledger, 'ALLOCATION_TOLERANCE', ledger.ALLOCATION_TOLERANCE)
+    configure_ledger(0.1)
+    assert AllocationLedger().tolerance == 0.1
+    configure_ledger(None)
+    assert AllocationLedger().tolerance == 0.1
+
+
+def test_grows_past_its_initial_size():
+    book = AllocationLedger()
+    for k in range(20):
+        assert book.allocate({f'asset {k}': {f'party {k}': 1.0, f'party {k + 1}': 0.0}})
+    assert len(book) == 20
+    assert book.fully_allocated() == {f'asset {k}' for k in range(20)}
+    assert book.division()['asset 19'] == {'beneficiaries': {'party 19': {'share': 1.0}, 'party 20': {'share': 0.0}}}
+
+
+def test_registered_asset_keeps_its_details():
+    book = AllocationLedger()
+    book.add_asset({'name': 'House', 'type': 'Property'})
+    assert 'House' in book and not book.is_full('House')
+    assert book.allocate({'House': {'Alice': 1.0}})
+    assert book.details['House'] == {'name': 'House', 'type': 'Property'}
+    assert book.allocation('Car') == 0.0
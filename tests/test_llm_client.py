@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+import llm_client
+from llm_backend import OpenAIBackend
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """The clients built by the shared client's factory."""
+    clients = []
+
+    def factory(**kwargs):
+        clients.append(FakeClient(**kwargs))
+        return clients[-1]
+
+    llm_client.set_factory(factory)
+    yield clients
+    llm_client.set_factory(None)
+
+
+def test_client_is_reused(built):
+    first = llm_client.get_client(api_key='key')
+    assert llm_client.get_client() is first and OpenAIBackend().client is first
+    assert len(built) == 1 and first.kwargs == {'api_key': 'key', 'base_url': None}
+
+
+def test_one_client_across_threads(built):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(llm_client.get_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and all(client is built[0] for client in clients)
+
+
+def test_reset_closes_and_rebuilds(built, monkeypatch):
+    first = llm_client.get_client()
+    llm_client.reset_client()
+    assert first.closed
+    assert llm_client.get_client() is not first and len(built) == 2
+    monkeypatch.setattr(llm_client, 'MAX_CONNECTIONS', llm_client.MAX_CONNECTIONS)
+    monkeypatch.setattr(llm_client, 'MAX_KEEPALIVE_CONNECTIONS', llm_client.MAX_KEEPALIVE_CONNECTIONS)
+    llm_client.configure(max_connections=4)
+    assert built[1].closed and llm_client.MAX_KEEPALIVE_CONNECTIONS == 4
+    assert llm_client.get_client() is built[2]
+
+
+def test_injected_client(built):
+    client = FakeClient()
+    llm_client.set_client(client)
+    assert llm_client.get_client() is client and not built
+    assert OpenAIBackend(client=FakeClient()).client is not client
+
@@ -0,0 +1,100 @@
+import gc
+import weakref
+
+import pytest
+
+import merkle
+from merkle import (MerkleTree, leaf_hash, verify_proof, will_checksum, will_tree, update_directive,
+                    update_testator, verify_directive)
+from will_format import save_will_model, load_will_model
+from conftest import make_will
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 8])
+def test_proofs(n):
+    tree = MerkleTree([leaf_hash(k) for k in range(n)])
+    for k in range(n):
+        assert verify_proof(leaf_hash(k), tree.proof(k), tree.root)
+    assert not verify_proof(leaf_hash(n), tree.proof(0), tree.root)
+
+
+@pytest.mark.parametrize("n", [2, 3, 7])
+def test_update_equals_rebuild(n):
+    leaves = [leaf_hash(k) for k in range(n)]
+    tree = MerkleTree(leaves)
+    tree.update(n - 1, leaf_hash('edited'))
+    assert tree.root == MerkleTree(leaves[:-1] + [leaf_hash('edited')]).root
+
+
+def test_checksum_is_stable(will):
+    assert will_checksum(will) == will.checksum
+    assert make_will().checksum == will.checksum
+    assert will_checksum(will) == will_checksum(will)
+
+
+def test_checksum_ignores_compiled_rules(will):
+    will._directives[0].compiled_rule = 'rule'
+    assert will_checksum(will) == will.checksum
+
+
+def test_checksum_changes_with_content(will):
+    will._directives[1]._assets[0].name = 'asset 9'
+    assert will_checksum(will) != will.checksum
+
+
+def test_update_directive(will):
+    will._directives[2].conditions[0]._condition = '70%'
+    checksum = update_directive(will, 2)
+    assert checksum == will.checksum == will_checksum(will)
+
+
+def test_update_testator(will):
+    will._testator.name = 'Person-2'
+    assert update_testator(will) == will_checksum(will)
+
+
+def test_verify_directive(will):
+    assert all(verify_directive(will, k) for k in range(3))
+    will._directives[1].conditions[1]._condition = '50%'
+    assert not verify_directive(will, 1)
+    assert verify_directive(will, 0)
+
+
+def test_tree_cached_per_will(will):
+    other = make_will()
+    assert will_tree(will) is will_tree(will)
+    assert will_tree(will) is not will_tree(other)
+
+
+def test_tree_dropped_with_will():
+    will = make_will()
+    will_tree(will)
+    key, ref = id(will), weakref.ref(will)
+    del will
+    gc.collect()
+    assert ref() is None
+    assert key not in merkle._trees
+
+
+def test_rebuild_keeps_one_weakref(will):
+    for _ in range(20):
+        will_checksum(will)
+    assert weakref.getweakrefcount(will) == 1
+
+
+@pytest.mark.parametrize("j", [0, 2, 4])
+def test_verify_loaded_directive(j, tmp_path, monkeypatch):
+    path = tmp_path / 'will.obj'
+    save_will_model(make_will(5), path)
+    will = load_will_model(path)
+    will._directives[j].conditions[0]._condition = '70%'
+
+    hashed = []
+    directive_hash = merkle.directive_hash
+    monkeypatch.setattr(merkle, 'directive_hash', lambda directive: hashed.append(directive) or directive_hash(directive))
+    assert [verify_directive(will, k) for k in range(5)] == [k != j for k in range(5)]
+    # each check hashed its own directive only, against the tree kept in the file
+    assert hashed == will._directives
+
+    assert update_directive(will, j) == will_checksum(will)
+    assert all(verify_directive(will, k) for k in range(5))
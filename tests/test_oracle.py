@@ -0,0 +1,76 @@
+import os
+import re
+
+import pytest
+
+from ORACLES.oracle import Oracle, PATTERN_CLEAN_NAME
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+
+# duplicate ids and full names, names that clean to the same key, a child missing from the database
+PEOPLE = [
+    {'id': 1, 'full_name': 'Mary-Ann Smith', 'alive': 'false', 'children_ids': [2, 3, 9]},
+    {'id': 2, 'full_name': "John O'Neil", 'alive': 'true', 'children_ids': []},
+    {'id': 3, 'full_name': 'MaryAnn Smith', 'alive': 'true', 'children_ids': [2]},
+    {'id': 2, 'full_name': 'Second Two', 'alive': 'true'},
+    {'id': 4, 'full_name': "John O'Neil", 'alive': 'false', 'children_ids': [3]},
+]
+
+
+# the linear scans devolve_will.py used before the Oracle indexes
+def scan_id(people, person_id):
+    return next((p for p in people if p['id'] == person_id), None)
+
+
+def scan_full_name(people, full_name):
+    return next((p for p in people if p['full_name'] == full_name), None)
+
+
+def scan_clean_name(people, name, strip_hyphens=True):
+    if strip_hyphens:
+        people_dict = {re.sub(PATTERN_CLEAN_NAME, '', p['full_name']).replace('-', ''): p for p in people}
+        return people_dict.get(re.sub(PATTERN_CLEAN_NAME, '', name).replace('-', ''))
+    people_dict = {re.sub(PATTERN_CLEAN_NAME, '', p['full_name']): p for p in people}
+    return people_dict.get(re.sub(PATTERN_CLEAN_NAME, '', name))
+
+
+def scan_children(people, person):
+    return [child for c_id in person.get('children_ids', []) for child in [scan_id(people, c_id)] if child]
+
+
+def scan_parents(people, person):
+    return [p for p in people if person['id'] in p.get('children_ids', [])]
+
+
+@pytest.fixture(params=['synthetic', 'test3'])
+def people(request):
+    if request.param == 'synthetic':
+        return PEOPLE
+    return Oracle.load(PEOPLE_DB).people
+
+
+def test_lookups_match_the_linear_scans(people):
+    oracle = Oracle({'people': people})
+    names = [p['full_name'] for p in people] + ['Mary Ann Smith', 'John ONeil', 'Nobody']
+    for person_id in [p['id'] for p in people] + [99]:
+        assert oracle.get(person_id) is scan_id(people, person_id)
+    for name in names:
+        assert oracle.by_name(name) is scan_full_name(people, name)
+        assert oracle.match_name(name) is scan_clean_name(people, name)
+        assert oracle.match_name(name, strip_hyphens=False) is scan_clean_name(people, name, strip_hyphens=False)
+    for person in people:
+        assert oracle.children(person) == scan_children(people, person)
+        assert oracle.parents(person) == scan_parents(people, person)
+
+
+def test_first_and_last_entries_win():
+    oracle = Oracle({'people': PEOPLE})
+    assert oracle.get(2)['full_name'] == "John O'Neil"
+    assert oracle.by_name("John O'Neil")['id'] == 2
+    assert oracle.match_name('Mary-Ann Smith')['id'] == 3
+    assert oracle.match_name('Mary-Ann Smith', strip_hyphens=False)['id'] == 3
+
+
+def test_raw_people_list():
+    oracle = Oracle({'people': PEOPLE})
+    assert oracle['people'] is PEOPLE and len(oracle) == 5
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+import pipeline
+from pipeline import run_pipeline, save_outputs, STAGES
+from will_format import load_will_model
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def read(*path):
+    with open(os.path.join(*path), 'r') as f:
+        return f.read()
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """Stub backend without the response cache; run_pipeline() exports the
+    backend choice to the environment, restored after the test."""
+    import gpt_req
+    import llm_backend
+    monkeypatch.setenv('DASS_LLM_BACKEND', os.environ.get('DASS_LLM_BACKEND', 'openai'))
+    monkeypatch.setattr(pipeline, '_applied_config', None)
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    yield {'llm_backend': 'stub', 'no_cache': True}
+    llm_backend.set_backend(None)
+
+
+@pytest.mark.parametrize("test_folder", ['test1', 'test2', 'test3'])
+def test_run_pipeline_in_process(config, test_folder):
+    result = run_pipeline(read(TESTS_DIR, test_folder, 'will.txt'),
+                          os.path.join(TESTS_DIR, test_folder, 'people_db.json'), config)
+    assert set(result['timings']) == set(STAGES)
+    ground_truth = json.loads(read(TESTS_DIR, test_folder, 'ground_truth.json'))
+    for asset, expected in ground_truth.items():
+        beneficiaries = result['devolution'][asset]['beneficiaries']
+        assert {person: details['share'] for person, details in beneficiaries.items()} == expected['beneficiares']
+    assert len(result['record']['directives']) == len(result['will_model']._directives)
+
+
+def test_save_outputs(config, tmp_path):
+    will_file = os.path.join(TESTS_DIR, 'test1', 'will.txt')
+    result = run_pipeline(read(will_file), os.path.join(TESTS_DIR, 'test1', 'people_db.json'), config)
+    devolution_path = save_outputs(result, will_file, str(tmp_path))
+    assert devolution_path == str(tmp_path / 'will.devolution.json')
+    assert sorted(os.listdir(tmp_path)) == ['will.devolution.deps.json', 'will.devolution.json', 'will.json', 'will.obj']
+    assert json.loads(read(devolution_path)) == json.loads(json.dumps(result['devolution']))
+    assert load_will_model(str(tmp_path / 'will.obj')) == result['will_model']
+
+
+def run_batch_driver(batch, output_path):
+    """Run src/driver.py --batch on the stub backend with tests/test1's people database."""
+    driver = os.path.abspath(os.path.join(TESTS_DIR, '..', 'src', 'driver.py'))
+    return subprocess.run(['python3', driver, '--batch', str(batch), '-o', str(output_path), '-b', 'stub',
+                           '-d', os.path.join(TESTS_DIR, 'test1', 'people_db.json')],
+                          capture_output=True, text=True, cwd=TESTS_DIR)
+
+
+def test_batch_mode(tmp_path):
+    wills = tmp_path / 'wills'
+    wills.mkdir()
+    (wills / 'shares.txt').write_text(read(TESTS_DIR, 'test1', 'will.txt'))
+    # a testator the people's database does not know fails their will, not the batch
+    (wills / 'stranger.txt').write_text(read(TESTS_DIR, 'test1', 'will.txt').replace('Person-1', 'Person-99'))
+    output = tmp_path / 'output'
+
+    process = run_batch_driver(wills, output)
+    assert process.returncode == 1, process.stdout + process.stderr
+    completed = json.loads(read(output, 'shares' + pipeline.STATUS_SUFFIX))
+    failed = json.loads(read(output, 'stranger' + pipeline.STATUS_SUFFIX))
+    assert completed['status'] == 'completed' and completed['error'] is None
+    assert set(completed['timings']) == set(STAGES)
+    assert failed['status'] == 'failed' and failed['error']
+    assert (output / 'shares.devolution.json').exists() and not (output / 'stranger.devolution.json').exists()
+    summary = json.loads(read(output, pipeline.BATCH_SUMMARY))
+    assert {key: summary[key] for key in ['wills', 'completed', 'skipped', 'failed']} == {
+        'wills': 2, 'completed': 1, 'skipped': 0, 'failed': 1}
+    assert list(summary['failures']) == ['stranger']
+    assert summary['stages']['devolution']['count'] == 1
+
+    # a second run skips the completed will and retries the failed one
+    process = run_batch_driver(wills, output)
+    summary = json.loads(read(output, pipeline.BATCH_SUMMARY))
+    assert {key: summary[key] for key in ['wills', 'completed', 'skipped', 'failed']} == {
+        'wills': 2, 'completed': 0, 'skipped': 1, 'failed': 1}
+
+
+def test_batch_inputs(tmp_path):
+    for folder in ['a', 'b']:
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'will.txt').write_text('')
+    (tmp_path / 'notes.md').write_text('')
+    inputs = pipeline.list_batch_inputs(str(tmp_path))
+    assert inputs == [str(tmp_path / 'a' / 'will.txt'), str(tmp_path / 'b' / 'will.txt')]
+    assert pipeline.batch_names(inputs) == ['a__will', 'b__will']
+    (tmp_path / 'manifest').write_text("# wills\nb/will.txt\n\na/will.txt  # first\n")
+    assert pipeline.list_batch_inputs(str(tmp_path / 'manifest')) == inputs[::-1]
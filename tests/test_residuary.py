@@ -0,0 +1,52 @@
+import pytest
+
+from residuary import classify_residuary, is_residuary, residuary_noun, CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "all the rest, residue and remainder of my estate",
+    "All my property, real, personal and mixed.",
+    "all my property of whatever kind and wherever situated",
+    "everything I own",
+    "the rest",
+    "my entire estate",
+    "residuary estate",
+])
+def test_residuary(text):
+    decision = classify_residuary(text)
+    assert decision.is_all and decision.confidence >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "my house",
+    "my 2015 Toyota",
+    "rest of my estate located in Tucson",
+    "all my property in Tucson",
+])
+def test_specific(text):
+    decision = classify_residuary(text)
+    assert not decision.is_all and decision.confidence >= CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "all my tangible personal property",
+    "all my jewelry",
+])
+def test_uncertain_goes_to_the_llm(text):
+    asked = []
+    answer, path = is_residuary(text, lambda t: asked.append(t) or True)
+    assert (answer, path, asked) == (True, 'llm', [text])
+
+
+def test_decided_locally():
+    answer, path = is_residuary("my house", lambda t: pytest.fail("asked the LLM"))
+    assert (answer, path) == (False, 'lexical')
+
+
+@pytest.mark.parametrize("text, noun", [
+    ("all the rest, residue and remainder of my estate", 'estate'),
+    ("all my property, real, personal and mixed", 'property'),
+    ("my house", None),
+])
+def test_residuary_noun(text, noun):
+    assert residuary_noun(text) == noun
@@ -0,0 +1,109 @@
+import pydantic
+import pytest
+
+import gpt_req
+from gpt_req import (RuleDecision, StirpesDecision, EqualDecision, ProportionDecision, UnaliveDecision, StateDecision,
+                     AgeDecision, process_decision, query_decision_multiple_times, process_rule)
+from llm_backend import StubBackend, set_backend
+
+HOUSE_60 = {'person_name': 'Alice', 'asset_name': 'My House', 'share': 60.0}
+HOUSE_40 = {'person_name': 'Bob', 'asset_name': 'My House', 'share': 40.0}
+
+
+class DecisionStub(StubBackend):
+    """The stub backend answering rule decisions with given decisions, one per sample."""
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+
+    def _parse_RuleDecision(self, prompt):
+        raise AssertionError("answered by parse()")
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        if response_format is not RuleDecision:
+            return super().parse(messages, response_format, model, sample, **params)
+        return RuleDecision.model_validate({'decision': self.decisions[sample]})
+
+
+@pytest.fixture(autouse=True)
+def rules(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', False)
+    monkeypatch.setattr(gpt_req, 'LOGPROB_RULE_IDS', False)
+    monkeypatch.setattr(gpt_req, 'VOTE_STATS', [])
+    yield
+    set_backend(None)
+
+
+@pytest.mark.parametrize("decision, variant", [
+    ({'rule_id': 0}, StirpesDecision),
+    ({'rule_id': 1}, EqualDecision),
+    ({'rule_id': 3, 'division': [HOUSE_60, HOUSE_40]}, ProportionDecision),
+    ({'rule_id': 5, 'unalive_people': ['Bob'], 'division_rule_id': 1, 'division': []}, UnaliveDecision),
+    ({'rule_id': 6, 'division': [HOUSE_60]}, StateDecision),
+    ({'rule_id': 11, 'age_reqs': [{'person_name': 'Alice', 'minimum_age': 18}], 'division_rule_id': 3,
+      'division': [HOUSE_60]}, AgeDecision),
+])
+def test_variants(decision, variant):
+    assert type(RuleDecision.model_validate({'decision': decision}).decision) is variant
+
+
+@pytest.mark.parametrize("decision", [
+    {'rule_id': 2},
+    {'rule_id': '3'},
+    {'rule_id': 3},
+    {'rule_id': 5, 'unalive_people': ['Bob'], 'division_rule_id': 5, 'division': []},
+    {'rule_id': 11, 'division_rule_id': 1, 'division': []},
+    {'rule_id': 6, 'division': [{'person_name': 'Alice', 'asset_name': 'My House'}]},
+])
+def test_rejected(decision):
+    with pytest.raises(pydantic.ValidationError):
+        RuleDecision.model_validate({'decision': decision})
+
+
+@pytest.mark.parametrize("decision, ids, evals", [
+    ({'rule_id': 0}, [0], []),
+    ({'rule_id': 3, 'division': [HOUSE_60, HOUSE_40]}, [3], [('Alice', 'My House', 60.0), ('Bob', 'My House', 40.0)]),
+    ({'rule_id': 5, 'unalive_people': ['Bob'], 'division_rule_id': 1, 'division': [HOUSE_60]}, [5, 1], ([], ['Bob'])),
+    ({'rule_id': 11, 'age_reqs': [{'person_name': 'Alice', 'minimum_age': 18}], 'division_rule_id': 3,
+      'division': [HOUSE_60]}, [11, 3], ([('Alice', 'My House', 60.0)], [('Alice', 18)])),
+])
+def test_process_decision(decision, ids, evals):
+    assert process_decision(RuleDecision.model_validate({'decision': decision})) == (ids, evals)
+
+
+def test_parsed_shares_replace_the_division():
+    query_ans = RuleDecision.model_validate({'decision': {'rule_id': 3, 'division': [HOUSE_60]}})
+    assert process_decision(query_ans, [('Alice', 'My House', 0.5), ('Bob', 'My House', 0.5)]) == (
+        [3], [('Alice', 'My House', 50.0), ('Bob', 'My House', 50.0)])
+
+
+def test_vote_on_rule_then_items():
+    proportion = {'rule_id': 3, 'division': [HOUSE_60, HOUSE_40]}
+    set_backend(DecisionStub([{'rule_id': 3, 'division': []}, {'rule_id': 1}, {'rule_id': 3, 'division': []},
+                              proportion, {'rule_id': 1}]))
+    # rule 3 wins 3 to 2; of its samples, the one carrying a division is preferred
+    query_ans = query_decision_multiple_times("prompt", 'model', n=5)
+    assert query_ans.decision == ProportionDecision.model_validate(proportion)
+    assert gpt_req.VOTE_STATS == [{'decision': 'RuleDecision', 'samples': 5, 'budget': 5}]
+
+
+def test_division_sub_rule_is_part_of_the_vote():
+    unalive = {'rule_id': 5, 'unalive_people': ['Bob'], 'division': []}
+    set_backend(DecisionStub([dict(unalive, division_rule_id=1), dict(unalive, division_rule_id=3, division=[HOUSE_60]),
+                              dict(unalive, division_rule_id=3, division=[HOUSE_60])]))
+    assert process_decision(query_decision_multiple_times("prompt", 'model', n=3)) == (
+        [5, 3], ([('Alice', 'My House', 60.0)], ['Bob']))
+
+
+def test_one_round_on_the_stub_backend(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'RULE_FAST_PATH', False)
+    monkeypatch.setattr(gpt_req, 'COMBINED_RULE_QUERY', True)
+    set_backend(StubBackend())
+    directive = ("Bequest asset/s 'My House' to 'Alice and Bob' with following conditions: 60% and 40%. "
+                 "The name of executor is Carol.")
+    trace = {}
+    ids, evals, rule_text = process_rule(directive, [{'name': 'My House', 'type': 'Property'}], 'Dan',
+                                         ['Alice', 'Bob'], [], 'model', trace=trace)
+    assert ids == [3] and evals == [('Alice', 'My House', 60.0), ('Bob', 'My House', 40.0)]
+    assert [vote['decision'] for vote in trace['votes']] == ['RuleDecision']
@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+import gpt_req
+from gpt_req import RuleID, RULE_IDS, rule_id_probabilities, confident_rule_id, query_id_multiple_times
+from llm_backend import StubBackend, set_backend
+
+PROMPT = "Directive: Bequest asset/s 'My House' to 'Alice and Bob' with following conditions: per stirpes. "
+
+
+class LogprobStub(StubBackend):
+    """The stub backend with given rule id probabilities (None: the
+    logprobs request fails) and counting its rule id votes."""
+
+    def __init__(self, probabilities=None, fail=False):
+        self.probabilities = probabilities
+        self.fail = fail
+        self.votes = 0
+        self.classified = 0
+
+    def classify(self, messages, choices, model, sample=0, **params):
+        self.classified += 1
+        if self.fail:
+            raise ConnectionError("no logprobs")
+        if self.probabilities is None:
+            return super().classify(messages, choices, model, sample, **params)
+        return {choice: math.log(self.probabilities.get(choice, 1e-6)) for choice in choices}
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        if response_format is RuleID:
+            self.votes += 1
+        return super().parse(messages, response_format, model, sample, **params)
+
+
+@pytest.fixture(autouse=True)
+def logprobs(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', False)
+    monkeypatch.setattr(gpt_req, 'LOGPROB_RULE_IDS', True)
+    monkeypatch.setattr(gpt_req, 'RULE_ID_MARGIN', 0.5)
+    monkeypatch.setattr(gpt_req, 'VOTE_STATS', [])
+    monkeypatch.setattr(gpt_req, 'LOGPROB_STATS', [])
+    yield
+    set_backend(None)
+
+
+def test_probabilities_of_the_stub():
+    set_backend(StubBackend())
+    probabilities = rule_id_probabilities(PROMPT, RULE_IDS, 'model')
+    assert set(probabilities) == {0, 1, 3, 5, 6, 11}
+    assert probabilities[0] == pytest.approx(0.9) and sum(probabilities.values()) == pytest.approx(1.0)
+
+
+def test_confident_classification_skips_the_vote():
+    backend = LogprobStub()
+    set_backend(backend)
+    trace = {}
+    assert query_id_multiple_times(PROMPT, 'model', trace=trace) == 0
+    assert backend.classified == 1 and backend.votes == 0
+    assert trace['confidence'] == [{'decision': 'RuleID', 'rule_id': 0, 'margin': 0.88, 'voted': False}]
+    assert gpt_req.VOTE_STATS == [{'decision': 'RuleID', 'samples': 1, 'budget': 10}]
+
+
+def test_unsure_classification_falls_back_to_voting():
+    backend = LogprobStub({'1': 0.5, '3': 0.4})
+    set_backend(backend)
+    trace = {}
+    # the vote (stub keywords: per stirpes) overrides the most likely id
+    assert query_id_multiple_times(PROMPT, 'model', trace=trace) == 0
+    assert backend.votes == 10
+    assert trace['confidence'][0]['rule_id'] == 1 and trace['confidence'][0]['voted']
+
+
+def test_failed_classification_falls_back_to_voting():
+    backend = LogprobStub(fail=True)
+    set_backend(backend)
+    assert confident_rule_id(PROMPT, RULE_IDS, 'model') is None
+    assert query_id_multiple_times(PROMPT, 'model') == 0 and backend.votes == 10
+    assert gpt_req.LOGPROB_STATS[0] == {'decision': 'RuleID', 'rule_id': None, 'margin': 0.0, 'voted': True}
+
+
+def test_margin(monkeypatch):
+    set_backend(LogprobStub({'3': 0.6, '1': 0.3}))
+    assert confident_rule_id(PROMPT, RULE_IDS, 'model') is None
+    monkeypatch.setattr(gpt_req, 'RULE_ID_MARGIN', 0.25)
+    assert confident_rule_id(PROMPT, RULE_IDS, 'model') == 3
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'LOGPROB_RULE_IDS', False)
+    backend = LogprobStub()
+    set_backend(backend)
+    assert query_id_multiple_times(PROMPT, 'model') == 0
+    assert backend.classified == 0 and backend.votes == 10
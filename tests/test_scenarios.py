@@ -0,0 +1,81 @@
+import copy
+import os
+
+import pytest
+
+from ORACLES.oracle import Oracle, OverlayOracle
+from devolve_will import devolve
+from scenarios import scenario_matrix, scenario_name, alive_flag, load_scenarios, scenario_overrides, run_scenarios
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+
+
+@pytest.fixture
+def db():
+    return Oracle.load(PEOPLE_DB)
+
+
+@pytest.mark.parametrize("value, flag", [
+    (True, 'true'), (False, 'false'), ('True', 'true'), (' false ', 'false'), (1, 'true'), (0, 'false'),
+])
+def test_alive_flag(value, flag):
+    assert alive_flag(value) == flag
+
+
+def test_scenario_matrix():
+    scenarios = scenario_matrix({'alive': {'Person-2': [True, False]}, 'age': {'Person-3': [17, 25]}})
+    assert [scenario['name'] for scenario in scenarios] == [
+        'Person-2 alive, Person-3 age 17', 'Person-2 alive, Person-3 age 25',
+        'Person-2 not alive, Person-3 age 17', 'Person-2 not alive, Person-3 age 25']
+    assert scenarios[3]['alive'] == {'Person-2': False} and scenarios[3]['age'] == {'Person-3': 25}
+
+
+def test_load_scenarios():
+    scenarios = load_scenarios([{'name': 'spouse predeceases', 'alive': {'Person-2': False}},
+                                {'age': {'Person-3': 17}}])
+    assert [scenario['name'] for scenario in scenarios] == ['spouse predeceases', 'Person-3 age 17']
+    assert len(load_scenarios({'alive': {'Person-2': [True, False]}})) == 2
+    assert scenario_name({}) == 'baseline'
+
+
+def test_scenario_overrides(db):
+    scenario = {'name': 'what if', 'alive': {'Person-2': True, 'Person-3': 'false'}, 'age': {'Person-3': '17'}}
+    assert scenario_overrides(scenario, db) == {2: {'alive': 'true'}, 3: {'alive': 'false', 'age': 17}}
+
+
+def test_unknown_person_or_field(db):
+    with pytest.raises(ValueError, match="'Nobody', who is not in the people's database"):
+        scenario_overrides({'name': 'what if', 'alive': {'Nobody': False}}, db)
+    with pytest.raises(ValueError, match="unsupported field\\(s\\): assets"):
+        scenario_overrides({'name': 'what if', 'assets': {}}, db)
+
+
+def test_overlay_leaves_the_oracle_alone(db):
+    overlay = OverlayOracle(db, {2: {'alive': 'true', 'age': 70}})
+    assert overlay.get(2)['alive'] == 'true' and overlay.by_name('Person-2')['age'] == 70
+    assert db.get(2)['alive'] == 'false' and db.get(2)['age'] == 19
+    assert overlay.get(3) is db.get(3)
+    assert [person['alive'] for person in overlay['people']][:2] == ['false', 'true']
+
+
+def shares(division):
+    return {asset: {person: details['share'] for person, details in info['beneficiaries'].items()}
+            for asset, info in division.items()}
+
+
+def test_run_scenarios(family_will, test3_db):
+    scenarios = load_scenarios([{'name': 'p3 dead', 'alive': {'Person-3': False}}, {'age': {'Person-5': 12}}])
+    results = run_scenarios(copy.deepcopy(family_will), test3_db, scenarios, 'stub')
+    assert [result['name'] for result in results] == ['baseline', 'p3 dead', 'Person-5 age 12']
+
+    baseline, p3_dead, minor = [shares(result['division']) for result in results]
+    assert baseline['Savings Account'] == {'Person-3': 0.5, 'Person-4': 0.25, 'Person-5': 0.25}
+    assert p3_dead['Savings Account'] == {'Person-4': 0.25, 'Person-5': 0.25}
+    assert p3_dead['My House'] == {'Person-4': 0.6}
+    assert minor['Toyota Camry'] == {'Person-5 (through custodian)': 1.0}
+    assert minor['My House'] == baseline['My House']
+    # every scenario divides the assets as a full devolution against its overlay does
+    for scenario, result in zip(scenarios, results[1:]):
+        overlay = OverlayOracle(test3_db, scenario_overrides(scenario, test3_db))
+        assert shares(result['division']) == shares(devolve(copy.deepcopy(family_will), overlay, 'stub'))
+    assert test3_db.get(3)['alive'] == 'true'
@@ -0,0 +1,114 @@
+from fractions import Fraction
+
+import pytest
+
+from shares import find_shares, parse_share, bind_shares, directive_shares, words_to_number
+
+ASSETS = [{'name': 'House'}]
+BENEFICIARIES = ['Alice Smith', 'Bob Smith']
+
+
+class Condition:
+    def __init__(self, text):
+        self._condition = text
+
+
+class Directive:
+    def __init__(self, *conditions):
+        self.conditions = [Condition(text) for text in conditions]
+
+
+@pytest.mark.parametrize("text, number", [
+    ("twenty-five", 25),
+    ("one hundred", 100),
+    ("one hundred and five", 105),
+    ("sixty", 60),
+    ("lots", None),
+])
+def test_words_to_number(text, number):
+    assert words_to_number(text) == number
+
+
+@pytest.mark.parametrize("text, share", [
+    ("60%", Fraction(3, 5)),
+    ("five (5) percent", Fraction(1, 20)),
+    ("twenty-five per cent (25%)", Fraction(1, 4)),
+    ("one hundred and five percent", Fraction(21, 20)),
+    ("12.5%", Fraction(1, 8)),
+    ("1/6", Fraction(1, 6)),
+    ("one half", Fraction(1, 2)),
+    ("two-thirds", Fraction(2, 3)),
+    ("a one-third interest", Fraction(1, 3)),
+    ("one-half (1/2)", Fraction(1, 2)),
+    ("one and one-half", Fraction(3, 2)),
+    ("one and a half percent", Fraction(3, 200)),
+    ("one and one-half percent", Fraction(3, 200)),
+    ("1 1/2%", Fraction(3, 200)),
+    ("1/2%", Fraction(1, 200)),
+    ("1/2 percent", Fraction(1, 200)),
+    ("one-half percent", Fraction(1, 200)),
+])
+def test_parse_share(text, share):
+    assert parse_share(text) == share
+
+
+def test_contradicting_duplicates():
+    assert find_shares("five (6) percent") == [(0, 16, None)]
+    assert find_shares("one-half (1/3)") == [(0, 14, None)]
+
+
+def test_ordinal_is_not_a_share():
+    assert find_shares("the third house") == []
+
+
+def test_shares_in_order():
+    assert find_shares("60% to A and 40% to B") == [(0, 3, Fraction(3, 5)), (13, 16, Fraction(2, 5))]
+
+
+def test_bind_shares():
+    text = "60% to Alice Smith and 40% to Bob Smith"
+    assert bind_shares(text, find_shares(text), BENEFICIARIES) == [
+        ('Alice Smith', Fraction(3, 5)), ('Bob Smith', Fraction(2, 5))]
+    text = "Alice Smith shall receive 60%"
+    assert bind_shares(text, find_shares(text), BENEFICIARIES) == [('Alice Smith', Fraction(3, 5))]
+
+
+def test_bind_unnamed_shares_in_order():
+    text = "60% and 40%"
+    assert bind_shares(text, find_shares(text), BENEFICIARIES) == [
+        ('Alice Smith', Fraction(3, 5)), ('Bob Smith', Fraction(2, 5))]
+
+
+def test_bind_ambiguous_shares():
+    text = "60% to Alice Smith and Bob Smith"
+    assert bind_shares(text, find_shares(text), BENEFICIARIES) is None
+
+
+def test_directive_shares():
+    directive = Directive("60% to Alice Smith", "40% to Bob Smith")
+    assert directive_shares(directive, BENEFICIARIES, ASSETS) == [
+        ('Alice Smith', 'House', Fraction(3, 5)), ('Bob Smith', 'House', Fraction(2, 5))]
+
+
+def test_directive_bare_shares_in_order():
+    directive = Directive("60%", "40%")
+    assert directive_shares(directive, BENEFICIARIES, ASSETS) == [
+        ('Alice Smith', 'House', Fraction(3, 5)), ('Bob Smith', 'House', Fraction(2, 5))]
+
+
+def test_directive_mixed_number_percent():
+    directive = Directive("one and one-half percent to Alice Smith")
+    assert directive_shares(directive, BENEFICIARIES, ASSETS) == [('Alice Smith', 'House', Fraction(3, 200))]
+
+
+@pytest.mark.parametrize("conditions", [
+    ("to Alice Smith, provided that she pays 10% of the mortgage",),
+    ("60% to Alice Smith if she survives me",),
+    ("60% and 40%",),
+    ("60%", "40% of the mortgage"),
+    ("70% to Alice Smith", "40% to Bob Smith"),
+    ("in equal shares",),
+    (),
+])
+def test_directive_shares_left_to_the_llm(conditions):
+    assert directive_shares(Directive(*conditions), BENEFICIARIES, ASSETS) is None
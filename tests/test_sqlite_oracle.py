@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from ORACLES.oracle import Oracle
+from ORACLES.sqlite_oracle import SQLiteOracle, import_json, export_json, is_sqlite_path, open_oracle
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+
+
+def entry(person):
+    """A people_db.json entry as the SQLite store returns it."""
+    return dict(person, assets=person.get('assets', []), children_ids=person.get('children_ids', []))
+
+
+@pytest.fixture
+def stores(tmp_path):
+    store = import_json(PEOPLE_DB, str(tmp_path / 'people.sqlite'))
+    yield Oracle.load(PEOPLE_DB), store
+    store.close()
+
+
+def test_is_sqlite_path():
+    assert is_sqlite_path('people.db') and is_sqlite_path('people.SQLITE')
+    assert not is_sqlite_path('people_db.json')
+
+
+def test_same_lookups_as_the_json_oracle(stores):
+    oracle, store = stores
+    assert len(store) == len(oracle)
+    for person in oracle.people:
+        assert store.get(person['id']) == entry(person)
+        assert store.by_name(person['full_name']) == entry(oracle.by_name(person['full_name']))
+        assert store.match_name(person['full_name']) == entry(oracle.match_name(person['full_name']))
+        assert store.children(person) == [entry(child) for child in oracle.children(person)]
+        assert store.parents(person) == [entry(parent) for parent in oracle.parents(person)]
+    assert store.get(-1) is None and store.match_name('Nobody') is None
+
+
+def test_put_person_replaces_the_cached_entry(stores):
+    _, store = stores
+    person = dict(store.get(2), alive='false', age=99)
+    store.put_person(person)
+    assert store.get(2)['alive'] == 'false' and store.get(2)['age'] == 99
+    assert store.next_id() == max(p['id'] for p in store.people) + 1
+
+
+def test_export_round_trip(stores, tmp_path):
+    oracle, store = stores
+    path = tmp_path / 'people.json'
+    export_json(store.path, str(path))
+    with open(path) as f:
+        exported = json.load(f)['people']
+    assert exported == [entry(person) for person in oracle.people]
+
+
+def test_open_oracle(stores):
+    _, store = stores
+    assert isinstance(open_oracle(PEOPLE_DB), Oracle)
+    opened = open_oracle(store.path)
+    assert isinstance(opened, SQLiteOracle) and len(opened) == len(store)
+    opened.close()
@@ -0,0 +1,107 @@
+import gc
+import os
+import weakref
+from fractions import Fraction
+
+import pytest
+
+from ORACLES.oracle import Oracle, OverlayOracle
+from ORACLES.sqlite_oracle import import_json
+import stirpes
+from stirpes import StirpesCycleError, engine_for
+
+PEOPLE_DB = os.path.join(os.path.dirname(__file__), 'test3', 'people_db.json')
+
+
+def person(person_id, name, alive, children_ids=()):
+    return {'id': person_id, 'full_name': name, 'alive': alive, 'children_ids': list(children_ids)}
+
+
+def family():
+    """Grandparent 1 (deceased) with children 2 (alive) and 3 (deceased),
+    whose children are 4 and 5; 6 is listed but not in the database."""
+    return Oracle({'people': [
+        person(1, 'Grandparent', 'false', [2, 3]),
+        person(2, 'Alice', 'true'),
+        person(3, 'Bob', 'false', [4, 5, 6]),
+        person(4, 'Carol', 'true'),
+        person(5, 'Dave', 'true'),
+    ]})
+
+
+def test_share_vector():
+    db = family()
+    assert engine_for(db).share_vector(db.get(1)) == {
+        'Alice': Fraction(1, 2), 'Carol': Fraction(1, 6), 'Dave': Fraction(1, 6)}
+
+
+def test_share_vector_without_descendants():
+    db = family()
+    assert engine_for(db).share_vector(db.get(4)) == {}
+
+
+def test_distribute():
+    db = family()
+    assert engine_for(db).distribute(db.get(3), Fraction(1, 2), ['House', 'Car']) == {
+        'House': {'Carol': Fraction(1, 6), 'Dave': Fraction(1, 6)},
+        'Car': {'Carol': Fraction(1, 6), 'Dave': Fraction(1, 6)},
+    }
+
+
+def test_memoized_per_oracle():
+    db = family()
+    engine = engine_for(db)
+    assert engine_for(db) is engine
+    assert engine.share_vector(db.get(1)) is engine.share_vector(db.get(1))
+
+
+def test_overlay_gets_its_own_memo():
+    db = family()
+    base = engine_for(db).share_vector(db.get(1))
+    overlay = OverlayOracle(db, {4: {'alive': 'false'}})
+    assert engine_for(overlay) is not engine_for(db)
+    assert engine_for(overlay).share_vector(overlay.get(1)) == {'Alice': Fraction(1, 2), 'Dave': Fraction(1, 6)}
+    assert engine_for(db).share_vector(db.get(1)) is base
+
+
+def test_engine_dropped_with_oracle():
+    overlay = OverlayOracle(family(), {2: {'alive': 'false'}})
+    engine_for(overlay).share_vector(overlay.get(1))
+    count = len(stirpes._engines)
+    ref = weakref.ref(overlay)
+    del overlay
+    gc.collect()
+    assert ref() is None
+    assert len(stirpes._engines) == count - 1
+
+
+def test_cycle():
+    db = Oracle({'people': [
+        person(1, 'A', 'false', [2]),
+        person(2, 'B', 'false', [1]),
+    ]})
+    with pytest.raises(StirpesCycleError, match="A -> B -> A"):
+        engine_for(db).share_vector(db.get(1))
+
+
+def test_sqlite_write_drops_the_memo(tmp_path):
+    db = import_json(PEOPLE_DB, str(tmp_path / 'people.sqlite'))
+    engine = engine_for(db)
+    # Person-1's children: Person-2 (deceased, children Person-4 and Person-5) and Person-3
+    assert engine.share_vector(db.get(1)) == {
+        'Person-3': Fraction(1, 2), 'Person-4': Fraction(1, 4), 'Person-5': Fraction(1, 4)}
+    db.put_person(dict(db.get(5), alive='false'))
+    assert engine_for(db) is not engine
+    assert engine_for(db).share_vector(db.get(1)) == {'Person-3': Fraction(1, 2), 'Person-4': Fraction(1, 4)}
+    assert engine_for(db) is engine_for(db)
+    db.close()
+
+
+def test_overlay_edit_drops_the_memo():
+    db = family()
+    overlay = OverlayOracle(db, {})
+    assert engine_for(overlay).share_vector(overlay.get(1))['Alice'] == Fraction(1, 2)
+    overlay.override(2, alive='false')
+    assert overlay.get(2)['alive'] == 'false' and db.get(2)['alive'] == 'true'
+    assert engine_for(overlay).share_vector(overlay.get(1)) == {'Carol': Fraction(1, 6), 'Dave': Fraction(1, 6)}
+    assert engine_for(db).share_vector(db.get(1))['Alice'] == Fraction(1, 2)
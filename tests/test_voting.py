@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import gpt_req
+from gpt_req import sample_concurrently, draw_votes, query_id_multiple_times, RuleID
+from llm_backend import StubBackend, set_backend
+
+
+class VotingStub(StubBackend):
+    """The stub backend answering rule id votes with given ids, one per
+    sample; delays (sample -> seconds) make samples finish out of order."""
+
+    def __init__(self, ids, delays=None):
+        self.ids = ids
+        self.delays = delays or {}
+
+    def parse(self, messages, response_format, model, sample=0, **params):
+        if response_format is not RuleID:
+            return super().parse(messages, response_format, model, sample, **params)
+        time.sleep(self.delays.get(sample, 0))
+        return RuleID(id=self.ids[sample])
+
+
+@pytest.fixture(autouse=True)
+def voting(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'CACHE', None)
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', False)
+    monkeypatch.setattr(gpt_req, 'VOTE_CONFIDENCE', None)
+    monkeypatch.setattr(gpt_req, 'LOGPROB_RULE_IDS', False)
+    monkeypatch.setattr(gpt_req, 'VOTE_STATS', [])
+    yield
+    set_backend(None)
+
+
+def test_samples_in_sample_order():
+    assert sample_concurrently(lambda i: time.sleep(0.01 * (5 - i)) or i, 5) == [0, 1, 2, 3, 4]
+    assert sample_concurrently(lambda i: i, 3, start=4) == [4, 5, 6]
+
+
+def test_failed_samples_are_dropped():
+    def query(i):
+        if i % 2:
+            raise TimeoutError(f"sample {i}")
+        return i
+    assert sample_concurrently(query, 6) == [0, 2, 4]
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'MAX_CONCURRENCY', 2)
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def query(i):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return i
+
+    assert sample_concurrently(query, 8) == list(range(8))
+    assert peak[0] == 2
+
+
+def test_majority():
+    set_backend(VotingStub([3, 1, 3, 3, 1]))
+    assert query_id_multiple_times("prompt", 'model', n=5) == 3
+    assert gpt_req.VOTE_STATS == [{'decision': 'RuleID', 'samples': 5, 'budget': 5}]
+
+
+@pytest.mark.parametrize("ids, rule_id", [
+    ([5, 1, 1, 5], 5),
+    ([1, 5, 5, 1], 1),
+])
+def test_tie_goes_to_the_earliest_sample(ids, rule_id):
+    # the first sample finishes last: ties are still broken in sample order
+    set_backend(VotingStub(ids, delays={0: 0.05}))
+    assert query_id_multiple_times("prompt", 'model', n=4) == rule_id
+
+
+def test_votes_recorded_in_the_trace():
+    trace = {}
+    assert draw_votes(lambda i: i % 2, 4, decision='Boolean', trace=trace) == [0, 1, 0, 1]
+    assert trace == {'votes': [{'decision': 'Boolean', 'samples': 4, 'budget': 4}]}
+
+
+def test_early_stopping_once_decided(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', True)
+    set_backend(VotingStub([1] * 10))
+    assert query_id_multiple_times("prompt", 'model', n=10) == 1
+    # 6 agreeing samples lead by more than the 4 left to draw
+    assert gpt_req.VOTE_STATS[-1] == {'decision': 'RuleID', 'samples': 6, 'budget': 10}
+
+
+@pytest.mark.parametrize("ids", [
+    [3, 1, 3, 1, 3, 3, 1, 3, 3, 3],
+    [1, 3, 3, 1, 1, 3, 1, 3, 3, 1],
+    [5, 5, 1, 1, 1, 1, 5, 5, 5, 5],
+])
+def test_early_stopping_keeps_the_majority(monkeypatch, ids):
+    set_backend(VotingStub(ids))
+    full = query_id_multiple_times("prompt", 'model', n=10)
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', True)
+    assert query_id_multiple_times("prompt", 'model', n=10) == full
+    assert gpt_req.VOTE_STATS[-1]['samples'] <= 10
+
+
+def test_unacceptable_leader_draws_every_sample(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', True)
+    answers = draw_votes(lambda i: 'no items', 10, accept=lambda ans: ans != 'no items')
+    assert len(answers) == 10 and gpt_req.VOTE_STATS[-1]['samples'] == 10
+
+
+def test_vote_confidence(monkeypatch):
+    monkeypatch.setattr(gpt_req, 'ADAPTIVE_VOTING', True)
+    answers = [1, 1, 1, 1, 3, 3, 3, 1, 1, 1]
+    draw_votes(lambda i: answers[i], 10)
+    assert gpt_req.VOTE_STATS[-1]['samples'] > 6
+    # 4 of the first 6 samples agree: 0.6 of the votes stops there
+    monkeypatch.setattr(gpt_req, 'VOTE_CONFIDENCE', 0.6)
+    draw_votes(lambda i: answers[i], 10)
+    assert gpt_req.VOTE_STATS[-1]['samples'] == 6
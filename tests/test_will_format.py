@@ -0,0 +1,70 @@
+import pickle
+
+import pytest
+
+from will_format import (save_will_model, load_will_model, is_will_model_file, to_canonical, from_canonical,
+                         content_checksum, WillFormatError, FORMAT_HEADER)
+from merkle import will_checksum
+
+
+def test_round_trip(will, tmp_path):
+    path = tmp_path / 'will.obj'
+    save_will_model(will, path)
+    assert is_will_model_file(path)
+    loaded = load_will_model(path)
+    assert loaded == will
+    assert loaded.checksum == will.checksum == will_checksum(loaded)
+
+
+def test_save_is_byte_identical(will, tmp_path):
+    first, second = tmp_path / 'first.obj', tmp_path / 'second.obj'
+    save_will_model(will, first)
+    save_will_model(load_will_model(first), second)
+    assert first.read_bytes() == second.read_bytes()
+
+
+def test_compiled_rules_kept_outside_the_content(will, tmp_path):
+    checksum = content_checksum(will)
+    will._directives[1].compiled_rule = ['bequeath', 'rule']
+    assert content_checksum(will) == checksum
+    path = tmp_path / 'will.obj'
+    save_will_model(will, path)
+    loaded = load_will_model(path)
+    assert loaded._directives[1].compiled_rule == ['bequeath', 'rule']
+    assert not hasattr(loaded._directives[0], 'compiled_rule')
+
+
+def test_tampered_file(will, tmp_path):
+    path = tmp_path / 'will.obj'
+    save_will_model(will, path)
+    path.write_bytes(path.read_bytes().replace(b'Person-4', b'Person-9'))
+    with pytest.raises(WillFormatError, match="sha256"):
+        load_will_model(path)
+
+
+def test_not_a_will_model_file(will, tmp_path):
+    path = tmp_path / 'will.pickle'
+    path.write_bytes(pickle.dumps(will))
+    assert not is_will_model_file(path)
+    with pytest.raises(WillFormatError):
+        load_will_model(path)
+
+
+def test_only_will_model_classes_are_read():
+    with pytest.raises(WillFormatError, match="Unknown Will Model type 'os.system'"):
+        from_canonical({'$type': 'os.system', '$attrs': {}})
+
+
+def test_unserializable_values():
+    with pytest.raises(TypeError):
+        to_canonical(object())
+    with pytest.raises(ValueError):
+        to_canonical({'$type': 'WMWillModel'})
+
+
+def test_header(will, tmp_path):
+    path = tmp_path / 'will.obj'
+    save_will_model(will, path)
+    lines = path.read_bytes().splitlines(keepends=True)
+    assert lines[0] == FORMAT_HEADER
+    assert len(lines) == 4 and lines[3].startswith(b'sha256 ')